@@ -11,6 +11,7 @@ BASE_DIR = Path(__file__).parent
 ENUNCIADOS_DIR = BASE_DIR / "enunciados"
 RESPOSTAS_DIR = BASE_DIR / "respostas"
 REPORTS_DIR = BASE_DIR / "reports"
+CACHE_DIR = BASE_DIR / ".cache"  # caches endereçados por conteúdo (--no-cache / --clear-cache)
 
 # Configurações da API OpenAI
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -26,12 +27,113 @@ OPENAI_TEMPERATURE = 0.3
 TEST_TIMEOUT = 30  # segundos
 MAX_TEST_OUTPUT = 1000  # caracteres
 
+# Saída dos programas dos alunos: de cada stream só o início e o fim (bytes)
+# ficam em memória; o meio é descartado e apenas contado
+OUTPUT_CAPTURE_HEAD_BYTES = 64 * 1024
+OUTPUT_CAPTURE_TAIL_BYTES = 64 * 1024
+# Programa que escreve mais que isso (stdout + stderr) é encerrado na hora (None desativa)
+OUTPUT_FLOOD_LIMIT = 50 * 1024 * 1024
+
+# Execuções de terminal: programa parado em um input() é encerrado na hora (status
+# "waiting_for_input"). HANG_IDLE_TIMEOUT: segundos sem usar CPU nem escrever saída
+# que também encerram a execução (None desativa; um scraper pode esperar a rede)
+HANG_IDLE_TIMEOUT = None
+
+# Pool de workers pytest pré-aquecidos (0 desativa: um `python -m pytest` por submissão)
+PYTEST_WORKER_POOL_SIZE = 4
+# Módulos importados uma única vez no processo zygote do pool (ausentes são ignorados)
+PYTEST_PRELOAD_MODULES = ["pytest", "pandas", "numpy", "requests", "bs4"]
+# Tamanho máximo do cache de resultados do pytest (entradas menos usadas são removidas)
+PYTEST_CACHE_MAX_BYTES = 100 * 1024 * 1024
+# Cache de resultados das execuções de terminal e interativas: tamanho máximo (LRU)
+# e validade em segundos (None: sem validade). Scrapers dependem das respostas da
+# rede, que não entram na chave do cache: a validade limita o quanto ficam velhos
+EXECUTION_CACHE_MAX_BYTES = 50 * 1024 * 1024
+EXECUTION_CACHE_TTL = 24 * 60 * 60
+
+# Assignments cujos testes rodam em lote (várias submissões por worker pytest).
+# Vale para testes rápidos, em que iniciar o pytest domina o tempo; o valor é o
+# número de submissões por lote.
+PYTEST_BATCH_ASSIGNMENTS = {
+    "prog1-tarefa-scrap-simples": 16,
+    "prog1-tarefa-scrap-yahoo": 16,
+}
+
+# Tempo limite de cada teste pytest (segundos). Um teste travado (ex.: loop
+# infinito) vira ERROR e os demais testes da submissão continuam rodando.
+# None desativa (vale só o limite da execução inteira).
+PYTEST_TEST_TIMEOUT = 10
+# Tempo limite por teste para assignments específicos
+PYTEST_TEST_TIMEOUTS = {
+    "prog1-tarefa-scrap-yahoo": 20,
+}
+# Encerra o pytest no primeiro erro de coleta (ex.: ImportError ou SyntaxError
+# no código do aluno), sem coletar os demais arquivos de teste
+PYTEST_FAIL_FAST = True
+
+# Workspaces temporários: testes, execução e Streamlit rodam em uma cópia da
+# submissão (sem alterar a pasta do aluno). None usa /dev/shm quando disponível.
+WORKSPACE_ENABLED = True
+WORKSPACE_ROOT = None
+
+# Instalação das dependências usadas pelas submissões (só as ausentes, em uma
+# chamada ao pip). Com um wheelhouse (pasta de .whl), o pip procura nele
+# primeiro; com DEPENDENCY_OFFLINE, só nele.
+DEPENDENCY_WHEELHOUSE = BASE_DIR / "wheelhouse"
+DEPENDENCY_OFFLINE = False
+DEPENDENCY_INSTALL_TIMEOUT = 600  # segundos
+
+# Ambientes por submissão: dependências detectadas (imports e requirements.txt)
+# que faltam no ambiente do Pipenv são instaladas em um virtualenv em cache,
+# compartilhado pelas submissões com o mesmo conjunto (CACHE_DIR/venvs)
+SUBMISSION_ENVS_ENABLED = True
+SUBMISSION_ENVS_MAX = 20  # os menos usados são removidos
+# Únicos pacotes (nomes do PyPI) instalados automaticamente nesses ambientes. Um
+# import ou linha do requirements.txt fora da lista não é instalado: um módulo
+# local esquecido ou um nome digitado errado não baixa um pacote qualquer do PyPI
+# (o programa falha com ImportError). O pip roda com os limites de RESOURCE_LIMITS.
+SUBMISSION_ALLOWED_PACKAGES = [
+    "beautifulsoup4", "lxml", "html5lib", "requests", "httpx", "selenium", "webdriver-manager",
+    "pandas", "numpy", "scipy", "statsmodels", "scikit-learn", "pyarrow", "openpyxl", "xlrd",
+    "matplotlib", "seaborn", "plotly", "altair", "folium", "wordcloud", "pillow", "opencv-python",
+    "streamlit", "streamlit-folium", "yfinance", "sqlalchemy", "psycopg2-binary",
+    "python-dotenv", "python-dateutil", "pyyaml", "tabulate", "tqdm", "unidecode", "nltk",
+]
+
+# Limites de recursos (rlimits, só POSIX) dos programas dos alunos e do pytest.
+# None desativa um limite. "processes" conta todos os processos do usuário que
+# roda o corretor, por isso fica desativado por padrão.
+RESOURCE_LIMITS = {
+    "cpu_seconds": 60,
+    "memory_mb": 4096,  # espaço de endereçamento
+    "open_files": 256,
+    "processes": None,
+    "file_size_mb": 100,  # tamanho máximo de cada arquivo escrito
+}
+# Ajustes por assignment (sobrescrevem RESOURCE_LIMITS), ex.:
+# "prog1-tarefa-scrap-yahoo": {"memory_mb": 6144}
+RESOURCE_LIMITS_BY_ASSIGNMENT = {}
+
 # Configurações de thumbnails
 STREAMLIT_STARTUP_TIMEOUT = 30  # segundos para aguardar Streamlit inicializar
 SCREENSHOT_WAIT_TIME = 8  # segundos para aguardar renderização completa
 CHROME_WINDOW_SIZE = "1440,900"  # tamanho da janela do Chrome (maior para alta resolução)
 STREAMLIT_PORT_RANGE = (8501, 8600)  # range de portas para Streamlit
 
+# Configurações de paralelismo
+# Número padrão de submissões processadas em paralelo (sobrescrito por --workers)
+MAX_CONCURRENT_SUBMISSIONS = max(1, min(8, os.cpu_count() or 1))
+
+# Workers por estágio do pipeline de correção (--pipeline)
+PIPELINE_STAGE_WORKERS = {
+    "tests": 4,       # subprocessos pytest (CPU)
+    "execution": 4,   # execução dos programas dos alunos
+    "thumbnail": 2,   # slots de navegador (Streamlit + Chrome)
+    "ai": 16,         # chamadas simultâneas à API da OpenAI
+    "scoring": 1,     # cálculo de nota e feedback
+}
+PIPELINE_QUEUE_SIZE = 8  # tamanho máximo da fila de entrada de cada estágio
+
 # Configuração do tipo de submissão para cada assignment
 ASSIGNMENT_SUBMISSION_TYPES: Dict[str, SubmissionType] = {
     # Assignments individuais
@@ -188,4 +290,30 @@ def assignment_has_python_execution(assignment_name: str) -> bool:
     Returns:
         True se o assignment deve ter execução Python, False caso contrário
     """
-    return assignment_name in ASSIGNMENTS_WITH_PYTHON_EXECUTION 
\ No newline at end of file
+    return assignment_name in ASSIGNMENTS_WITH_PYTHON_EXECUTION 
+
+
+def get_pytest_test_timeout(assignment_name: str) -> Optional[float]:
+    """
+    Retorna o tempo limite de cada teste pytest de um assignment.
+    
+    Args:
+        assignment_name: Nome do assignment
+        
+    Returns:
+        Segundos por teste (PYTEST_TEST_TIMEOUTS ou PYTEST_TEST_TIMEOUT), ou None se desativado
+    """
+    return PYTEST_TEST_TIMEOUTS.get(assignment_name, PYTEST_TEST_TIMEOUT)
+
+
+def get_resource_limits(assignment_name: str) -> Dict[str, Optional[int]]:
+    """
+    Retorna os limites de recursos das execuções de um assignment.
+    
+    Args:
+        assignment_name: Nome do assignment
+        
+    Returns:
+        RESOURCE_LIMITS com os ajustes de RESOURCE_LIMITS_BY_ASSIGNMENT
+    """
+    return {**RESOURCE_LIMITS, **RESOURCE_LIMITS_BY_ASSIGNMENT.get(assignment_name, {})}
@@ -7,6 +7,7 @@ from enum import Enum
 from pathlib import Path
 import json
 import re
+from ..utils.stage_metrics import summarize_stage_metrics
 
 
 class AssignmentType(Enum):
@@ -46,6 +47,7 @@ class CodeAnalysis:
     comments: List[str] = field(default_factory=list)
     suggestions: List[str] = field(default_factory=list)
     issues_found: List[str] = field(default_factory=list)
+    ai_failed: bool = False  # Chamada à IA falhou: nota 0 provisória, corrigir de novo
 
 
 @dataclass
@@ -57,6 +59,7 @@ class HTMLAnalysis:
     comments: List[str] = field(default_factory=list)
     suggestions: List[str] = field(default_factory=list)
     issues_found: List[str] = field(default_factory=list)
+    ai_failed: bool = False  # Chamada à IA falhou: nota 0 provisória, corrigir de novo
 
 
 @dataclass
@@ -65,12 +68,14 @@ class PythonExecutionResult:
     submission_identifier: str
     display_name: str
     execution_timestamp: str
-    execution_status: str  # "success", "error", "timeout"
+    execution_status: str  # "success", "error", "timeout", "resource_limit_exceeded", "waiting_for_input"
     stdout_output: str
     stderr_output: str
     return_code: int
     execution_time: float
     error_message: Optional[str] = None
+    stdout_bytes: int = 0  # Bytes escritos pelo programa (a saída guardada pode estar truncada)
+    stderr_bytes: int = 0
 
 
 @dataclass
@@ -88,6 +93,12 @@ class IndividualSubmission:
     streamlit_thumbnail: Optional['ThumbnailResult'] = None  # Thumbnail e erros do Streamlit
     final_score: float = 0.0
     feedback: str = ""
+    fingerprint: str = ""  # Hash do conteúdo da submissão, enunciado e prompt usados na correção
+    stage_metrics: Dict[str, Dict[str, float]] = field(default_factory=dict)  # Tempo/CPU/RSS por estágio
+    grading_status: str = "graded"  # "graded" ou "pending" (não corrigida dentro do --time-budget)
+    cache_provenance: Dict[str, Dict[str, str]] = field(default_factory=dict)  # Estágios servidos do cache
+    tests_batched: bool = False  # Testes já rodados em lote nesta correção (não vai para o relatório)
+    workspace: Optional[Path] = None  # Cópia de trabalho da execução, reusada pelo thumbnail (não vai para o relatório)
     
     @property
     def display_name(self) -> str:
@@ -110,6 +121,12 @@ class GroupSubmission:
     streamlit_thumbnail: Optional['ThumbnailResult'] = None  # Thumbnail e erros do Streamlit
     final_score: float = 0.0
     feedback: str = ""
+    fingerprint: str = ""  # Hash do conteúdo da submissão, enunciado e prompt usados na correção
+    stage_metrics: Dict[str, Dict[str, float]] = field(default_factory=dict)  # Tempo/CPU/RSS por estágio
+    grading_status: str = "graded"  # "graded" ou "pending" (não corrigida dentro do --time-budget)
+    cache_provenance: Dict[str, Dict[str, str]] = field(default_factory=dict)  # Estágios servidos do cache
+    tests_batched: bool = False  # Testes já rodados em lote nesta correção (não vai para o relatório)
+    workspace: Optional[Path] = None  # Cópia de trabalho da execução, reusada pelo thumbnail (não vai para o relatório)
     
     @property
     def display_name(self) -> str:
@@ -157,6 +174,166 @@ class ThumbnailResult:
     streamlit_exceptions: List[str] = field(default_factory=list)  # Erros capturados da página (classe stException)
 
 
+def thumbnail_to_dict(thumb: ThumbnailResult) -> Dict[str, Any]:
+    """Converte um ThumbnailResult para dicionário."""
+    return {
+        "submission_identifier": thumb.submission_identifier,
+        "display_name": thumb.display_name,
+        "thumbnail_path": str(thumb.thumbnail_path),
+        "capture_timestamp": thumb.capture_timestamp,
+        "streamlit_status": thumb.streamlit_status,
+        "error_message": thumb.error_message,
+        "streamlit_exceptions": thumb.streamlit_exceptions
+    }
+
+
+def thumbnail_from_dict(thumb_data: Dict[str, Any]) -> ThumbnailResult:
+    """Reconstrói um ThumbnailResult a partir de dicionário."""
+    return ThumbnailResult(
+        submission_identifier=thumb_data['submission_identifier'],
+        display_name=thumb_data['display_name'],
+        thumbnail_path=Path(thumb_data['thumbnail_path']),
+        capture_timestamp=thumb_data['capture_timestamp'],
+        streamlit_status=thumb_data['streamlit_status'],
+        error_message=thumb_data.get('error_message'),
+        streamlit_exceptions=thumb_data.get('streamlit_exceptions', [])
+    )
+
+
+def submission_to_dict(sub: Submission) -> Dict[str, Any]:
+    """Converte uma submissão corrigida para dicionário (formato do relatório JSON)."""
+    return {
+        "submission_type": "individual" if isinstance(sub, IndividualSubmission) else "group",
+        "identifier": sub.github_login if isinstance(sub, IndividualSubmission) else sub.group_name,
+        "display_name": sub.display_name,
+        "final_score": sub.final_score,
+        "feedback": sub.feedback,
+        "fingerprint": sub.fingerprint,
+        "stage_metrics": sub.stage_metrics,
+        "grading_status": sub.grading_status,
+        "cache_provenance": sub.cache_provenance,
+        "test_results": [
+            {
+                "test_name": test.test_name,
+                "result": test.result.value,
+                "message": test.message,
+                "execution_time": test.execution_time
+            }
+            for test in sub.test_results
+        ],
+        "code_analysis": {
+            "score": sub.code_analysis.score,
+            "score_justification": sub.code_analysis.score_justification,
+            "comments": sub.code_analysis.comments,
+            "suggestions": sub.code_analysis.suggestions,
+            "issues_found": sub.code_analysis.issues_found,
+            "ai_failed": sub.code_analysis.ai_failed
+        } if sub.code_analysis else None,
+        "python_execution": {
+            "execution_status": sub.python_execution.execution_status,
+            "execution_time": sub.python_execution.execution_time,
+            "execution_timestamp": sub.python_execution.execution_timestamp,
+            "return_code": sub.python_execution.return_code,
+            "stdout_output": sub.python_execution.stdout_output,
+            "stderr_output": sub.python_execution.stderr_output,
+            "error_message": sub.python_execution.error_message,
+            "stdout_bytes": sub.python_execution.stdout_bytes,
+            "stderr_bytes": sub.python_execution.stderr_bytes
+        } if sub.python_execution else None,
+        "html_analysis": {
+            "score": sub.html_analysis.score,
+            "score_justification": sub.html_analysis.score_justification,
+            "required_elements": sub.html_analysis.required_elements,
+            "comments": sub.html_analysis.comments,
+            "suggestions": sub.html_analysis.suggestions,
+            "issues_found": sub.html_analysis.issues_found,
+            "ai_failed": sub.html_analysis.ai_failed
+        } if sub.html_analysis else None,
+        "streamlit_thumbnail": thumbnail_to_dict(sub.streamlit_thumbnail) if sub.streamlit_thumbnail else None
+    }
+
+
+def submission_from_dict(sub_data: Dict[str, Any], assignment_name: str, turma: str) -> Submission:
+    """Reconstrói uma submissão a partir do dicionário gerado por submission_to_dict."""
+    if sub_data['submission_type'] == 'individual':
+        submission = IndividualSubmission(
+            github_login=sub_data['identifier'],
+            assignment_name=assignment_name,
+            turma=turma,
+            submission_path=Path(),  # Não é necessário para conversão
+            final_score=sub_data['final_score'],
+            feedback=sub_data['feedback']
+        )
+    else:  # group submission
+        submission = GroupSubmission(
+            group_name=sub_data['identifier'],
+            assignment_name=assignment_name,
+            turma=turma,
+            submission_path=Path(),  # Não é necessário para conversão
+            final_score=sub_data['final_score'],
+            feedback=sub_data['feedback']
+        )
+    
+    submission.fingerprint = sub_data.get('fingerprint', '')
+    submission.stage_metrics = sub_data.get('stage_metrics', {})
+    submission.grading_status = sub_data.get('grading_status', 'graded')
+    submission.cache_provenance = sub_data.get('cache_provenance', {})
+    
+    # Reconstrói análise de código se existir
+    if sub_data.get('code_analysis'):
+        submission.code_analysis = CodeAnalysis(
+            score=sub_data['code_analysis']['score'],
+            score_justification=sub_data['code_analysis'].get('score_justification', ''),
+            comments=sub_data['code_analysis'].get('comments', []),
+            suggestions=sub_data['code_analysis'].get('suggestions', []),
+            issues_found=sub_data['code_analysis'].get('issues_found', []),
+            ai_failed=sub_data['code_analysis'].get('ai_failed', False)
+        )
+    
+    # Reconstrói análise HTML se existir
+    if sub_data.get('html_analysis'):
+        submission.html_analysis = HTMLAnalysis(
+            score=sub_data['html_analysis']['score'],
+            score_justification=sub_data['html_analysis'].get('score_justification', ''),
+            required_elements=sub_data['html_analysis'].get('required_elements', {}),
+            comments=sub_data['html_analysis'].get('comments', []),
+            suggestions=sub_data['html_analysis'].get('suggestions', []),
+            issues_found=sub_data['html_analysis'].get('issues_found', []),
+            ai_failed=sub_data['html_analysis'].get('ai_failed', False)
+        )
+    
+    # Reconstrói resultados de testes
+    for test_data in sub_data.get('test_results', []):
+        submission.test_results.append(AssignmentTestExecution(
+            test_name=test_data['test_name'],
+            result=AssignmentTestResult(test_data['result']),
+            message=test_data.get('message', ''),
+            execution_time=test_data.get('execution_time', 0.0)
+        ))
+    
+    # Reconstrói execução Python se existir
+    if sub_data.get('python_execution'):
+        submission.python_execution = PythonExecutionResult(
+            submission_identifier=sub_data['identifier'],
+            display_name=sub_data['display_name'],
+            execution_status=sub_data['python_execution']['execution_status'],
+            execution_time=sub_data['python_execution']['execution_time'],
+            return_code=sub_data['python_execution']['return_code'],
+            stdout_output=sub_data['python_execution']['stdout_output'],
+            stderr_output=sub_data['python_execution']['stderr_output'],
+            execution_timestamp=sub_data['python_execution'].get('execution_timestamp', ''),
+            error_message=sub_data['python_execution'].get('error_message'),
+            stdout_bytes=sub_data['python_execution'].get('stdout_bytes', 0),
+            stderr_bytes=sub_data['python_execution'].get('stderr_bytes', 0)
+        )
+    
+    # Reconstrói thumbnail do Streamlit capturado durante a correção
+    if sub_data.get('streamlit_thumbnail'):
+        submission.streamlit_thumbnail = thumbnail_from_dict(sub_data['streamlit_thumbnail'])
+    
+    return submission
+
+
 @dataclass
 class CorrectionReport:
     """Relatório de correção."""
@@ -174,58 +351,40 @@ class CorrectionReport:
             "turma": self.turma,
             "generated_at": self.generated_at,
             "summary": self.summary,
-            "thumbnails": [
-                {
-                    "submission_identifier": thumb.submission_identifier,
-                    "display_name": thumb.display_name,
-                    "thumbnail_path": str(thumb.thumbnail_path),
-                    "capture_timestamp": thumb.capture_timestamp,
-                    "streamlit_status": thumb.streamlit_status,
-                    "error_message": thumb.error_message
-                }
-                for thumb in self.thumbnails
-            ],
-            "submissions": [
-                {
-                    "submission_type": "individual" if isinstance(sub, IndividualSubmission) else "group",
-                    "identifier": sub.github_login if isinstance(sub, IndividualSubmission) else sub.group_name,
-                    "display_name": sub.display_name,
-                    "final_score": sub.final_score,
-                    "feedback": sub.feedback,
-                    "test_results": [
-                        {
-                            "test_name": test.test_name,
-                            "result": test.result.value,
-                            "message": test.message
-                        }
-                        for test in sub.test_results
-                    ],
-                    "code_analysis": {
-                        "score": sub.code_analysis.score,
-                        "score_justification": sub.code_analysis.score_justification,
-                        "comments": sub.code_analysis.comments,
-                        "suggestions": sub.code_analysis.suggestions,
-                        "issues_found": sub.code_analysis.issues_found
-                    } if sub.code_analysis else None,
-                    "python_execution": {
-                        "execution_status": sub.python_execution.execution_status,
-                        "execution_time": sub.python_execution.execution_time,
-                        "return_code": sub.python_execution.return_code,
-                        "stdout_output": sub.python_execution.stdout_output,
-                        "stderr_output": sub.python_execution.stderr_output,
-                        "error_message": sub.python_execution.error_message
-                    } if sub.python_execution else None,
-                    "html_analysis": {
-                        "score": sub.html_analysis.score,
-                        "score_justification": sub.html_analysis.score_justification,
-                        "required_elements": sub.html_analysis.required_elements,
-                        "comments": sub.html_analysis.comments,
-                        "suggestions": sub.html_analysis.suggestions,
-                        "issues_found": sub.html_analysis.issues_found
-                    } if sub.html_analysis else None
-                }
-                for sub in self.submissions
-            ]
+            "thumbnails": [thumbnail_to_dict(thumb) for thumb in self.thumbnails],
+            "submissions": [submission_to_dict(sub) for sub in self.submissions]
+        }
+    
+    @staticmethod
+    def calculate_summary(submissions: List[Submission]) -> Dict[str, Any]:
+        """Calcula estatísticas resumidas das submissões."""
+        if not submissions:
+            return {}
+        
+        # Submissões pendentes (--time-budget) não entram nas estatísticas de nota
+        scores = [sub.final_score for sub in submissions if sub.grading_status != "pending"] or [0.0]
+        graded = len(submissions) - sum(1 for sub in submissions if sub.grading_status == "pending")
+        
+        # Arredonda para uma casa decimal para consistência visual
+        avg = round(sum(scores) / len(scores), 1)
+        min_score = round(min(scores), 1)
+        max_score = round(max(scores), 1)
+        
+        return {
+            "total_submissions": len(submissions),
+            "average_score": avg,
+            "min_score": min_score,
+            "max_score": max_score,
+            "passing_rate": sum(1 for score in scores if score >= 6.0) / graded if graded else 0.0,
+            "excellent_rate": sum(1 for score in scores if score >= 9.0) / graded if graded else 0.0,
+            "pending_submissions": len(submissions) - graded,
+            # Submissões com resultado reaproveitado do cache, por estágio
+            "cache_hits": {
+                stage: sum(1 for sub in submissions if stage in sub.cache_provenance)
+                for stage in sorted({stage for sub in submissions for stage in sub.cache_provenance})
+            },
+            # p50/p95/max de tempo, CPU e memória por estágio
+            "stage_metrics": summarize_stage_metrics(sub.stage_metrics for sub in submissions)
         }
     
     def save_to_file(self, filepath: Path) -> None:
@@ -240,138 +399,13 @@ class CorrectionReport:
             data = json.load(f)
         
         # Reconstrói as submissões
-        submissions = []
-        for sub_data in data.get('submissions', []):
-            if sub_data['submission_type'] == 'individual':
-                submission = IndividualSubmission(
-                    github_login=sub_data['identifier'],
-                    assignment_name=data['assignment_name'],
-                    turma=data['turma'],
-                    submission_path=Path(),  # Não é necessário para conversão
-                    final_score=sub_data['final_score'],
-                    feedback=sub_data['feedback']
-                )
-                
-                # Reconstrói análise de código se existir
-                if sub_data.get('code_analysis'):
-                    code_analysis = CodeAnalysis(
-                        score=sub_data['code_analysis']['score'],
-                        score_justification=sub_data['code_analysis'].get('score_justification', ''),
-                        comments=sub_data['code_analysis'].get('comments', []),
-                        suggestions=sub_data['code_analysis'].get('suggestions', []),
-                        issues_found=sub_data['code_analysis'].get('issues_found', [])
-                    )
-                    submission.code_analysis = code_analysis
-                
-                # Reconstrói análise HTML se existir
-                if sub_data.get('html_analysis'):
-                    html_analysis = HTMLAnalysis(
-                        score=sub_data['html_analysis']['score'],
-                        score_justification=sub_data['html_analysis'].get('score_justification', ''),
-                        required_elements=sub_data['html_analysis'].get('required_elements', {}),
-                        comments=sub_data['html_analysis'].get('comments', []),
-                        suggestions=sub_data['html_analysis'].get('suggestions', []),
-                        issues_found=sub_data['html_analysis'].get('issues_found', [])
-                    )
-                    submission.html_analysis = html_analysis
-                
-                # Reconstrói resultados de testes
-                for test_data in sub_data.get('test_results', []):
-                    test_result = AssignmentTestExecution(
-                        test_name=test_data['test_name'],
-                        result=AssignmentTestResult(test_data['result']),
-                        message=test_data.get('message', '')
-                    )
-                    submission.test_results.append(test_result)
-                
-                # Reconstrói execução Python se existir
-                if sub_data.get('python_execution'):
-                    python_execution = PythonExecutionResult(
-                        submission_identifier=sub_data['identifier'],
-                        display_name=sub_data['display_name'],
-                        execution_status=sub_data['python_execution']['execution_status'],
-                        execution_time=sub_data['python_execution']['execution_time'],
-                        return_code=sub_data['python_execution']['return_code'],
-                        stdout_output=sub_data['python_execution']['stdout_output'],
-                        stderr_output=sub_data['python_execution']['stderr_output'],
-                        execution_timestamp=sub_data['python_execution'].get('execution_timestamp', ''),
-                        error_message=sub_data['python_execution'].get('error_message')
-                    )
-                    submission.python_execution = python_execution
-                
-                submissions.append(submission)
-            
-            else:  # group submission
-                submission = GroupSubmission(
-                    group_name=sub_data['identifier'],
-                    assignment_name=data['assignment_name'],
-                    turma=data['turma'],
-                    submission_path=Path(),  # Não é necessário para conversão
-                    final_score=sub_data['final_score'],
-                    feedback=sub_data['feedback']
-                )
-                
-                # Reconstrói análise de código se existir
-                if sub_data.get('code_analysis'):
-                    code_analysis = CodeAnalysis(
-                        score=sub_data['code_analysis']['score'],
-                        score_justification=sub_data['code_analysis'].get('score_justification', ''),
-                        comments=sub_data['code_analysis'].get('comments', []),
-                        suggestions=sub_data['code_analysis'].get('suggestions', []),
-                        issues_found=sub_data['code_analysis'].get('issues_found', [])
-                    )
-                    submission.code_analysis = code_analysis
-                
-                # Reconstrói análise HTML se existir
-                if sub_data.get('html_analysis'):
-                    html_analysis = HTMLAnalysis(
-                        score=sub_data['html_analysis']['score'],
-                        score_justification=sub_data['html_analysis'].get('score_justification', ''),
-                        required_elements=sub_data['html_analysis'].get('required_elements', {}),
-                        comments=sub_data['html_analysis'].get('comments', []),
-                        suggestions=sub_data['html_analysis'].get('suggestions', []),
-                        issues_found=sub_data['html_analysis'].get('issues_found', [])
-                    )
-                    submission.html_analysis = html_analysis
-                
-                # Reconstrói resultados de testes
-                for test_data in sub_data.get('test_results', []):
-                    test_result = AssignmentTestExecution(
-                        test_name=test_data['test_name'],
-                        result=AssignmentTestResult(test_data['result']),
-                        message=test_data.get('message', '')
-                    )
-                    submission.test_results.append(test_result)
-                
-                # Reconstrói execução Python se existir
-                if sub_data.get('python_execution'):
-                    python_execution = PythonExecutionResult(
-                        submission_identifier=sub_data['identifier'],
-                        display_name=sub_data['display_name'],
-                        execution_status=sub_data['python_execution']['execution_status'],
-                        execution_time=sub_data['python_execution']['execution_time'],
-                        return_code=sub_data['python_execution']['return_code'],
-                        stdout_output=sub_data['python_execution']['stdout_output'],
-                        stderr_output=sub_data['python_execution']['stderr_output'],
-                        execution_timestamp=sub_data['python_execution'].get('execution_timestamp', ''),
-                        error_message=sub_data['python_execution'].get('error_message')
-                    )
-                    submission.python_execution = python_execution
-                
-                submissions.append(submission)
+        submissions = [
+            submission_from_dict(sub_data, data['assignment_name'], data['turma'])
+            for sub_data in data.get('submissions', [])
+        ]
         
         # Reconstrói thumbnails se existirem
-        thumbnails = []
-        for thumb_data in data.get('thumbnails', []):
-            thumbnail = ThumbnailResult(
-                submission_identifier=thumb_data['submission_identifier'],
-                display_name=thumb_data['display_name'],
-                thumbnail_path=Path(thumb_data['thumbnail_path']),
-                capture_timestamp=thumb_data['capture_timestamp'],
-                streamlit_status=thumb_data['streamlit_status'],
-                error_message=thumb_data.get('error_message')
-            )
-            thumbnails.append(thumbnail)
+        thumbnails = [thumbnail_from_dict(thumb_data) for thumb_data in data.get('thumbnails', [])]
         
         return cls(
             assignment_name=data['assignment_name'],
@@ -380,4 +414,46 @@ class CorrectionReport:
             summary=data.get('summary', {}),
             thumbnails=thumbnails,
             generated_at=data.get('generated_at', '')
-        ) 
\ No newline at end of file
+        )
+    
+    @classmethod
+    def load_from_jsonl(cls, filepath: Path, assignment_name: str = "", turma: str = "") -> 'CorrectionReport':
+        """
+        Reconstrói o relatório a partir do JSONL gravado durante a correção
+        (uma submissão finalizada por linha).
+        
+        Linhas inválidas (ex.: escrita interrompida) são ignoradas. Se a mesma
+        submissão aparecer mais de uma vez, vale a última linha. O summary é
+        recalculado a partir das submissões.
+        """
+        entries: Dict[tuple, Dict[str, Any]] = {}
+        with open(filepath, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                    entries[(entry['submission_type'], entry['identifier'])] = entry
+                except (ValueError, KeyError) as e:
+                    print(f"⚠️  Ignorando linha {line_number} inválida de {Path(filepath).name}: {e}")
+        
+        if entries:
+            first = next(iter(entries.values()))
+            assignment_name = first.get('assignment_name', assignment_name)
+            turma = first.get('turma', turma)
+        
+        submissions = []
+        for entry in entries.values():
+            try:
+                submissions.append(submission_from_dict(entry, assignment_name, turma))
+            except (ValueError, KeyError) as e:
+                print(f"⚠️  Ignorando submissão inválida {entry.get('identifier')} de {Path(filepath).name}: {e}")
+        
+        return cls(
+            assignment_name=assignment_name,
+            turma=turma,
+            submissions=submissions,
+            summary=cls.calculate_summary(submissions),
+            generated_at=max((entry.get('finished_at', '') for entry in entries.values()), default='')
+        )
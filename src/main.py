@@ -5,6 +5,7 @@ Este é o ponto de entrada principal do sistema.
 """
 import os
 import sys
+import threading
 from datetime import datetime
 from pathlib import Path
 import click
@@ -20,11 +21,57 @@ from .utils.report_generator import ReportGenerator
 from .repositories.assignment_repository import AssignmentRepository
 from .repositories.submission_repository import SubmissionRepository
 from .utils.visual_report_generator import VisualReportGenerator
+from .utils.disk_cache import DiskCache
 
 
 console = Console()
 
 
+def _assignment_progress_callback(progress: Progress):
+    """Cria um callback que mantém uma linha de progresso por assignment."""
+    tasks = {}
+    lock = threading.Lock()
+    
+    def callback(assignment_name: str, done: int, total: int):
+        with lock:
+            if assignment_name not in tasks:
+                tasks[assignment_name] = progress.add_task(assignment_name, total=total)
+            progress.update(
+                tasks[assignment_name],
+                completed=done,
+                description=f"{assignment_name}: {done}/{total} submissões"
+            )
+    
+    return callback
+
+
+def _generate_report_thumbnails(thumbnail_service, report, force_recapture):
+    """Gera os thumbnails do relatório visual, reaproveitando os do Streamlit capturados na correção."""
+    if isinstance(thumbnail_service, StreamlitThumbnailService):
+        return thumbnail_service.generate_thumbnails_for_assignment(
+            report.assignment_name, report.turma, report.submissions, force_recapture=force_recapture
+        )
+    return thumbnail_service.generate_thumbnails_for_assignment(
+        report.assignment_name, report.turma, report.submissions
+    )
+
+
+def _clear_result_caches():
+    """Esvazia os caches de resultados (--clear-cache)."""
+    from config import CACHE_DIR, PYTEST_CACHE_MAX_BYTES, EXECUTION_CACHE_MAX_BYTES
+    DiskCache(CACHE_DIR / "pytest", PYTEST_CACHE_MAX_BYTES).clear()
+    DiskCache(CACHE_DIR / "executions", EXECUTION_CACHE_MAX_BYTES).clear()
+    console.print("[yellow]🧹 Caches de resultados do pytest e das execuções esvaziados[/yellow]")
+
+
+def _print_pending_warning(report):
+    """Avisa quando submissões ficaram pendentes por causa do --time-budget."""
+    pending = report.summary.get("pending_submissions", 0)
+    if pending:
+        console.print(f"[yellow]⏳ {report.assignment_name}: {pending} submissão(ões) pendente(s) - "
+                      f"orçamento de tempo esgotado (grading_status = \"pending\" no JSON)[/yellow]")
+
+
 @click.group()
 def cli():
     """Sistema de Correção Automática de Atividades"""
@@ -40,9 +87,22 @@ def cli():
 @click.option('--output-dir', '-o', default='reports', help='Diretório para salvar relatórios')
 @click.option('--all-assignments', is_flag=True, help='Corrigir todos os assignments da turma')
 @click.option('--with-visual-reports', is_flag=True, help='Gerar relatórios visuais com thumbnails após correção')
-@click.option('--force-recapture', is_flag=True, help='Força recaptura de thumbnails mesmo se já existirem (usado com --with-visual-reports)')
+@click.option('--force-recapture', is_flag=True, help='Recaptura os thumbnails do Streamlit em vez de reaproveitar os capturados na correção (usado com --with-visual-reports)')
+@click.option('--workers', '-w', type=click.IntRange(min=1), default=None,
+              help='Número de submissões processadas em paralelo (padrão: baseado no número de núcleos)')
+@click.option('--pipeline', is_flag=True, help='Processa as submissões em pipeline, com um pool de workers por estágio')
+@click.option('--parallel-assignments', type=click.IntRange(min=1), default=1,
+              help='Número de assignments corrigidos ao mesmo tempo (com todos os assignments da turma)')
+@click.option('--force', is_flag=True, help='Corrige novamente todas as submissões, ignorando o relatório anterior')
+@click.option('--resume', is_flag=True, help='Retoma uma correção interrompida a partir do journal <output-dir>/<assignment>_<turma>.jsonl')
+@click.option('--time-budget', type=click.IntRange(min=1), default=None,
+              help='Tempo máximo (segundos, contado do início da correção e compartilhado por todos os assignments) para iniciar correções; as submissões restantes ficam pendentes')
+@click.option('--async', 'use_async', is_flag=True,
+              help='Orquestra as submissões com asyncio (IA, pytest, execução e Streamlit sem bloquear threads)')
+@click.option('--no-cache', is_flag=True, help='Não usa nem grava os caches de resultados (pytest e execuções)')
+@click.option('--clear-cache', is_flag=True, help='Esvazia os caches de resultados (pytest e execuções) antes da correção')
 @click.option('--verbose', '-v', is_flag=True, help='Mostra logs detalhados de debug')
-def correct(assignment, turma, submissao, output_format, output_dir, all_assignments, with_visual_reports, force_recapture, verbose):
+def correct(assignment, turma, submissao, output_format, output_dir, all_assignments, with_visual_reports, force_recapture, workers, pipeline, parallel_assignments, force, resume, time_budget, use_async, no_cache, clear_cache, verbose):
     """Executa a correção de assignments."""
     try:
         # Configura caminhos
@@ -69,8 +129,15 @@ def correct(assignment, turma, submissao, output_format, output_dir, all_assignm
         # Configura caminho dos logs
         logs_path = base_path / "logs"
         
+        if clear_cache:
+            _clear_result_caches()
+        
         # Inicializa serviços
-        correction_service = CorrectionService(enunciados_path, respostas_path, openai_api_key, logs_path, verbose=verbose)
+        correction_service = CorrectionService(enunciados_path, respostas_path, openai_api_key, logs_path, verbose=verbose,
+                                               max_workers=workers, use_pipeline=pipeline,
+                                               reports_path=output_path, force_regrade=force, resume=resume,
+                                               time_budget=time_budget, use_async=use_async,
+                                               use_cache=not no_cache)
         report_generator = ReportGenerator()
         
         if all_assignments:
@@ -84,7 +151,10 @@ def correct(assignment, turma, submissao, output_format, output_dir, all_assignm
             ) as progress:
                 task = progress.add_task("Processando assignments...", total=None)
                 
-                reports = correction_service.correct_all_assignments(turma)
+                reports = correction_service.correct_all_assignments(
+                    turma, parallel_assignments=parallel_assignments,
+                    progress_callback=_assignment_progress_callback(progress)
+                )
                 
                 progress.update(task, description=f"Gerando relatórios...")
                 
@@ -108,6 +178,7 @@ def correct(assignment, turma, submissao, output_format, output_dir, all_assignm
                         report_generator.generate_console_report(report)
                     
                     console.print(f"[green]Relatório JSON salvo: {json_path}[/green]")
+                    _print_pending_warning(report)
                 
                 # Gera relatórios visuais se solicitado
                 if with_visual_reports:
@@ -135,9 +206,7 @@ def correct(assignment, turma, submissao, output_format, output_dir, all_assignm
                             
                             try:
                                 # Gera thumbnails
-                                thumbnails = thumbnail_service.generate_thumbnails_for_assignment(
-                                    report.assignment_name, report.turma, report.submissions
-                                )
+                                thumbnails = _generate_report_thumbnails(thumbnail_service, report, force_recapture)
                                 
                                 # Cria relatório visual
                                 visual_report_path = visual_generator.generate_visual_report(
@@ -190,7 +259,9 @@ def correct(assignment, turma, submissao, output_format, output_dir, all_assignm
             ) as progress:
                 task = progress.add_task("Processando submissões...", total=None)
                 
-                report = correction_service.correct_assignment(assignment, turma, submissao)
+                report = correction_service.correct_assignment(
+                    assignment, turma, submissao, progress_callback=_assignment_progress_callback(progress)
+                )
                 
                 progress.update(task, description="Gerando relatório...")
                 
@@ -213,6 +284,7 @@ def correct(assignment, turma, submissao, output_format, output_dir, all_assignm
                     report_generator.generate_console_report(report)
                 
                 console.print(f"[green]Relatório JSON salvo: {json_path}[/green]")
+                _print_pending_warning(report)
                 
                 # Gera relatório visual se solicitado
                 if with_visual_reports:
@@ -240,9 +312,7 @@ def correct(assignment, turma, submissao, output_format, output_dir, all_assignm
                             sys.exit(1)
                         
                         # Gera thumbnails
-                        thumbnails = thumbnail_service.generate_thumbnails_for_assignment(
-                            assignment, turma, report.submissions
-                        )
+                        thumbnails = _generate_report_thumbnails(thumbnail_service, report, force_recapture)
                         
                         # Cria relatório visual
                         visual_report_path = visual_generator.generate_visual_report(
@@ -398,7 +468,9 @@ def convert_report(assignment, turma, format, input_dir, output_dir):
         json_filename = f"{assignment}_{turma}.json"
         json_path = input_path / json_filename
         
-        if not json_path.exists():
+        jsonl_path = json_path.with_suffix(".jsonl")
+        
+        if not json_path.exists() and not jsonl_path.exists():
             console.print(f"[red]Erro: Relatório JSON não encontrado: {json_path}[/red]")
             console.print(f"[yellow]Dica: Execute primeiro o comando 'correct' para gerar o relatório JSON[/yellow]")
             sys.exit(1)
@@ -407,7 +479,12 @@ def convert_report(assignment, turma, format, input_dir, output_dir):
         console.print(Panel(f"[bold blue]Convertendo relatório {assignment} da turma {turma}[/bold blue]"))
         
         from src.domain.models import CorrectionReport
-        report = CorrectionReport.load_from_file(json_path)
+        if json_path.exists():
+            report = CorrectionReport.load_from_file(json_path)
+        else:
+            # Correção em andamento ou interrompida: reconstrói a partir do JSONL
+            console.print(f"[yellow]Usando resultados parciais de {jsonl_path}[/yellow]")
+            report = CorrectionReport.load_from_jsonl(jsonl_path, assignment, turma)
         
         # Inicializa o gerador de relatórios
         from src.utils.report_generator import ReportGenerator
@@ -774,9 +851,22 @@ def generate_execution_visual_report(assignment, turma, output_dir, verbose):
 @click.option('--output-format', '-f', type=click.Choice(['console', 'html', 'markdown', 'json']), 
               default='html', help='Formato de saída do relatório')
 @click.option('--output-dir', '-o', default='reports', help='Diretório para salvar relatórios')
-@click.option('--force-recapture', is_flag=True, help='Força recaptura de thumbnails mesmo se já existirem')
+@click.option('--force-recapture', is_flag=True, help='Recaptura todos os thumbnails do Streamlit em vez de reaproveitar os capturados na correção')
+@click.option('--workers', '-w', type=click.IntRange(min=1), default=None,
+              help='Número de submissões processadas em paralelo (padrão: baseado no número de núcleos)')
+@click.option('--pipeline', is_flag=True, help='Processa as submissões em pipeline, com um pool de workers por estágio')
+@click.option('--parallel-assignments', type=click.IntRange(min=1), default=1,
+              help='Número de assignments corrigidos ao mesmo tempo (com todos os assignments da turma)')
+@click.option('--force', is_flag=True, help='Corrige novamente todas as submissões, ignorando o relatório anterior')
+@click.option('--resume', is_flag=True, help='Retoma uma correção interrompida a partir do journal <output-dir>/<assignment>_<turma>.jsonl')
+@click.option('--time-budget', type=click.IntRange(min=1), default=None,
+              help='Tempo máximo (segundos, contado do início da correção e compartilhado por todos os assignments) para iniciar correções; as submissões restantes ficam pendentes')
+@click.option('--async', 'use_async', is_flag=True,
+              help='Orquestra as submissões com asyncio (IA, pytest, execução e Streamlit sem bloquear threads)')
+@click.option('--no-cache', is_flag=True, help='Não usa nem grava os caches de resultados (pytest e execuções)')
+@click.option('--clear-cache', is_flag=True, help='Esvazia os caches de resultados (pytest e execuções) antes da correção')
 @click.option('--verbose', '-v', is_flag=True, help='Mostra logs detalhados de debug')
-def correct_all_with_visual(turma, assignment, submissao, output_format, output_dir, force_recapture, verbose):
+def correct_all_with_visual(turma, assignment, submissao, output_format, output_dir, force_recapture, workers, pipeline, parallel_assignments, force, resume, time_budget, use_async, no_cache, clear_cache, verbose):
     """Executa correção completa de turma com relatórios visuais."""
     try:
         # Configura caminhos
@@ -803,8 +893,15 @@ def correct_all_with_visual(turma, assignment, submissao, output_format, output_
         # Configura caminho dos logs
         logs_path = base_path / "logs"
         
+        if clear_cache:
+            _clear_result_caches()
+        
         # Inicializa serviços
-        correction_service = CorrectionService(enunciados_path, respostas_path, openai_api_key, logs_path, verbose=verbose)
+        correction_service = CorrectionService(enunciados_path, respostas_path, openai_api_key, logs_path, verbose=verbose,
+                                               max_workers=workers, use_pipeline=pipeline,
+                                               reports_path=output_path, force_regrade=force, resume=resume,
+                                               time_budget=time_budget, use_async=use_async,
+                                               use_cache=not no_cache)
         report_generator = ReportGenerator()
         visual_generator = VisualReportGenerator()
         
@@ -827,15 +924,20 @@ def correct_all_with_visual(turma, assignment, submissao, output_format, output_
             # Etapa 1: Correção de assignments
             task = progress.add_task("1/4 - Corrigindo assignments...", total=None)
             
+            progress_callback = _assignment_progress_callback(progress)
             if assignment and submissao:
                 # Processa apenas a submissão específica do assignment
-                reports = [correction_service.correct_assignment(assignment, turma, submissao)]
+                reports = [correction_service.correct_assignment(assignment, turma, submissao,
+                                                                 progress_callback=progress_callback)]
             elif assignment:
                 # Processa apenas o assignment específico
-                reports = [correction_service.correct_assignment(assignment, turma)]
+                reports = [correction_service.correct_assignment(assignment, turma,
+                                                                 progress_callback=progress_callback)]
             else:
                 # Processa todos os assignments da turma
-                reports = correction_service.correct_all_assignments(turma)
+                reports = correction_service.correct_all_assignments(
+                    turma, parallel_assignments=parallel_assignments, progress_callback=progress_callback
+                )
             
             progress.update(task, description="1/4 - Correção concluída")
             
@@ -862,6 +964,7 @@ def correct_all_with_visual(turma, assignment, submissao, output_format, output_
                     report_generator.generate_console_report(report)
                 
                 console.print(f"[green]✅ Relatório JSON: {json_path}[/green]")
+                _print_pending_warning(report)
             
             progress.update(task, description="2/4 - Relatórios concluídos")
             
@@ -889,9 +992,7 @@ def correct_all_with_visual(turma, assignment, submissao, output_format, output_
                     
                     try:
                         # Gera thumbnails
-                        thumbnails = thumbnail_service.generate_thumbnails_for_assignment(
-                            report.assignment_name, report.turma, report.submissions
-                        )
+                        thumbnails = _generate_report_thumbnails(thumbnail_service, report, force_recapture)
                         
                         # Cria relatório visual
                         visual_report_path = visual_generator.generate_visual_report(
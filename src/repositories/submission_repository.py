@@ -4,6 +4,7 @@ Repositório para gerenciar submissões dos alunos.
 from pathlib import Path
 from typing import List, Optional
 from ..domain.models import IndividualSubmission, GroupSubmission, Submission, Turma, SubmissionType, Assignment
+from ..utils.stage_metrics import measure_stage
 from config import get_assignment_submission_type, is_assignment_configured
 
 
@@ -41,9 +42,10 @@ class SubmissionRepository:
         if not assignment_submissions_path.exists():
             return submissions
         
-        for submission_dir in assignment_submissions_path.iterdir():
+        # Ordena por nome para que a ordem do relatório seja determinística
+        for submission_dir in sorted(assignment_submissions_path.iterdir()):
             if submission_dir.is_dir():
-                submission = self._load_submission(submission_dir, turma_name, assignment_name)
+                submission = self._load_submission_measured(submission_dir, turma_name, assignment_name)
                 if submission:
                     submissions.append(submission)
         
@@ -56,7 +58,7 @@ class SubmissionRepository:
         submission_path = assignment_submissions_path / f"{assignment_name}-{submission_identifier}"
         
         if submission_path.exists() and submission_path.is_dir():
-            return self._load_submission(submission_path, turma_name, assignment_name)
+            return self._load_submission_measured(submission_path, turma_name, assignment_name)
         return None
     
     def _load_turma(self, turma_path: Path) -> Optional[Turma]:
@@ -116,6 +118,15 @@ class SubmissionRepository:
             else:
                 return SubmissionType.INDIVIDUAL, suffix
     
+    def _load_submission_measured(self, submission_path: Path, turma_name: str, assignment_name: str) -> Optional[Submission]:
+        """Carrega uma submissão registrando o estágio repository_load em stage_metrics."""
+        metrics = {}
+        with measure_stage(metrics, "repository_load"):
+            submission = self._load_submission(submission_path, turma_name, assignment_name)
+        if submission:
+            submission.stage_metrics.update(metrics)
+        return submission
+    
     def _load_submission(self, submission_path: Path, turma_name: str, assignment_name: str) -> Optional[Submission]:
         """Carrega uma submissão a partir do diretório."""
         submission_folder_name = submission_path.name
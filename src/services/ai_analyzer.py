@@ -1,18 +1,25 @@
 """
 Serviço para análise de código usando IA (OpenAI).
 """
+import asyncio
 import os
 import json
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
+from typing import List, Dict, Any, Optional, Union
+from openai import AsyncOpenAI, OpenAI
 from ..domain.models import CodeAnalysis, HTMLAnalysis, Assignment
 from .prompt_manager import PromptManager
+from ..utils.stage_metrics import measure_stage, StageMetrics
 from config import OPENAI_MODEL, OPENAI_MAX_TOKENS, OPENAI_TEMPERATURE
 import re
 
 
+PYTHON_SYSTEM_PROMPT = "Você é um professor experiente de Python analisando código de alunos. Seja construtivo e específico, considerando os requisitos específicos do assignment."
+HTML_SYSTEM_PROMPT = "Você é um professor experiente de HTML/CSS analisando páginas web de alunos. Seja construtivo e específico, considerando os requisitos específicos do assignment."
+
+
 class AIAnalyzer:
     """Serviço para análise de código usando IA."""
     
@@ -44,6 +51,11 @@ class AIAnalyzer:
         
         self.ai_available = bool(self.api_key)
         
+        # Clientes assíncronos, um por event loop (criados sob demanda e
+        # fechados por close_async_client ao fim da correção naquele loop)
+        self._async_clients: Dict[asyncio.AbstractEventLoop, AsyncOpenAI] = {}
+        self._async_clients_lock = threading.Lock()
+        
         if self.ai_available:
             self.client = OpenAI(api_key=self.api_key)
             print(f"🤖 OpenAI API configurada com sucesso (chave: {self.api_key[:10]}...{self.api_key[-4:]})")
@@ -108,8 +120,65 @@ class AIAnalyzer:
         except Exception as e:
             print(f"⚠️  Erro ao salvar log: {e}")
     
-    def analyze_python_code(self, submission_path: Path, assignment: Assignment, python_execution: Optional[Any] = None, test_results: Optional[List[Any]] = None, streamlit_thumbnail: Optional[Any] = None) -> CodeAnalysis:
-        """Analisa código Python usando IA com prompt específico do assignment."""
+    def analyze_python_code(self, submission_path: Path, assignment: Assignment, python_execution: Optional[Any] = None, test_results: Optional[List[Any]] = None, streamlit_thumbnail: Optional[Any] = None,
+                            metrics: Optional[StageMetrics] = None) -> CodeAnalysis:
+        """
+        Analisa código Python usando IA com prompt específico do assignment.
+        
+        Se metrics for informado, registra os estágios prompt_build e ai_call.
+        """
+        prepared = self._prepare_python_analysis(submission_path, assignment, python_execution,
+                                                 test_results, streamlit_thumbnail, metrics)
+        if not isinstance(prepared, str):
+            return prepared
+        prompt = prepared
+
+        try:
+            # Chama a API do OpenAI
+            with measure_stage(metrics, "ai_call"):
+                response = self.client.chat.completions.create(
+                    model=OPENAI_MODEL,
+                    messages=self._build_messages(PYTHON_SYSTEM_PROMPT, prompt)
+                    #max_tokens=OPENAI_MAX_TOKENS,
+                    #temperature=OPENAI_TEMPERATURE
+                )
+
+            return self._finish_python_analysis(response.choices[0].message.content, prompt, submission_path, assignment)
+
+        except Exception as e:
+            return self._failed_analysis(CodeAnalysis, e)
+    
+    async def analyze_python_code_async(self, submission_path: Path, assignment: Assignment, python_execution: Optional[Any] = None, test_results: Optional[List[Any]] = None, streamlit_thumbnail: Optional[Any] = None,
+                                        metrics: Optional[StageMetrics] = None) -> CodeAnalysis:
+        """
+        Versão assíncrona de analyze_python_code, usando o cliente AsyncOpenAI.
+        
+        Leitura de arquivos, montagem do prompt e parsing rodam em threads do
+        executor; apenas a espera pela API fica no event loop.
+        """
+        prepared = await asyncio.to_thread(self._prepare_python_analysis, submission_path, assignment,
+                                           python_execution, test_results, streamlit_thumbnail, metrics)
+        if not isinstance(prepared, str):
+            return prepared
+        prompt = prepared
+
+        try:
+            with measure_stage(metrics, "ai_call"):
+                response = await self._get_async_client().chat.completions.create(
+                    model=OPENAI_MODEL,
+                    messages=self._build_messages(PYTHON_SYSTEM_PROMPT, prompt)
+                )
+
+            return await asyncio.to_thread(self._finish_python_analysis, response.choices[0].message.content,
+                                           prompt, submission_path, assignment)
+
+        except Exception as e:
+            return self._failed_analysis(CodeAnalysis, e)
+    
+    def _prepare_python_analysis(self, submission_path: Path, assignment: Assignment, python_execution: Optional[Any],
+                                 test_results: Optional[List[Any]], streamlit_thumbnail: Optional[Any],
+                                 metrics: Optional[StageMetrics]) -> Union[str, CodeAnalysis]:
+        """Monta o prompt da análise Python, ou retorna a análise final quando não há o que enviar à IA."""
         if not self.ai_available:
             return self._analyze_python_code_basic(submission_path, assignment)
 
@@ -131,60 +200,91 @@ class AIAnalyzer:
             prompt_manager = PromptManager(self.enunciados_path or Path("enunciados"))
 
         # Constrói o prompt específico para o assignment
-        prompt = prompt_manager.get_assignment_prompt(
-            assignment=assignment,
-            assignment_type="python",
-            student_code=self._format_python_files(python_files),
-            python_execution=python_execution,
-            test_results=test_results,
-            streamlit_thumbnail=streamlit_thumbnail
+        with measure_stage(metrics, "prompt_build"):
+            return prompt_manager.get_assignment_prompt(
+                assignment=assignment,
+                assignment_type="python",
+                student_code=self._format_python_files(python_files),
+                python_execution=python_execution,
+                test_results=test_results,
+                streamlit_thumbnail=streamlit_thumbnail
+            )
+    
+    def _finish_python_analysis(self, analysis_text: str, prompt: str, submission_path: Path,
+                                assignment: Assignment) -> CodeAnalysis:
+        """Processa a resposta da IA e salva o log da análise Python."""
+        parsed_result = self._parse_python_analysis(analysis_text)
+
+        # Salva log da análise
+        submission_identifier = submission_path.name.split('-', 1)[1] if '-' in submission_path.name else submission_path.name
+        self._save_ai_log(
+            assignment_name=assignment.name,
+            submission_identifier=submission_identifier,
+            analysis_type="python",
+            prompt=prompt,
+            response=analysis_text,
+            parsed_result={
+                "score": parsed_result.score,
+                "score_justification": parsed_result.score_justification,
+                "comments": parsed_result.comments,
+                "suggestions": parsed_result.suggestions,
+                "issues_found": parsed_result.issues_found
+            }
         )
 
+        return parsed_result
+    
+    def analyze_html_code(self, submission_path: Path, assignment: Assignment,
+                          metrics: Optional[StageMetrics] = None) -> HTMLAnalysis:
+        """
+        Analisa código HTML usando IA com prompt específico do assignment.
+        
+        Se metrics for informado, registra os estágios prompt_build e ai_call.
+        """
+        prepared = self._prepare_html_analysis(submission_path, assignment, metrics)
+        if not isinstance(prepared, str):
+            return prepared
+        prompt = prepared
+        
         try:
             # Chama a API do OpenAI
-            response = self.client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "Você é um professor experiente de Python analisando código de alunos. Seja construtivo e específico, considerando os requisitos específicos do assignment."},
-                    {"role": "user", "content": prompt}
-                ]
-                #max_tokens=OPENAI_MAX_TOKENS,
-                #temperature=OPENAI_TEMPERATURE
-            )
-
-            # Processa a resposta
-            analysis_text = response.choices[0].message.content
-            parsed_result = self._parse_python_analysis(analysis_text)
-
-            # Salva log da análise
-            submission_identifier = submission_path.name.split('-', 1)[1] if '-' in submission_path.name else submission_path.name
-            self._save_ai_log(
-                assignment_name=assignment.name,
-                submission_identifier=submission_identifier,
-                analysis_type="python",
-                prompt=prompt,
-                response=analysis_text,
-                parsed_result={
-                    "score": parsed_result.score,
-                    "score_justification": parsed_result.score_justification,
-                    "comments": parsed_result.comments,
-                    "suggestions": parsed_result.suggestions,
-                    "issues_found": parsed_result.issues_found
-                }
-            )
-
-            return parsed_result
-
+            with measure_stage(metrics, "ai_call"):
+                response = self.client.chat.completions.create(
+                    model=OPENAI_MODEL,
+                    messages=self._build_messages(HTML_SYSTEM_PROMPT, prompt)
+                    #max_tokens=OPENAI_MAX_TOKENS,
+                    #temperature=OPENAI_TEMPERATURE
+                )
+            
+            return self._finish_html_analysis(response.choices[0].message.content, prompt, submission_path, assignment)
+            
         except Exception as e:
-            return CodeAnalysis(
-                score=0.0,
-                score_justification=f"Erro na análise de IA: {str(e)}",
-                comments=[f"Erro na análise de IA: {str(e)}"],
-                issues_found=["Falha na análise automática"]
-            )
+            return self._failed_analysis(HTMLAnalysis, e)
+    
+    async def analyze_html_code_async(self, submission_path: Path, assignment: Assignment,
+                                      metrics: Optional[StageMetrics] = None) -> HTMLAnalysis:
+        """Versão assíncrona de analyze_html_code, usando o cliente AsyncOpenAI."""
+        prepared = await asyncio.to_thread(self._prepare_html_analysis, submission_path, assignment, metrics)
+        if not isinstance(prepared, str):
+            return prepared
+        prompt = prepared
+        
+        try:
+            with measure_stage(metrics, "ai_call"):
+                response = await self._get_async_client().chat.completions.create(
+                    model=OPENAI_MODEL,
+                    messages=self._build_messages(HTML_SYSTEM_PROMPT, prompt)
+                )
+            
+            return await asyncio.to_thread(self._finish_html_analysis, response.choices[0].message.content,
+                                           prompt, submission_path, assignment)
+            
+        except Exception as e:
+            return self._failed_analysis(HTMLAnalysis, e)
     
-    def analyze_html_code(self, submission_path: Path, assignment: Assignment) -> HTMLAnalysis:
-        """Analisa código HTML usando IA com prompt específico do assignment."""
+    def _prepare_html_analysis(self, submission_path: Path, assignment: Assignment,
+                               metrics: Optional[StageMetrics]) -> Union[str, HTMLAnalysis]:
+        """Monta o prompt da análise HTML, ou retorna a análise final quando não há o que enviar à IA."""
         if not self.ai_available:
             return self._analyze_html_code_basic(submission_path, assignment)
         
@@ -193,66 +293,82 @@ class AIAnalyzer:
         css_files = self._read_css_files(submission_path)
         
         if not html_files:
-                    return HTMLAnalysis(
-            score=0.0,
-            score_justification="Nenhum arquivo HTML encontrado para análise",
-            comments=["Nenhum arquivo HTML encontrado"],
-            issues_found=["Arquivos HTML ausentes"]
-        )
+            return HTMLAnalysis(
+                score=0.0,
+                score_justification="Nenhum arquivo HTML encontrado para análise",
+                comments=["Nenhum arquivo HTML encontrado"],
+                issues_found=["Arquivos HTML ausentes"]
+            )
         
         # Constrói o prompt específico para o assignment
-        if self.prompt_manager:
-            prompt = self.prompt_manager.get_assignment_prompt(
-                assignment=assignment,
-                assignment_type="html",
-                student_code=self._format_html_files(html_files, css_files)
-            )
-        else:
+        with measure_stage(metrics, "prompt_build"):
+            if self.prompt_manager:
+                return self.prompt_manager.get_assignment_prompt(
+                    assignment=assignment,
+                    assignment_type="html",
+                    student_code=self._format_html_files(html_files, css_files)
+                )
             # Fallback para prompt genérico
-            prompt = self._build_html_analysis_prompt(html_files, css_files, assignment)
+            return self._build_html_analysis_prompt(html_files, css_files, assignment)
+    
+    def _finish_html_analysis(self, analysis_text: str, prompt: str, submission_path: Path,
+                              assignment: Assignment) -> HTMLAnalysis:
+        """Processa a resposta da IA e salva o log da análise HTML."""
+        parsed_result = self._parse_html_analysis(analysis_text)
+        
+        # Salva log da análise
+        submission_identifier = submission_path.name.split('-', 1)[1] if '-' in submission_path.name else submission_path.name
+        self._save_ai_log(
+            assignment_name=assignment.name,
+            submission_identifier=submission_identifier,
+            analysis_type="html",
+            prompt=prompt,
+            response=analysis_text,
+            parsed_result={
+                "score": parsed_result.score,
+                "required_elements": parsed_result.required_elements,
+                "comments": parsed_result.comments,
+                "suggestions": parsed_result.suggestions,
+                "issues_found": parsed_result.issues_found
+            }
+        )
         
-        try:
-            # Chama a API do OpenAI
-            response = self.client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "Você é um professor experiente de HTML/CSS analisando páginas web de alunos. Seja construtivo e específico, considerando os requisitos específicos do assignment."},
-                    {"role": "user", "content": prompt}
-                ]
-                #max_tokens=OPENAI_MAX_TOKENS,
-                #temperature=OPENAI_TEMPERATURE
-            )
-            
-            # Processa a resposta
-            analysis_text = response.choices[0].message.content
-            parsed_result = self._parse_html_analysis(analysis_text)
-            
-            # Salva log da análise
-            submission_identifier = submission_path.name.split('-', 1)[1] if '-' in submission_path.name else submission_path.name
-            self._save_ai_log(
-                assignment_name=assignment.name,
-                submission_identifier=submission_identifier,
-                analysis_type="html",
-                prompt=prompt,
-                response=analysis_text,
-                parsed_result={
-                    "score": parsed_result.score,
-                    "required_elements": parsed_result.required_elements,
-                    "comments": parsed_result.comments,
-                    "suggestions": parsed_result.suggestions,
-                    "issues_found": parsed_result.issues_found
-                }
-            )
-            
-            return parsed_result
-            
-        except Exception as e:
-            return HTMLAnalysis(
-                score=0.0,
-                score_justification=f"Erro na análise de IA: {str(e)}",
-                comments=[f"Erro na análise de IA: {str(e)}"],
-                issues_found=["Falha na análise automática"]
-            )
+        return parsed_result
+    
+    @staticmethod
+    def _build_messages(system_prompt: str, prompt: str) -> List[Dict[str, str]]:
+        """Mensagens enviadas à API de chat."""
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+    
+    @staticmethod
+    def _failed_analysis(analysis_class, error: Exception):
+        """Análise com nota zero, marcada como falha, quando a chamada à IA falha."""
+        return analysis_class(
+            score=0.0,
+            score_justification=f"Erro na análise de IA: {str(error)}",
+            comments=[f"Erro na análise de IA: {str(error)}"],
+            issues_found=["Falha na análise automática"],
+            ai_failed=True
+        )
+    
+    def _get_async_client(self) -> AsyncOpenAI:
+        """Cliente AsyncOpenAI do event loop atual (criado sob demanda)."""
+        loop = asyncio.get_running_loop()
+        with self._async_clients_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = self._async_clients[loop] = AsyncOpenAI(api_key=self.api_key)
+        return client
+    
+    async def close_async_client(self):
+        """Fecha o cliente AsyncOpenAI do event loop atual, se houver (antes de o loop terminar)."""
+        with self._async_clients_lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
     
     def _analyze_python_code_basic(self, submission_path: Path, assignment: Assignment) -> CodeAnalysis:
         """Análise básica de código Python sem IA."""
@@ -0,0 +1,85 @@
+"""
+Journal de correção: grava cada submissão finalizada em disco assim que ela termina.
+
+O relatório JSON só é salvo quando o assignment inteiro termina. O journal é um
+arquivo JSON Lines (reports/<assignment>_<turma>.jsonl, uma submissão por linha)
+com flush + fsync a cada registro. Ele serve para:
+
+- acompanhar a correção em andamento (tail -f) e começar a revisar antes do fim;
+- retomar uma execução interrompida (Ctrl-C, travamento do Chrome, queda da
+  OpenAI) com --resume, sem refazer o que já foi corrigido;
+- reconstruir o relatório completo (CorrectionReport.load_from_jsonl), do qual
+  saem o JSON, o HTML e o CSV.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Tuple
+from ..domain.models import CorrectionReport, IndividualSubmission, Submission, submission_to_dict
+
+
+class CorrectionJournal:
+    """Journal append-only das submissões corrigidas de um assignment."""
+
+    def __init__(self, journal_path: Path):
+        self.journal_path = Path(journal_path)
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        """Inicia um journal vazio para uma nova execução."""
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            with open(self.journal_path, "w", encoding="utf-8") as f:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def discard_partial_entry(self) -> None:
+        """Remove uma linha incompleta no final, para que novos registros comecem em linha própria."""
+        if not self.journal_path.exists():
+            return
+
+        with self._lock:
+            with open(self.journal_path, "rb+") as f:
+                content = f.read()
+                if not content or content.endswith(b"\n"):
+                    return
+                f.truncate(content.rfind(b"\n") + 1)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def record(self, submission: Submission) -> None:
+        """Grava uma submissão finalizada de forma durável."""
+        entry = {
+            "assignment_name": submission.assignment_name,
+            "turma": submission.turma,
+            "finished_at": datetime.now().isoformat(),
+            **submission_to_dict(submission)
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def load(self, assignment_name: str, turma: str) -> Dict[Tuple[str, str], Submission]:
+        """
+        Lê as submissões já gravadas, indexadas por (tipo, identificador).
+
+        Uma linha incompleta no final (execução interrompida no meio da escrita)
+        é ignorada. Se a mesma submissão aparecer mais de uma vez, vale a última.
+        """
+        if not self.journal_path.exists():
+            return {}
+
+        report = CorrectionReport.load_from_jsonl(self.journal_path, assignment_name, turma)
+        entries = {}
+        for submission in report.submissions:
+            if isinstance(submission, IndividualSubmission):
+                entries[("individual", submission.github_login)] = submission
+            else:
+                entries[("group", submission.group_name)] = submission
+        return entries
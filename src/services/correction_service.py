@@ -1,9 +1,14 @@
 """
 Serviço principal de correção que orquestra todo o processo.
 """
+import asyncio
+import contextlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from ..domain.models import (
     IndividualSubmission, GroupSubmission, Submission, Assignment, CorrectionReport, 
     AssignmentType, AssignmentTestResult
@@ -16,24 +21,147 @@ from .streamlit_thumbnail_service import StreamlitThumbnailService
 from .html_thumbnail_service import HTMLThumbnailService
 from .python_execution_service import PythonExecutionService
 from .interactive_execution_service import InteractiveExecutionService
+from .grading_pipeline import GradingPipeline, PipelineStage
+from .correction_journal import CorrectionJournal
+from .workspace_manager import get_workspace_manager
+from ..utils.stage_metrics import measure_stage
+
+# Intervalo (s) entre tentativas de ocupar um semáforo global no caminho asyncio
+SLOT_POLL_INTERVAL = 0.05
+
+
+@contextlib.asynccontextmanager
+async def _async_slot(local: asyncio.Semaphore, shared: Optional[threading.BoundedSemaphore] = None):
+    """
+    Ocupa um slot do event loop e um do orçamento global (threading).
+    
+    O semáforo local mantém a ordem das submissões no loop; o global é
+    compartilhado com as threads e os event loops dos outros assignments e é
+    tentado sem bloquear, para não prender o loop nem as threads do executor.
+    """
+    async with local:
+        if shared is not None:
+            while not shared.acquire(blocking=False):
+                await asyncio.sleep(SLOT_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            if shared is not None:
+                shared.release()
 
 
 class CorrectionService:
     """Serviço principal de correção."""
     
-    def __init__(self, enunciados_path: Path, respostas_path: Path, openai_api_key: str = None, logs_path: Path = None, verbose: bool = False):
+    def __init__(self, enunciados_path: Path, respostas_path: Path, openai_api_key: str = None, logs_path: Path = None, verbose: bool = False,
+                 max_workers: Optional[int] = None, use_pipeline: bool = False,
+                 reports_path: Optional[Path] = None, force_regrade: bool = False, resume: bool = False,
+                 time_budget: Optional[float] = None, use_async: bool = False, use_cache: bool = True):
+        from config import MAX_CONCURRENT_SUBMISSIONS, PIPELINE_STAGE_WORKERS
+        self.max_workers = max(1, max_workers or MAX_CONCURRENT_SUBMISSIONS)
+        self.use_pipeline = use_pipeline
+        # Usa a orquestração asyncio (correct_assignment_async)
+        self.use_async = use_async
+        # Diretório com os relatórios JSON anteriores (<assignment>_<turma>.json),
+        # usados para reaproveitar submissões que não mudaram
+        self.reports_path = reports_path
+        self.force_regrade = force_regrade
+        # Retoma a partir do journal da execução anterior (interrompida)
+        self.resume = resume
+        # Prazo (em segundos) para iniciar correções; o que não começar até lá
+        # fica marcado como pendente. Vale para a execução inteira (todos os
+        # assignments de correct_all_assignments) e conta a partir do início
+        # da primeira correção (_start_budget_clock), não da criação do serviço
+        self.time_budget = time_budget
+        self._deadline: Optional[float] = None
+        self._deadline_lock = threading.Lock()
+        self.enunciados_path = enunciados_path
+        # Limita o número de navegadores/Streamlit abertos ao mesmo tempo,
+        # tanto no pool simples quanto no pipeline
+        self._browser_slots = threading.BoundedSemaphore(max(1, PIPELINE_STAGE_WORKERS.get("thumbnail", 1)))
+        # Orçamento global de concorrência, compartilhado entre assignments
+        # corrigidos ao mesmo tempo (correct_all_assignments)
+        self._submission_slots = threading.BoundedSemaphore(self.max_workers)
+        self._stage_slots = {
+            name: threading.BoundedSemaphore(max(1, workers))
+            for name, workers in PIPELINE_STAGE_WORKERS.items()
+            if name != "thumbnail"  # já limitado por _browser_slots
+        }
         self.assignment_repo = AssignmentRepository(enunciados_path)
         self.submission_repo = SubmissionRepository(respostas_path)
-        self.test_executor = PytestExecutor()
+        self.test_executor = PytestExecutor(use_cache=use_cache)
         self.ai_analyzer = AIAnalyzer(openai_api_key, enunciados_path, logs_path)
-        self.streamlit_thumbnail_service = StreamlitThumbnailService(verbose=verbose)
+        # Com reports_path, os thumbnails do Streamlit vão direto para a pasta do
+        # relatório visual, que os reaproveita em vez de iniciar o dashboard de novo
+        thumbnails_path = Path(reports_path) / "visual" / "thumbnails" if reports_path is not None else None
+        self.streamlit_thumbnail_service = StreamlitThumbnailService(thumbnails_path, verbose=verbose)
         self.html_thumbnail_service = HTMLThumbnailService(verbose=verbose)
-        self.python_execution_service = PythonExecutionService(verbose=verbose)
-        self.interactive_execution_service = InteractiveExecutionService(verbose=verbose)
+        self.python_execution_service = PythonExecutionService(verbose=verbose, use_cache=use_cache)
+        self.interactive_execution_service = InteractiveExecutionService(verbose=verbose, use_cache=use_cache)
     
     def correct_assignment(self, assignment_name: str, turma_name: str, 
-                          submission_identifier: Optional[str] = None) -> CorrectionReport:
-        """Corrige um assignment específico."""
+                          submission_identifier: Optional[str] = None,
+                          progress_callback: Optional[Callable[[str, int, int], None]] = None) -> CorrectionReport:
+        """
+        Corrige um assignment específico.
+        
+        Args:
+            assignment_name: Nome do assignment
+            turma_name: Nome da turma
+            submission_identifier: Corrige apenas esta submissão, se informado
+            progress_callback: Chamado como (assignment_name, concluídas, total)
+                a cada submissão finalizada
+        """
+        if self.use_async:
+            return asyncio.run(self.correct_assignment_async(
+                assignment_name, turma_name, submission_identifier, progress_callback
+            ))
+        
+        assignment, submissions, pending, on_done = self._prepare_correction(
+            assignment_name, turma_name, submission_identifier, progress_callback
+        )
+        
+        # Processa as submissões (em paralelo se max_workers > 1)
+        if pending:
+            self._process_submissions(pending, assignment, on_done)
+        
+        return self._build_report(assignment_name, turma_name, submissions)
+    
+    async def correct_assignment_async(self, assignment_name: str, turma_name: str,
+                                       submission_identifier: Optional[str] = None,
+                                       progress_callback: Optional[Callable[[str, int, int], None]] = None) -> CorrectionReport:
+        """
+        Variante assíncrona de correct_assignment.
+        
+        As esperas de I/O (API da OpenAI, pytest e programas dos alunos como
+        subprocessos asyncio, probe HTTP do Streamlit) acontecem ao mesmo tempo
+        em um único event loop; trabalho bloqueante ou de CPU (Selenium, parsing,
+        nota, journal) vai para threads do executor. Os limites de concorrência
+        (max_workers e PIPELINE_STAGE_WORKERS) são os mesmos semáforos globais
+        do caminho com threads, compartilhados entre assignments.
+        """
+        assignment, submissions, pending, on_done = await asyncio.to_thread(
+            self._prepare_correction, assignment_name, turma_name, submission_identifier, progress_callback
+        )
+        
+        if pending:
+            try:
+                await self._process_submissions_async(pending, assignment, on_done)
+            finally:
+                await self.ai_analyzer.close_async_client()
+        
+        return self._build_report(assignment_name, turma_name, submissions)
+    
+    def _prepare_correction(self, assignment_name: str, turma_name: str,
+                            submission_identifier: Optional[str],
+                            progress_callback: Optional[Callable[[str, int, int], None]]):
+        """
+        Carrega assignment e submissões, reaproveita o que já foi corrigido e
+        ordena as pendentes.
+        
+        Returns:
+            (assignment, todas as submissões, submissões a corrigir, callback de submissão finalizada)
+        """
         # Carrega o assignment
         assignment = self.assignment_repo.get_assignment(assignment_name)
         if not assignment:
@@ -49,16 +177,28 @@ class CorrectionService:
         if not submissions:
             raise ValueError(f"Nenhuma submissão encontrada para {assignment_name} na turma {turma_name}")
         
-        # Processa cada submissão
-        for submission in submissions:
-            try:
-                self._process_submission(submission, assignment)
-            except Exception as e:
-                print(f"❌ Erro ao processar submissão {submission.display_name}: {e}")
-                # Continua com a próxima submissão
-                continue
+        self._start_budget_clock()
+        journal = self._open_journal(assignment_name, turma_name, whole_assignment=not submission_identifier)
+        on_done = self._chain_callbacks(
+            journal.record if journal else None,
+            self._make_progress_notifier(assignment_name, len(submissions), progress_callback)
+        )
+        
+        # Reaproveita submissões já corrigidas (journal) ou inalteradas desde o último relatório
+        previous_by_key = self._load_previous_submissions(assignment_name, turma_name)
+        pending = self._reuse_unchanged_submissions(submissions, assignment, turma_name, previous_by_key, journal)
+        if on_done is not None:
+            pending_ids = {id(submission) for submission in pending}
+            for submission in submissions:
+                if id(submission) not in pending_ids:
+                    on_done(submission)
         
-        # Cria o relatório
+        # Começa pelas submissões que demoraram mais na última correção
+        pending = self._order_by_expected_duration(pending, previous_by_key)
+        return assignment, submissions, pending, on_done
+    
+    def _build_report(self, assignment_name: str, turma_name: str, submissions: List[Submission]) -> CorrectionReport:
+        """Monta o relatório com as submissões já corrigidas."""
         report = CorrectionReport(
             assignment_name=assignment_name,
             turma=turma_name,
@@ -74,39 +214,480 @@ class CorrectionService:
         
         return report
     
-    def correct_all_assignments(self, turma_name: str) -> List[CorrectionReport]:
-        """Corrige todos os assignments de uma turma."""
+    def correct_all_assignments(self, turma_name: str, parallel_assignments: int = 1,
+                                progress_callback: Optional[Callable[[str, int, int], None]] = None) -> List[CorrectionReport]:
+        """
+        Corrige todos os assignments de uma turma.
+        
+        Com parallel_assignments > 1, vários assignments são corrigidos ao mesmo
+        tempo. Todos disputam o mesmo orçamento de concorrência (max_workers e
+        pools por estágio), então um assignment lento não bloqueia os demais
+        nem multiplica o número de processos.
+        """
         turma = self.submission_repo.get_turma(turma_name)
         if not turma:
             raise ValueError(f"Turma '{turma_name}' não encontrada")
         
         reports = []
         
-        for assignment_name in turma.assignments:
+        if parallel_assignments <= 1 or len(turma.assignments) <= 1:
+            for assignment_name in turma.assignments:
+                try:
+                    report = self.correct_assignment(assignment_name, turma_name, progress_callback=progress_callback)
+                    reports.append(report)
+                except Exception as e:
+                    print(f"Erro ao corrigir {assignment_name}: {e}")
+                    continue
+            return reports
+        
+        with ThreadPoolExecutor(max_workers=parallel_assignments, thread_name_prefix="assignment") as executor:
+            futures = {
+                assignment_name: executor.submit(
+                    self.correct_assignment, assignment_name, turma_name, progress_callback=progress_callback
+                )
+                for assignment_name in turma.assignments
+            }
+            # Mantém a ordem dos assignments da turma nos relatórios
+            for assignment_name in turma.assignments:
+                try:
+                    reports.append(futures[assignment_name].result())
+                except Exception as e:
+                    print(f"Erro ao corrigir {assignment_name}: {e}")
+        
+        return reports
+    
+    def _open_journal(self, assignment_name: str, turma_name: str,
+                      whole_assignment: bool = True) -> Optional[CorrectionJournal]:
+        """
+        Abre o journal do assignment.
+        
+        Só a correção do assignment inteiro (sem --resume) começa um journal
+        novo. Com --resume ou --submissao, os registros são acrescentados: na
+        leitura, a última linha de cada submissão substitui as anteriores, e as
+        demais submissões da turma continuam no journal.
+        """
+        if self.reports_path is None:
+            return None
+        
+        journal = CorrectionJournal(Path(self.reports_path) / f"{assignment_name}_{turma_name}.jsonl")
+        if self.resume or not whole_assignment:
+            journal.discard_partial_entry()
+        else:
+            journal.reset()
+        return journal
+    
+    @staticmethod
+    def _chain_callbacks(*callbacks: Optional[Callable[[Submission], None]]) -> Optional[Callable[[Submission], None]]:
+        """Combina os callbacks de submissão finalizada, ignorando os ausentes."""
+        active = [callback for callback in callbacks if callback is not None]
+        if not active:
+            return None
+        
+        def run(submission: Submission):
+            for callback in active:
+                try:
+                    callback(submission)
+                except Exception as e:
+                    print(f"⚠️  Erro ao finalizar submissão {submission.display_name}: {e}")
+        
+        return run
+    
+    def _load_previous_submissions(self, assignment_name: str, turma_name: str) -> Dict[Tuple[str, str], Submission]:
+        """Carrega as submissões do relatório anterior (<assignment>_<turma>.json), se existir."""
+        if self.reports_path is None:
+            return {}
+        
+        previous_path = Path(self.reports_path) / f"{assignment_name}_{turma_name}.json"
+        if not previous_path.exists():
+            return {}
+        
+        try:
+            previous_report = CorrectionReport.load_from_file(previous_path)
+        except Exception as e:
+            print(f"⚠️  Não foi possível ler o relatório anterior {previous_path}: {e}")
+            return {}
+        
+        return {self._submission_key(previous): previous for previous in previous_report.submissions}
+    
+    def _reuse_unchanged_submissions(self, submissions: List[Submission], assignment: Assignment,
+                                     turma_name: str, previous_by_key: Dict[Tuple[str, str], Submission],
+                                     journal: Optional[CorrectionJournal] = None) -> List[Submission]:
+        """
+        Calcula o fingerprint de cada submissão e copia os resultados já obtidos
+        quando ela não mudou: primeiro do journal (com --resume), depois do
+        relatório anterior (exceto com --force).
+        
+        Returns:
+            Submissões que ainda precisam ser corrigidas
+        """
+        from config import OPENAI_MODEL
+        from .prompt_manager import PromptManager
+        from ..utils.fingerprint import hash_directory, compute_submission_fingerprint
+        
+        prompt_manager = self.ai_analyzer.prompt_manager or PromptManager(self.enunciados_path)
+        prompt_template = prompt_manager.get_prompt_template(assignment.name, assignment.type.value)
+        enunciado_hash = hash_directory(assignment.path)
+        
+        for submission in submissions:
+            submission.fingerprint = compute_submission_fingerprint(
+                submission.submission_path, enunciado_hash, prompt_template, OPENAI_MODEL
+            )
+        
+        candidates = {} if self.force_regrade else dict(previous_by_key)
+        
+        if self.resume and journal is not None:
+            # O journal é mais recente que o relatório anterior
+            candidates.update(journal.load(assignment.name, turma_name))
+        
+        pending = []
+        for submission in submissions:
+            previous = candidates.get(self._submission_key(submission))
+            if previous is None or not previous.fingerprint or previous.fingerprint != submission.fingerprint:
+                pending.append(submission)
+                continue
+            # Análise ausente (erro no estágio de IA) ou com falha na chamada à
+            # IA: a nota 0 é provisória, então a submissão é corrigida de novo
+            analysis = previous.code_analysis or previous.html_analysis
+            if analysis is None or analysis.ai_failed:
+                pending.append(submission)
+                continue
+            self._copy_results(previous, submission)
+        
+        reused = len(submissions) - len(pending)
+        if reused:
+            print(f"♻️  {reused} submissão(ões) reaproveitada(s) para {assignment.name}")
+        return pending
+    
+    @staticmethod
+    def _copy_results(source: Submission, target: Submission):
+        """Copia os resultados de correção de uma submissão já corrigida."""
+        target.test_results = source.test_results
+        target.code_analysis = source.code_analysis
+        target.html_analysis = source.html_analysis
+        target.python_execution = source.python_execution
+        target.streamlit_thumbnail = source.streamlit_thumbnail
+        target.final_score = source.final_score
+        target.feedback = source.feedback
+        target.cache_provenance = source.cache_provenance
+        # Mantém as métricas da correção original para os estágios que não rodaram agora
+        target.stage_metrics = {**source.stage_metrics, **target.stage_metrics}
+    
+    def _order_by_expected_duration(self, submissions: List[Submission],
+                                    previous_by_key: Dict[Tuple[str, str], Submission]) -> List[Submission]:
+        """
+        Ordena as submissões da mais demorada para a mais rápida (LPT), usando a
+        duração registrada no relatório anterior.
+        
+        Submissões sem histórico recebem a mediana das conhecidas, para não
+        ficarem todas no fim da fila. A ordem do relatório não muda.
+        """
+        expected = {}
+        for submission in submissions:
+            previous = previous_by_key.get(self._submission_key(submission))
+            if previous is not None:
+                duration = self._recorded_duration(previous)
+                if duration > 0:
+                    expected[id(submission)] = duration
+        
+        if not expected:
+            return list(submissions)
+        
+        known = sorted(expected.values())
+        median = known[len(known) // 2]
+        # sorted é estável: empates mantêm a ordem original
+        return sorted(submissions, key=lambda s: expected.get(id(s), median), reverse=True)
+    
+    @staticmethod
+    def _recorded_duration(submission: Submission) -> float:
+        """Duração total registrada de uma correção anterior (em segundos)."""
+        if submission.stage_metrics:
+            return sum(stage.get("wall_time", 0.0) for stage in submission.stage_metrics.values())
+        # Relatórios antigos, sem stage_metrics: usa os tempos de teste e execução
+        duration = sum(test.execution_time for test in submission.test_results)
+        if submission.python_execution:
+            duration += submission.python_execution.execution_time or 0.0
+        if submission.streamlit_thumbnail:
+            from config import STREAMLIT_STARTUP_TIMEOUT
+            if submission.streamlit_thumbnail.streamlit_status == "timeout":
+                duration += STREAMLIT_STARTUP_TIMEOUT
+        return duration
+    
+    def _start_budget_clock(self):
+        """Inicia a contagem do --time-budget na primeira correção da execução."""
+        with self._deadline_lock:
+            if self.time_budget and self._deadline is None:
+                self._deadline = time.monotonic() + self.time_budget
+    
+    def _budget_exhausted(self) -> bool:
+        """Indica se o prazo do --time-budget já passou."""
+        return self._deadline is not None and time.monotonic() >= self._deadline
+    
+    @staticmethod
+    def _mark_pending(submission: Submission):
+        """Marca uma submissão que não foi corrigida dentro do orçamento de tempo."""
+        submission.grading_status = "pending"
+        submission.final_score = 0.0
+        submission.feedback = "⏳ Correção pendente: o orçamento de tempo (--time-budget) acabou antes desta submissão."
+        print(f"⏳ {submission.display_name} ficou pendente (orçamento de tempo esgotado)")
+    
+    @staticmethod
+    def _submission_key(submission: Submission) -> Tuple[str, str]:
+        """Chave de uma submissão entre execuções: (tipo, login do aluno ou nome do grupo)."""
+        if isinstance(submission, IndividualSubmission):
+            return "individual", submission.github_login
+        return "group", submission.group_name
+    
+    def _make_progress_notifier(self, assignment_name: str, total: int,
+                                progress_callback: Optional[Callable[[str, int, int], None]]) -> Optional[Callable[[Submission], None]]:
+        """Cria o callback chamado a cada submissão concluída de um assignment."""
+        if progress_callback is None:
+            return None
+        
+        lock = threading.Lock()
+        state = {"done": 0}
+        
+        def notify(submission: Submission):
+            with lock:
+                state["done"] += 1
+                done = state["done"]
             try:
-                report = self.correct_assignment(assignment_name, turma_name)
-                reports.append(report)
+                progress_callback(assignment_name, done, total)
             except Exception as e:
-                print(f"Erro ao corrigir {assignment_name}: {e}")
-                continue
+                print(f"⚠️  Erro ao reportar progresso de {assignment_name}: {e}")
         
-        return reports
+        return notify
+    
+    def _process_submissions(self, submissions: List[Submission], assignment: Assignment,
+                             on_done: Optional[Callable[[Submission], None]] = None):
+        """
+        Processa as submissões usando um pool de workers.
+        
+        Cada submissão é atualizada in-place, então a ordem da lista (e do
+        relatório) é a mesma de uma execução serial. Erros ficam isolados
+        na submissão que os gerou.
+        """
+        self._run_tests_in_batches(submissions, assignment)
+        
+        if self.use_pipeline:
+            self._process_submissions_pipelined(submissions, assignment, on_done)
+            return
+        
+        workers = min(self.max_workers, len(submissions))
+        if workers <= 1:
+            for submission in submissions:
+                self._process_submission_safely(submission, assignment, on_done)
+            return
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="correcao") as executor:
+            futures = [
+                executor.submit(self._process_submission_safely, submission, assignment, on_done)
+                for submission in submissions
+            ]
+            for future in futures:
+                future.result()
+    
+    def _run_tests_in_batches(self, submissions: List[Submission], assignment: Assignment):
+        """
+        Roda os testes em lotes (PYTEST_BATCH_ASSIGNMENTS) antes dos demais estágios.
+        
+        Cada lote é uma sessão de worker pytest com várias submissões; os lotes
+        rodam em paralelo, limitados pelos slots do estágio de testes. O tempo
+        de cada lote é dividido igualmente entre as suas submissões em
+        stage_metrics["tests"]; tests_batched faz o estágio de testes pular
+        essas submissões depois.
+        """
+        from config import PYTEST_BATCH_ASSIGNMENTS, PIPELINE_STAGE_WORKERS
+        
+        batch_size = PYTEST_BATCH_ASSIGNMENTS.get(assignment.name, 1)
+        if batch_size <= 1 or assignment.type != AssignmentType.PYTHON or not assignment.test_files or len(submissions) < 2:
+            return
+        
+        batches = [submissions[i:i + batch_size] for i in range(0, len(submissions), batch_size)]
+        
+        def run_batch(batch: List[Submission]):
+            if self._budget_exhausted():
+                return
+            batch_metrics: Dict[str, Dict[str, float]] = {}
+            try:
+                with self._stage_slots["tests"], measure_stage(batch_metrics, "tests"):
+                    results = self.test_executor.run_tests_batch(
+                        [(submission.submission_path, assignment.test_files) for submission in batch],
+                        [submission.cache_provenance for submission in batch],
+                        **self._pytest_options(assignment)
+                    )
+            except Exception as e:
+                # As submissões do lote seguem para o estágio de testes normal
+                print(f"  ⚠️  Erro no lote de testes de {assignment.name}: {e}")
+                return
+            
+            share = {
+                key: value if key == "peak_rss_mb" else round(value / len(batch), 4)
+                for key, value in batch_metrics["tests"].items()
+            }
+            for submission, test_results in zip(batch, results):
+                submission.test_results = test_results
+                submission.stage_metrics["tests"] = dict(share)
+                submission.tests_batched = True
+        
+        print(f"🧪 Executando testes de {len(submissions)} submissões em {len(batches)} lote(s)...")
+        workers = min(len(batches), PIPELINE_STAGE_WORKERS.get("tests", 1))
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="testes-lote") as executor:
+            list(executor.map(run_batch, batches))
+    
+    def _process_submissions_pipelined(self, submissions: List[Submission], assignment: Assignment,
+                                       on_done: Optional[Callable[[Submission], None]] = None):
+        """
+        Processa as submissões em um pipeline com um pool por estágio.
+        
+        Testes, execução, thumbnail e IA têm filas e workers próprios
+        (PIPELINE_STAGE_WORKERS), então uma submissão entra no estágio seguinte
+        assim que termina o anterior. Cada estágio recebe o próprio objeto da
+        submissão, com os resultados dos estágios anteriores.
+        """
+        from config import PIPELINE_STAGE_WORKERS, PIPELINE_QUEUE_SIZE
+        
+        stage_funcs = [
+            ("tests", self._run_tests_stage),
+            ("execution", self._run_execution_stage),
+            ("thumbnail", self._run_thumbnail_stage),
+            ("ai", self._run_ai_stage),
+            ("scoring", self._run_scoring_stage),
+        ]
+        stages = [
+            PipelineStage(
+                name=name,
+                # O orçamento de tempo é verificado quando a submissão começa (primeiro estágio)
+                func=self._gated_stage(name, func, assignment, check_budget=(index == 0)),
+                workers=PIPELINE_STAGE_WORKERS.get(name, 1)
+            )
+            for index, (name, func) in enumerate(stage_funcs)
+        ]
+        if on_done is not None:
+            def notify_graded(submission: Submission):
+                if submission.grading_status != "pending":
+                    on_done(submission)
+            stages.append(PipelineStage(name="progress", func=notify_graded, workers=1))
+        GradingPipeline(stages, queue_size=PIPELINE_QUEUE_SIZE).run(submissions)
+    
+    def _gated_stage(self, name: str, func: Callable[[Submission, Assignment], None],
+                     assignment: Assignment, check_budget: bool = False) -> Callable[[Submission], None]:
+        """
+        Envolve um estágio no semáforo global do estágio (compartilhado entre assignments).
+        
+        Submissões pendentes (--time-budget) atravessam os estágios sem processamento.
+        """
+        slots = self._stage_slots.get(name)
+        
+        def run(submission: Submission):
+            if check_budget and self._budget_exhausted():
+                self._mark_pending(submission)
+            if submission.grading_status == "pending":
+                return
+            if slots is None:
+                func(submission, assignment)
+                return
+            with slots:
+                func(submission, assignment)
+        
+        return run
+    
+    async def _process_submissions_async(self, submissions: List[Submission], assignment: Assignment,
+                                         on_done: Optional[Callable[[Submission], None]] = None):
+        """Processa as submissões como corrotinas, na ordem da lista, com os limites globais por estágio."""
+        from config import PIPELINE_STAGE_WORKERS
+        
+        await asyncio.to_thread(self._run_tests_in_batches, submissions, assignment)
+        
+        submission_slots = asyncio.Semaphore(self.max_workers)
+        stage_slots = {
+            name: asyncio.Semaphore(max(1, workers))
+            for name, workers in PIPELINE_STAGE_WORKERS.items()
+        }
+        
+        async def run(submission: Submission):
+            async with _async_slot(submission_slots, self._submission_slots):
+                if self._budget_exhausted():
+                    self._mark_pending(submission)
+                    return
+                try:
+                    await self._process_submission_async(submission, assignment, stage_slots)
+                except Exception as e:
+                    print(f"❌ Erro ao processar submissão {submission.display_name}: {e}")
+            
+            if on_done is not None:
+                await asyncio.to_thread(on_done, submission)
+        
+        await asyncio.gather(*(run(submission) for submission in submissions))
+    
+    async def _process_submission_async(self, submission: Submission, assignment: Assignment,
+                                        stage_slots: Dict[str, asyncio.Semaphore]):
+        """Processa uma submissão com os estágios assíncronos (e os limites globais de cada estágio)."""
+        async with _async_slot(stage_slots["tests"], self._stage_slots.get("tests")):
+            await self._run_tests_stage_async(submission, assignment)
+        async with _async_slot(stage_slots["execution"], self._stage_slots.get("execution")):
+            await self._run_execution_stage_async(submission, assignment)
+        async with _async_slot(stage_slots["thumbnail"], self._browser_slots):
+            await self._run_thumbnail_stage_async(submission, assignment)
+        async with _async_slot(stage_slots["ai"], self._stage_slots.get("ai")):
+            await self._run_ai_stage_async(submission, assignment)
+        await asyncio.to_thread(self._run_scoring_stage, submission, assignment)
+    
+    def _process_submission_safely(self, submission: Submission, assignment: Assignment,
+                                   on_done: Optional[Callable[[Submission], None]] = None):
+        """
+        Processa uma submissão sem propagar exceções para as demais.
+        
+        Submissões pendentes (--time-budget) não chamam on_done: não entram
+        no journal nem no progresso, como no pipeline e no caminho asyncio.
+        """
+        with self._submission_slots:
+            if self._budget_exhausted():
+                self._mark_pending(submission)
+                return
+            try:
+                self._process_submission(submission, assignment)
+            except Exception as e:
+                print(f"❌ Erro ao processar submissão {submission.display_name}: {e}")
+        
+        if on_done is not None:
+            on_done(submission)
     
     def _process_submission(self, submission: Submission, assignment: Assignment):
         """Processa uma submissão."""
+        self._run_tests_stage(submission, assignment)
+        self._run_execution_stage(submission, assignment)
+        self._run_thumbnail_stage(submission, assignment)
+        self._run_ai_stage(submission, assignment)
+        self._run_scoring_stage(submission, assignment)
+    
+    @staticmethod
+    def _pytest_options(assignment: Assignment) -> Dict[str, Any]:
+        """Tempo limite por teste, fail-fast e limites de recursos do assignment (config.py), com os testes oficiais do enunciado."""
+        from config import get_pytest_test_timeout, get_resource_limits, PYTEST_FAIL_FAST
+        return {"test_timeout": get_pytest_test_timeout(assignment.name), "fail_fast": PYTEST_FAIL_FAST,
+                "tests_dir": assignment.path, "resource_limits": get_resource_limits(assignment.name)}
+    
+    def _run_tests_stage(self, submission: Submission, assignment: Assignment):
+        """Executa os testes pytest da submissão (assignments Python)."""
         print(f"Processando submissão de {submission.display_name}...")
         
         try:
             # Executa testes se for assignment Python
-            if assignment.type == AssignmentType.PYTHON and assignment.test_files:
-                submission.test_results = self.test_executor.run_tests(
-                    submission.submission_path, 
-                    assignment.test_files
-                )
+            if assignment.type == AssignmentType.PYTHON and assignment.test_files \
+                    and not submission.tests_batched:
+                with measure_stage(submission.stage_metrics, "tests"):
+                    submission.test_results = self.test_executor.run_tests(
+                        submission.submission_path,
+                        assignment.test_files,
+                        provenance=submission.cache_provenance,
+                        **self._pytest_options(assignment)
+                    )
         except Exception as e:
             print(f"  ⚠️  Erro nos testes para {submission.display_name}: {e}")
             submission.test_results = []
-        
+    
+    def _run_execution_stage(self, submission: Submission, assignment: Assignment):
+        """Executa o programa Python do aluno (terminal ou interativo)."""
         try:
             # Executa código Python se for assignment Python de terminal
             if assignment.type == AssignmentType.PYTHON:
@@ -115,17 +696,46 @@ class CorrectionService:
                 # Verifica se é um assignment interativo (usa config ao invés de lista hardcoded)
                 if assignment.name in INTERACTIVE_ASSIGNMENTS_CONFIG:
                     print(f"  🔄 Executando programa interativo para {submission.display_name}...")
-                    submission.python_execution = self.interactive_execution_service.execute_interactive_program(
-                        assignment.name, submission.submission_path
-                    )
+                    with measure_stage(submission.stage_metrics, "execution"):
+                        submission.python_execution = self.interactive_execution_service.execute_interactive_program(
+                            assignment.name, submission.submission_path, provenance=submission.cache_provenance,
+                            workdir=self._shared_workspace(submission, assignment)
+                        )
                 elif assignment_has_python_execution(assignment.name):
-                    submission.python_execution = self.python_execution_service._execute_submission_python(
-                        submission, assignment.name, submission.turma
-                    )
+                    with measure_stage(submission.stage_metrics, "execution"):
+                        submission.python_execution = self.python_execution_service._execute_submission_python(
+                            submission, assignment.name, submission.turma, provenance=submission.cache_provenance,
+                            workdir=self._shared_workspace(submission, assignment)
+                        )
         except Exception as e:
             print(f"  ⚠️  Erro na execução Python para {submission.display_name}: {e}")
             submission.python_execution = None
-
+    
+    @staticmethod
+    def _shared_workspace(submission: Submission, assignment: Assignment) -> Optional[Path]:
+        """
+        Cópia da submissão compartilhada pela execução do main.py e pelo thumbnail do Streamlit.
+        
+        O dashboard costuma ler arquivos gerados pelo main.py (ex.: o CSV do
+        scraper), então os dois rodam na mesma cópia, liberada ao fim do
+        estágio de thumbnail. None quando o assignment não tem dashboard.
+        """
+        from config import ASSIGNMENTS_WITH_THUMBNAILS
+        if ASSIGNMENTS_WITH_THUMBNAILS.get(assignment.name) != "streamlit":
+            return None
+        if submission.workspace is None:
+            submission.workspace = get_workspace_manager().create(submission.submission_path)
+        return submission.workspace
+    
+    @staticmethod
+    def _release_workspace(submission: Submission):
+        """Remove a cópia criada por _shared_workspace, se houver."""
+        if submission.workspace is not None:
+            get_workspace_manager().release(submission.workspace)
+            submission.workspace = None
+    
+    def _run_thumbnail_stage(self, submission: Submission, assignment: Assignment):
+        """Captura o thumbnail do Streamlit, limitado pelos slots de navegador."""
         try:
             # Captura thumbnail do Streamlit se aplicável
             from config import ASSIGNMENTS_WITH_THUMBNAILS
@@ -134,9 +744,10 @@ class CorrectionService:
                 if thumbnail_type == "streamlit":
                     print(f"  📸 Capturando thumbnail do Streamlit para {submission.display_name}...")
                     try:
-                        thumbnail_result = self.streamlit_thumbnail_service._capture_submission_thumbnail(
-                            submission, assignment.name, submission.turma
-                        )
+                        with self._browser_slots, measure_stage(submission.stage_metrics, "thumbnail"):
+                            thumbnail_result = self.streamlit_thumbnail_service._capture_submission_thumbnail(
+                                submission, assignment.name, submission.turma, workdir=submission.workspace
+                            )
                         submission.streamlit_thumbnail = thumbnail_result
                         if thumbnail_result.streamlit_exceptions:
                             print(f"  ⚠️  {len(thumbnail_result.streamlit_exceptions)} erro(s) detectado(s) no Streamlit")
@@ -146,7 +757,11 @@ class CorrectionService:
         except Exception as e:
             print(f"  ⚠️  Erro na captura de thumbnail para {submission.display_name}: {e}")
             submission.streamlit_thumbnail = None
-
+        finally:
+            self._release_workspace(submission)
+    
+    def _run_ai_stage(self, submission: Submission, assignment: Assignment):
+        """Analisa o código com IA usando os resultados dos estágios anteriores."""
         try:
             # Analisa código usando IA
             if assignment.type == AssignmentType.PYTHON:
@@ -155,12 +770,14 @@ class CorrectionService:
                     assignment,
                     submission.python_execution,
                     submission.test_results,
-                    submission.streamlit_thumbnail
+                    submission.streamlit_thumbnail,
+                    metrics=submission.stage_metrics
                 )
             else:  # HTML
                 submission.html_analysis = self.ai_analyzer.analyze_html_code(
                     submission.submission_path, 
-                    assignment
+                    assignment,
+                    metrics=submission.stage_metrics
                 )
         except Exception as e:
             print(f"  ⚠️  Erro na análise de IA para {submission.display_name}: {e}")
@@ -168,12 +785,105 @@ class CorrectionService:
                 submission.code_analysis = None
             else:
                 submission.html_analysis = None
+    
+    async def _run_tests_stage_async(self, submission: Submission, assignment: Assignment):
+        """Versão assíncrona de _run_tests_stage (pytest como subprocesso asyncio)."""
+        print(f"Processando submissão de {submission.display_name}...")
         
-        # Calcula nota final
-        submission.final_score = self._calculate_final_score(submission, assignment)
+        try:
+            if assignment.type == AssignmentType.PYTHON and assignment.test_files \
+                    and not submission.tests_batched:
+                with measure_stage(submission.stage_metrics, "tests"):
+                    submission.test_results = await self.test_executor.run_tests_async(
+                        submission.submission_path,
+                        assignment.test_files,
+                        provenance=submission.cache_provenance,
+                        **self._pytest_options(assignment)
+                    )
+        except Exception as e:
+            print(f"  ⚠️  Erro nos testes para {submission.display_name}: {e}")
+            submission.test_results = []
+    
+    async def _run_execution_stage_async(self, submission: Submission, assignment: Assignment):
+        """Versão assíncrona de _run_execution_stage."""
+        try:
+            if assignment.type == AssignmentType.PYTHON:
+                from config import assignment_has_python_execution, INTERACTIVE_ASSIGNMENTS_CONFIG
+                
+                if assignment.name in INTERACTIVE_ASSIGNMENTS_CONFIG:
+                    # O diálogo com o programa interativo é síncrono: roda no executor
+                    print(f"  🔄 Executando programa interativo para {submission.display_name}...")
+                    workdir = await asyncio.to_thread(self._shared_workspace, submission, assignment)
+                    with measure_stage(submission.stage_metrics, "execution"):
+                        submission.python_execution = await asyncio.to_thread(
+                            self.interactive_execution_service.execute_interactive_program,
+                            assignment.name, submission.submission_path, submission.cache_provenance, workdir
+                        )
+                elif assignment_has_python_execution(assignment.name):
+                    workdir = await asyncio.to_thread(self._shared_workspace, submission, assignment)
+                    with measure_stage(submission.stage_metrics, "execution"):
+                        submission.python_execution = await self.python_execution_service._execute_submission_python_async(
+                            submission, assignment.name, submission.turma, provenance=submission.cache_provenance,
+                            workdir=workdir
+                        )
+        except Exception as e:
+            print(f"  ⚠️  Erro na execução Python para {submission.display_name}: {e}")
+            submission.python_execution = None
+    
+    async def _run_thumbnail_stage_async(self, submission: Submission, assignment: Assignment):
+        """Versão assíncrona de _run_thumbnail_stage (probe HTTP assíncrono do Streamlit)."""
+        from config import ASSIGNMENTS_WITH_THUMBNAILS
+        if ASSIGNMENTS_WITH_THUMBNAILS.get(assignment.name) != "streamlit":
+            return
         
-        # Gera feedback
-        submission.feedback = self._generate_feedback(submission, assignment)
+        print(f"  📸 Capturando thumbnail do Streamlit para {submission.display_name}...")
+        try:
+            with measure_stage(submission.stage_metrics, "thumbnail"):
+                thumbnail_result = await self.streamlit_thumbnail_service._capture_submission_thumbnail_async(
+                    submission, assignment.name, submission.turma, workdir=submission.workspace
+                )
+            submission.streamlit_thumbnail = thumbnail_result
+            if thumbnail_result.streamlit_exceptions:
+                print(f"  ⚠️  {len(thumbnail_result.streamlit_exceptions)} erro(s) detectado(s) no Streamlit")
+        except Exception as e:
+            print(f"  ⚠️  Erro ao capturar thumbnail: {e}")
+            submission.streamlit_thumbnail = None
+        finally:
+            await asyncio.to_thread(self._release_workspace, submission)
+    
+    async def _run_ai_stage_async(self, submission: Submission, assignment: Assignment):
+        """Versão assíncrona de _run_ai_stage (cliente AsyncOpenAI)."""
+        try:
+            if assignment.type == AssignmentType.PYTHON:
+                submission.code_analysis = await self.ai_analyzer.analyze_python_code_async(
+                    submission.submission_path,
+                    assignment,
+                    submission.python_execution,
+                    submission.test_results,
+                    submission.streamlit_thumbnail,
+                    metrics=submission.stage_metrics
+                )
+            else:  # HTML
+                submission.html_analysis = await self.ai_analyzer.analyze_html_code_async(
+                    submission.submission_path,
+                    assignment,
+                    metrics=submission.stage_metrics
+                )
+        except Exception as e:
+            print(f"  ⚠️  Erro na análise de IA para {submission.display_name}: {e}")
+            if assignment.type == AssignmentType.PYTHON:
+                submission.code_analysis = None
+            else:
+                submission.html_analysis = None
+    
+    def _run_scoring_stage(self, submission: Submission, assignment: Assignment):
+        """Calcula a nota final e gera o feedback."""
+        with measure_stage(submission.stage_metrics, "scoring"):
+            # Calcula nota final
+            submission.final_score = self._calculate_final_score(submission, assignment)
+            
+            # Gera feedback
+            submission.feedback = self._generate_feedback(submission, assignment)
     
     def _calculate_final_score(self, submission: Submission, assignment: Assignment) -> float:
         """Calcula a nota final baseada nos critérios da rubrica."""
@@ -278,21 +988,4 @@ class CorrectionService:
     
     def _calculate_summary(self, submissions: List[Submission]) -> dict:
         """Calcula estatísticas resumidas das submissões."""
-        if not submissions:
-            return {}
-        
-        scores = [sub.final_score for sub in submissions]
-        
-        # Arredonda para uma casa decimal para consistência visual
-        avg = round(sum(scores) / len(scores), 1)
-        min_score = round(min(scores), 1)
-        max_score = round(max(scores), 1)
-        
-        return {
-            "total_submissions": len(submissions),
-            "average_score": avg,
-            "min_score": min_score,
-            "max_score": max_score,
-            "passing_rate": sum(1 for score in scores if score >= 6.0) / len(scores),
-            "excellent_rate": sum(1 for score in scores if score >= 9.0) / len(scores)
-        } 
\ No newline at end of file
+        return CorrectionReport.calculate_summary(submissions)
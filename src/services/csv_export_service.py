@@ -78,8 +78,15 @@ class CSVExportService:
         """Carrega relatório de um arquivo JSON."""
         json_filename = f"{assignment_name}_{turma_name}.json"
         json_path = self.reports_path / json_filename
+        jsonl_path = json_path.with_suffix(".jsonl")
         
         if not json_path.exists():
+            # Correção em andamento ou interrompida: usa o JSONL gravado por submissão
+            if jsonl_path.exists():
+                try:
+                    return CorrectionReport.load_from_jsonl(jsonl_path, assignment_name, turma_name)
+                except Exception as e:
+                    print(f"⚠️  Erro ao carregar {jsonl_path.name}: {e}")
             return None
         
         try:
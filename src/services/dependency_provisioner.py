@@ -0,0 +1,151 @@
+"""
+Instalação das dependências usadas pelo código dos alunos.
+
+Os serviços de execução e de Streamlit chamavam `pip install <pacote>` uma
+vez por pacote, em sequência, no início de cada geração e de novo a cada
+ImportError, mesmo com tudo já instalado. Aqui os pacotes instalados no
+ambiente são consultados via importlib.metadata e só os que faltam são
+instalados, em uma única chamada ao pip.
+
+Com um wheelhouse local (DEPENDENCY_WHEELHOUSE), o pip procura os pacotes
+primeiro nele; com DEPENDENCY_OFFLINE, só nele (sem acesso à rede).
+"""
+import json
+import re
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Set
+
+from .environment_resolver import EnvironmentResolver, get_environment_resolver
+
+# Lista as distribuições e os módulos de topo instalados no interpretador que o executa
+_LIST_DISTRIBUTIONS = (
+    "import json, importlib.metadata as m; "
+    "print(json.dumps({'distributions': sorted({d.metadata['Name'] for d in m.distributions() if d.metadata['Name']}), "
+    "'modules': sorted(getattr(m, 'packages_distributions', dict)())}))"
+)
+
+
+def normalize_name(requirement: str) -> str:
+    """Nome normalizado de uma dependência (PEP 503), sem versão nem extras."""
+    name = re.split(r"[\s\[<>=!~;@]", requirement.strip(), maxsplit=1)[0]
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+class DependencyProvisioner:
+    """Garante que dependências estejam instaladas no ambiente das execuções."""
+
+    def __init__(self, resolver: EnvironmentResolver, wheelhouse: Optional[Path] = None,
+                 offline: bool = False, timeout: int = 600):
+        self.resolver = resolver
+        self.wheelhouse = Path(wheelhouse) if wheelhouse else None
+        self.offline = offline
+        self.timeout = timeout
+        self._installed: Optional[Set[str]] = None
+        self._modules: Set[str] = set()
+        # Já passadas ao pip nesta execução (não tenta de novo se a instalação falhou)
+        self._attempted: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def ensure(self, requirements: Iterable[str]) -> List[str]:
+        """
+        Instala as dependências que ainda não estão no ambiente.
+
+        Chamadas repetidas com pacotes já presentes (ou que o pip já tentou
+        instalar nesta execução) não executam nenhum processo.
+
+        Returns:
+            Dependências que faltavam e foram passadas ao pip
+        """
+        with self._lock:
+            installed = self.installed_distributions()
+            missing = [req for req in dict.fromkeys(requirements)
+                       if normalize_name(req) not in installed and normalize_name(req) not in self._attempted]
+            if not missing:
+                return []
+            self._attempted.update(normalize_name(req) for req in missing)
+
+            print(f"📦 Instalando {len(missing)} dependência(s) ausente(s): {', '.join(missing)}")
+            cmd = self.resolver.command("python", "-m", "pip", "install", *self.pip_source_args(), *missing)
+            try:
+                result = subprocess.run(
+                    cmd,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    env=self.resolver.env(),
+                    text=True,
+                    timeout=self.timeout
+                )
+                if result.returncode != 0:
+                    print(f"⚠️  Falha ao instalar dependências: {result.stderr.strip()[-500:]}")
+            except (OSError, subprocess.TimeoutExpired) as e:
+                print(f"⚠️  Falha ao instalar dependências: {e}")
+
+            # Consulta de novo: o pip pode ter instalado só parte da lista
+            self._installed = None
+            return missing
+
+    def pip_source_args(self) -> List[str]:
+        """Argumentos do pip para usar o wheelhouse local (e só ele, se offline)."""
+        args = []
+        if self.wheelhouse is not None and self.wheelhouse.is_dir():
+            args += ["--find-links", str(self.wheelhouse)]
+        if self.offline:
+            args.append("--no-index")
+        return args
+
+    def installed_distributions(self) -> Set[str]:
+        """Nomes normalizados das distribuições instaladas no ambiente das execuções."""
+        if self._installed is not None:
+            return self._installed
+
+        venv = self.resolver.venv_path()
+        if venv is not None and venv.resolve() == Path(sys.prefix).resolve():
+            # O corretor roda no próprio ambiente: consulta sem subprocesso
+            import importlib.metadata
+            listing = {
+                "distributions": [dist.metadata["Name"] for dist in importlib.metadata.distributions()
+                                  if dist.metadata["Name"]],
+                "modules": list(getattr(importlib.metadata, "packages_distributions", dict)()),
+            }
+        else:
+            try:
+                result = subprocess.run(
+                    self.resolver.command("python", "-c", _LIST_DISTRIBUTIONS),
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    env=self.resolver.env(),
+                    text=True,
+                    timeout=60
+                )
+                listing = json.loads(result.stdout) if result.returncode == 0 else {}
+            except (OSError, ValueError, subprocess.TimeoutExpired):
+                listing = {}
+
+        self._installed = {normalize_name(name) for name in listing.get("distributions", [])}
+        self._modules = set(listing.get("modules", []))
+        return self._installed
+
+    def installed_modules(self) -> Set[str]:
+        """Módulos de topo importáveis no ambiente das execuções (ex.: "bs4", "yaml")."""
+        with self._lock:
+            self.installed_distributions()
+            return set(self._modules)
+
+
+_provisioner: Optional[DependencyProvisioner] = None
+_provisioner_lock = threading.Lock()
+
+
+def get_dependency_provisioner() -> DependencyProvisioner:
+    """Retorna o provisionador compartilhado (DEPENDENCY_* no config.py)."""
+    global _provisioner
+    from config import DEPENDENCY_WHEELHOUSE, DEPENDENCY_OFFLINE, DEPENDENCY_INSTALL_TIMEOUT
+
+    with _provisioner_lock:
+        if _provisioner is None:
+            _provisioner = DependencyProvisioner(get_environment_resolver(), DEPENDENCY_WHEELHOUSE,
+                                                 DEPENDENCY_OFFLINE, DEPENDENCY_INSTALL_TIMEOUT)
+        return _provisioner
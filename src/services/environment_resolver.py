@@ -0,0 +1,131 @@
+"""
+Resolução do ambiente Python usado para executar o código dos alunos.
+
+Cada `pipenv run python ...` gasta uma fração de segundo localizando o
+virtualenv antes de o programa do aluno começar. Aqui o virtualenv do Pipenv
+é localizado uma única vez (`pipenv --venv`) e os executáveis dele (python,
+pip, streamlit) são chamados diretamente.
+
+O caminho encontrado fica em cache em disco, associado ao hash do
+Pipfile.lock: enquanto as dependências não mudam, nem a primeira chamada
+precisa do pipenv. Se a resolução falhar, os comandos voltam a usar
+`pipenv run`.
+"""
+import hashlib
+import os
+import subprocess
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from ..utils.disk_cache import DiskCache
+from .workspace_manager import pipenv_env
+
+
+class EnvironmentResolver:
+    """Localiza o virtualenv do Pipenv e monta os comandos que o usam."""
+
+    def __init__(self, project_dir: Path, cache: Optional[DiskCache] = None):
+        self.project_dir = Path(project_dir)
+        self.cache = cache
+        self._venv: Optional[Path] = None
+        self._resolved = False
+        self._lock = threading.Lock()
+
+    def venv_path(self) -> Optional[Path]:
+        """Diretório do virtualenv, ou None se não foi possível resolvê-lo."""
+        with self._lock:
+            if not self._resolved:
+                self._venv = self._resolve()
+                self._resolved = True
+            return self._venv
+
+    def command(self, executable: str, *args: str) -> List[str]:
+        """
+        Comando para rodar um executável do ambiente.
+
+        Ex.: command("python", "main.py") → [".../venv/bin/python", "main.py"],
+        ou ["pipenv", "run", "python", "main.py"] se o virtualenv não foi resolvido.
+        """
+        venv = self.venv_path()
+        if venv is not None:
+            path = venv_executable(venv, executable)
+            if path.exists():
+                return [str(path), *args]
+        return ["pipenv", "run", executable, *args]
+
+    def env(self) -> Dict[str, str]:
+        """Ambiente dos subprocessos: o virtualenv ativado, como faria o `pipenv run`."""
+        env = pipenv_env()
+        venv = self.venv_path()
+        if venv is not None:
+            env["VIRTUAL_ENV"] = str(venv)
+            env["PATH"] = os.pathsep.join(filter(None, [str(venv_executable(venv, "python").parent),
+                                                        env.get("PATH")]))
+            env.pop("PYTHONHOME", None)
+        return env
+
+    def _resolve(self) -> Optional[Path]:
+        """Lê o virtualenv do cache (pelo hash do Pipfile.lock) ou pergunta ao pipenv."""
+        key = self._lock_hash()
+        if self.cache is not None and key is not None:
+            entry = self.cache.get(key)
+            if entry and venv_executable(Path(entry["venv"]), "python").exists():
+                return Path(entry["venv"])
+
+        try:
+            result = subprocess.run(
+                ["pipenv", "--venv"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                cwd=self.project_dir,
+                env=pipenv_env(),
+                text=True,
+                timeout=60
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"⚠️  Não foi possível localizar o ambiente do Pipenv, usando `pipenv run`: {e}")
+            return None
+
+        venv = Path(result.stdout.strip()) if result.returncode == 0 else None
+        if venv is None or not venv_executable(venv, "python").exists():
+            print(f"⚠️  Não foi possível localizar o ambiente do Pipenv, usando `pipenv run`: {result.stderr.strip()}")
+            return None
+
+        if self.cache is not None and key is not None:
+            self.cache.set(key, {"venv": str(venv)})
+        return venv
+
+    def _lock_hash(self) -> Optional[str]:
+        """Hash do Pipfile.lock (e do caminho do projeto), ou None se não houver lock."""
+        lock_file = self.project_dir / "Pipfile.lock"
+        try:
+            content = lock_file.read_bytes()
+        except OSError:
+            return None
+        digest = hashlib.sha256(str(self.project_dir.resolve()).encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(content)
+        return digest.hexdigest()
+
+
+def venv_executable(venv: Path, name: str) -> Path:
+    """Caminho de um executável dentro do virtualenv (bin/ no Linux/macOS, Scripts/ no Windows)."""
+    if os.name == "nt":
+        return venv / "Scripts" / f"{name}.exe"
+    return venv / "bin" / name
+
+
+_resolver: Optional[EnvironmentResolver] = None
+_resolver_lock = threading.Lock()
+
+
+def get_environment_resolver() -> EnvironmentResolver:
+    """Retorna o resolvedor compartilhado (o virtualenv é resolvido uma vez por execução)."""
+    global _resolver
+    from config import BASE_DIR, CACHE_DIR
+
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = EnvironmentResolver(BASE_DIR, DiskCache(CACHE_DIR / "environments", 1024 * 1024))
+        return _resolver
@@ -0,0 +1,84 @@
+"""
+Cache dos resultados das execuções de terminal e interativas.
+
+O resultado de um programa depende do código da submissão e dos parâmetros da
+execução (argumentos, entradas, timeout, limites), que formam a chave (ver
+compute_execution_key). Corrigir de novo após ajustar o prompt não executa
+outra vez todos os programas.
+
+Scrapers dependem também das respostas da rede, que não entram na chave: as
+entradas valem por EXECUTION_CACHE_TTL segundos. Execuções que falharam por
+motivos do corretor (erro, timeout) não são guardadas.
+"""
+import threading
+from dataclasses import asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from ..domain.models import PythonExecutionResult
+from ..utils.disk_cache import DiskCache
+from ..utils.fingerprint import compute_execution_key
+
+
+class ExecutionCache:
+    """Resultados de execução em disco (LRU por tamanho), com validade opcional."""
+
+    def __init__(self, cache: DiskCache, ttl: Optional[float] = None):
+        self.cache = cache
+        self.ttl = ttl
+
+    def lookup(self, submission_path: Path, parameters: Dict[str, Any],
+               provenance: Optional[Dict[str, Dict[str, str]]] = None
+               ) -> Tuple[str, Optional[PythonExecutionResult]]:
+        """
+        Retorna (chave, resultado em cache ou None).
+
+        Num acerto, registra a origem em provenance["execution"] (chave e
+        momento da execução original). A chave não inclui quem submeteu:
+        submission_identifier e display_name são os da execução original e
+        quem chama deve trocá-los pelos seus.
+        """
+        key = compute_execution_key(submission_path, parameters)
+        entry = self.cache.get(key)
+        if entry is None or self._expired(entry.get("cached_at", "")):
+            return key, None
+        try:
+            result = PythonExecutionResult(**entry["result"])
+        except (KeyError, TypeError):
+            return key, None
+
+        if provenance is not None:
+            provenance["execution"] = {"cache_key": key[:16], "cached_at": entry["cached_at"]}
+        return key, result
+
+    def store(self, key: str, result: PythonExecutionResult) -> None:
+        """Guarda o resultado, exceto erros e timeouts (return_code -1)."""
+        if result.execution_status == "error" or result.return_code == -1:
+            return
+        self.cache.set(key, {"cached_at": datetime.now().isoformat(), "result": asdict(result)})
+
+    def _expired(self, cached_at: str) -> bool:
+        if self.ttl is None:
+            return False
+        try:
+            age = datetime.now() - datetime.fromisoformat(cached_at)
+        except ValueError:
+            return True
+        return age.total_seconds() > self.ttl
+
+
+_cache: Optional[ExecutionCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_execution_cache() -> ExecutionCache:
+    """Retorna o cache compartilhado (CACHE_DIR/executions)."""
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            from config import CACHE_DIR, EXECUTION_CACHE_MAX_BYTES, EXECUTION_CACHE_TTL
+            _cache = ExecutionCache(DiskCache(CACHE_DIR / "executions", EXECUTION_CACHE_MAX_BYTES),
+                                    EXECUTION_CACHE_TTL)
+        return _cache
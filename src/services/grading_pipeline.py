@@ -0,0 +1,87 @@
+"""
+Pipeline de correção com um pool de workers por estágio.
+
+Cada estágio (testes, execução, thumbnail, IA...) tem sua própria fila
+limitada e seu próprio conjunto de threads. Um item segue para o próximo
+estágio assim que o estágio anterior termina, então estágios que usam
+recursos diferentes (CPU, navegador, rede) trabalham ao mesmo tempo em
+submissões diferentes.
+"""
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, List
+
+
+# Marca o fim da fila de um estágio
+_SENTINEL = object()
+
+
+@dataclass
+class PipelineStage:
+    """Definição de um estágio do pipeline."""
+    name: str
+    func: Callable[[Any], None]
+    workers: int = 1
+
+
+class GradingPipeline:
+    """Executa itens através de uma sequência de estágios com pools independentes."""
+
+    def __init__(self, stages: List[PipelineStage], queue_size: int = 8):
+        if not stages:
+            raise ValueError("O pipeline precisa de pelo menos um estágio")
+        self.stages = stages
+        self.queue_size = max(1, queue_size)
+
+    def run(self, items: Iterable[Any]) -> None:
+        """
+        Processa todos os itens por todos os estágios e retorna quando terminar.
+
+        Os itens são processados in-place pelas funções dos estágios. Uma exceção
+        em um estágio é registrada e o item continua para o estágio seguinte,
+        mantendo o mesmo comportamento do processamento serial.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        threads: List[List[threading.Thread]] = []
+
+        for index, stage in enumerate(self.stages):
+            next_queue = queues[index + 1] if index + 1 < len(self.stages) else None
+            stage_threads = []
+            for worker_index in range(max(1, stage.workers)):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(stage, queues[index], next_queue),
+                    name=f"pipeline-{stage.name}-{worker_index}",
+                    daemon=True
+                )
+                thread.start()
+                stage_threads.append(thread)
+            threads.append(stage_threads)
+
+        # Alimenta o primeiro estágio (put bloqueia quando a fila está cheia)
+        for item in items:
+            queues[0].put(item)
+
+        # Encerra os estágios em ordem: um estágio só termina depois que o
+        # anterior já entregou todos os seus itens
+        for index, stage_threads in enumerate(threads):
+            for _ in stage_threads:
+                queues[index].put(_SENTINEL)
+            for thread in stage_threads:
+                thread.join()
+
+    def _worker(self, stage: PipelineStage, input_queue: queue.Queue, output_queue):
+        """Loop de um worker: consome da fila do estágio e entrega ao próximo."""
+        while True:
+            item = input_queue.get()
+            if item is _SENTINEL:
+                break
+
+            try:
+                stage.func(item)
+            except Exception as e:
+                print(f"❌ Erro no estágio '{stage.name}': {e}")
+
+            if output_queue is not None:
+                output_queue.put(item)
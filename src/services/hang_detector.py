@@ -0,0 +1,116 @@
+"""
+Detecção de programas parados esperando entrada.
+
+A execução de terminal não fornece entradas: um input() no main.py deixava o
+programa parado até o TEST_TIMEOUT (30s). Aqui o processo é vigiado enquanto
+roda e, ao ser visto bloqueado lendo o stdin (ver blocked_on_stdin), é
+encerrado na hora. Sem /proc não dá para ver o bloqueio: o stdin é fechado e
+o input() falha com EOFError, reconhecido no stderr.
+
+Opcionalmente (idle_timeout), também é encerrado o programa que passa esse
+tempo sem usar CPU nem escrever nada.
+"""
+import asyncio
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from ..utils.output_capture import ProcessOutput
+from .interactive_driver import blocked_on_stdin
+
+# Intervalo (s) entre as verificações do processo
+CHECK_INTERVAL = 0.05
+
+# Como um input() sem entrada disponível aparece no stderr de um programa Python
+EOF_ERROR = "EOFError"
+
+
+class HangDetector:
+    """Vigia um processo e o encerra (on_hang) quando ele fica esperando entrada ou parado."""
+
+    def __init__(self, pid: int, stdin_fd: int, close_stdin: Callable[[], None], on_hang: Callable[[], None],
+                 output: Optional[ProcessOutput] = None, idle_timeout: Optional[float] = None):
+        self.pid = pid
+        self.stdin_fd = stdin_fd
+        self.close_stdin = close_stdin
+        self.on_hang = on_hang
+        self.output = output
+        self.idle_timeout = idle_timeout
+        # "stdin" (esperando entrada) ou "idle" (sem CPU nem saída), quando detectado
+        self.reason: Optional[str] = None
+        self._stop = threading.Event()
+        self._stdin_closed = False
+        self._cpu_time: Optional[float] = None
+        self._last_activity = time.monotonic()
+
+    def start(self) -> threading.Thread:
+        """Vigia o processo em uma thread até stop()."""
+        watcher = threading.Thread(target=self._watch, daemon=True)
+        watcher.start()
+        return watcher
+
+    async def watch_async(self):
+        """Vigia o processo no event loop até stop() (use como task)."""
+        while not self._stop.is_set() and not self._check():
+            await asyncio.sleep(CHECK_INTERVAL)
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.is_set() and not self._check():
+            self._stop.wait(CHECK_INTERVAL)
+
+    def _check(self) -> bool:
+        """Verifica o processo uma vez; True quando não há mais o que vigiar."""
+        blocked = blocked_on_stdin(self.pid, self.stdin_fd) if not self._stdin_closed else None
+        if blocked:
+            return self._hang("stdin")
+        if blocked is None and not self._stdin_closed:
+            # Sem como ver o bloqueio: um input() recebe EOF e falha na hora
+            self._stdin_closed = True
+            try:
+                self.close_stdin()
+            except OSError:
+                pass
+
+        if self.idle_timeout is not None:
+            now = time.monotonic()
+            cpu_time = _process_cpu_time(self.pid)
+            if cpu_time != self._cpu_time:
+                self._cpu_time, self._last_activity = cpu_time, now
+            last_output = self.output.last_activity if self.output is not None else 0.0
+            if cpu_time is not None and now - max(self._last_activity, last_output) >= self.idle_timeout:
+                return self._hang("idle")
+        return False
+
+    def _hang(self, reason: str) -> bool:
+        self.reason = reason
+        self.on_hang()
+        return True
+
+
+def _process_cpu_time(pid: int) -> Optional[float]:
+    """Tempo de CPU (s) já usado pelo processo, ou None se não dá para consultar."""
+    try:
+        fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        times = psutil.Process(pid).cpu_times()
+        return times.user + times.system
+    except Exception:
+        return None
+
+
+def hang_message(detector: Optional[HangDetector], return_code: int, stderr: str) -> Optional[str]:
+    """Mensagem de erro se a execução terminou esperando entrada ou parada, senão None."""
+    if detector is not None and detector.reason == "idle":
+        return f"Programa ficou {detector.idle_timeout:g}s sem usar CPU nem escrever saída"
+    if (detector is not None and detector.reason == "stdin") or (return_code != 0 and EOF_ERROR in stderr):
+        return "Programa ficou esperando uma entrada (input()), mas a execução não fornece entradas"
+    return None
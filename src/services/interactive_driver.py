@@ -0,0 +1,176 @@
+"""
+Condução de programas interativos: cada entrada é enviada quando o programa a pede.
+
+O serviço interativo esperava 0.5s antes de escrever cada entrada: programas
+rápidos perdiam meio segundo por entrada e programas que pediam a entrada
+depois disso (ex.: após baixar dados) recebiam a resposta adiantada.
+
+Aqui o processo é acompanhado como em um `expect`. No Linux,
+/proc/<pid>/wchan indica que ele está bloqueado lendo um pipe e FIONREAD
+confirma que o stdin está vazio: o programa está esperando uma linha. Sem
+/proc (macOS, Windows), a próxima entrada é enviada quando a saída do
+programa fica parada por INPUT_IDLE_FALLBACK segundos.
+"""
+import platform
+import subprocess
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from ..utils.output_capture import ProcessOutput
+from .process_supervisor import get_process_supervisor
+
+# Funções do kernel em que um processo fica esperando dados de um pipe
+_PIPE_READ_WCHANS = ("pipe_read", "pipe_wait")
+
+# Número da syscall read() por arquitetura (/proc/<pid>/syscall)
+_READ_SYSCALLS = {"x86_64": 0, "aarch64": 63, "i686": 3, "armv7l": 3}
+
+# Sem /proc: silêncio na saída (s) que indica que o programa espera uma entrada
+INPUT_IDLE_FALLBACK = 0.5
+
+# Intervalo (s) entre as consultas ao estado do processo
+POLL_INTERVAL = 0.01
+
+
+def blocked_on_stdin(pid: int, stdin_fd: int) -> Optional[bool]:
+    """
+    Indica se o processo (ou um descendente, ex.: sob `pipenv run`) está
+    bloqueado lendo o stdin, sem nada pendente no pipe.
+
+    Returns:
+        True/False, ou None se não dá para saber (sem /proc ou wchan oculto)
+    """
+    known = False
+    for process_id in _process_tree(pid):
+        try:
+            state = Path(f"/proc/{process_id}/stat").read_text().rsplit(")", 1)[1].split()[0]
+            wchan = Path(f"/proc/{process_id}/wchan").read_text().strip()
+        except (OSError, IndexError):
+            continue
+        if state == "S" and wchan in ("", "0"):
+            # Kernel sem wchan disponível para este processo
+            continue
+        known = True
+        if state == "S" and any(name in wchan for name in _PIPE_READ_WCHANS):
+            if _read_fd(process_id) not in (None, 0):
+                continue  # lendo outro pipe (ex.: saída de um subprocesso)
+            return _pending_bytes(stdin_fd) == 0
+    return False if known else None
+
+
+def _read_fd(pid: int) -> Optional[int]:
+    """Descritor da chamada read() em que o processo está bloqueado (None se não dá para saber)."""
+    read_syscall = _READ_SYSCALLS.get(platform.machine())
+    if read_syscall is None:
+        return None
+    try:
+        fields = Path(f"/proc/{pid}/syscall").read_text().split()
+        if int(fields[0]) != read_syscall:
+            return None
+        return int(fields[1], 16)
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _process_tree(pid: int) -> List[int]:
+    """O processo e seus descendentes, via /proc/<pid>/task/<tid>/children."""
+    tree = [pid]
+    for process_id in tree:
+        try:
+            for task in Path(f"/proc/{process_id}/task").iterdir():
+                tree.extend(int(child) for child in (task / "children").read_text().split())
+        except (OSError, ValueError):
+            continue
+    return tree
+
+
+def _pending_bytes(fd: int) -> int:
+    """Bytes escritos no pipe e ainda não lidos pelo processo (0 se não dá para consultar)."""
+    try:
+        import array
+        import fcntl
+        import termios
+
+        buffer = array.array("i", [0])
+        fcntl.ioctl(fd, termios.FIONREAD, buffer)
+        return buffer[0]
+    except (ImportError, OSError):
+        return 0
+
+
+class InteractiveDriver:
+    """Envia as entradas a um processo (Popen com pipes binários) quando ele as pede."""
+
+    def __init__(self, process: subprocess.Popen, debug: Optional[Callable[[str], None]] = None,
+                 output: Optional[ProcessOutput] = None):
+        self.process = process
+        self.debug = debug or (lambda message: None)
+        self.output = output or _default_output()
+
+    def run(self, inputs: List[str], timeout: float) -> Tuple[str, str]:
+        """
+        Conduz o processo até o fim.
+
+        Returns:
+            (stdout, stderr) do processo
+
+        Raises:
+            subprocess.TimeoutExpired: se o processo não terminar em `timeout` segundos
+        """
+        deadline = time.monotonic() + timeout
+        readers = self.output.start_readers(self.process)
+
+        for i, input_text in enumerate(inputs):
+            if not self._wait_for_prompt(deadline, timeout):
+                self.debug(f"Processo terminou após {i} de {len(inputs)} input(s)")
+                break
+
+            self.debug(f"Enviando input {i+1}: '{input_text}'")
+            try:
+                self.process.stdin.write((input_text + "\n").encode("utf-8"))
+                self.process.stdin.flush()
+            except OSError as e:
+                self.debug(f"Erro ao enviar input {i+1}: {e}")
+                break
+            self.output.last_activity = time.monotonic()
+
+        # Fecha stdin: um input() a mais recebe EOF em vez de esperar para sempre
+        try:
+            self.process.stdin.close()
+            self.debug("STDIN fechado após enviar todos os inputs")
+        except OSError as e:
+            self.debug(f"Erro ao fechar STDIN: {e}")
+
+        try:
+            self.process.wait(timeout=max(deadline - time.monotonic(), 0))
+        except subprocess.TimeoutExpired:
+            raise subprocess.TimeoutExpired(self.process.args, timeout)
+        # Subprocessos deixados pelo programa morrem junto (e fecham os pipes)
+        get_process_supervisor().release(self.process.pid)
+        for reader in readers:
+            reader.join()
+
+        return self.output.stdout.text(), self.output.stderr.text()
+
+    def _wait_for_prompt(self, deadline: float, timeout: float) -> bool:
+        """Espera o processo pedir uma entrada; False se ele terminou antes."""
+        stdin_fd = self.process.stdin.fileno()
+        while True:
+            if self.process.poll() is not None:
+                return False
+            blocked = blocked_on_stdin(self.process.pid, stdin_fd)
+            if blocked:
+                return True
+            if blocked is None and time.monotonic() - self.output.last_activity >= INPUT_IDLE_FALLBACK:
+                return True
+            if time.monotonic() >= deadline:
+                raise subprocess.TimeoutExpired(self.process.args, timeout)
+            time.sleep(POLL_INTERVAL)
+
+
+def _default_output() -> ProcessOutput:
+    """Captura com os limites de OUTPUT_CAPTURE_* do config.py, sem limite de volume."""
+    from config import OUTPUT_CAPTURE_HEAD_BYTES, OUTPUT_CAPTURE_TAIL_BYTES
+
+    return ProcessOutput(OUTPUT_CAPTURE_HEAD_BYTES, OUTPUT_CAPTURE_TAIL_BYTES)
@@ -2,6 +2,8 @@
 Serviço para executar programas Python interativos com entrada simulada.
 Suporta diferentes arquivos Python por assignment.
 """
+import contextlib
+import dataclasses
 import subprocess
 import time
 from pathlib import Path
@@ -9,23 +11,47 @@ from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
 from ..domain.models import PythonExecutionResult
-from config import INTERACTIVE_ASSIGNMENTS_CONFIG
+from ..utils.output_capture import ProcessOutput
+from .execution_cache import get_execution_cache
+from .hang_detector import EOF_ERROR
+from .interactive_driver import InteractiveDriver
+from .process_supervisor import get_process_supervisor
+from .resource_limits import detect_violation, limited_command
+from .submission_environments import environment_for_submission
+from .workspace_manager import get_workspace_manager
+from config import (
+    INTERACTIVE_ASSIGNMENTS_CONFIG, OUTPUT_CAPTURE_HEAD_BYTES, OUTPUT_CAPTURE_TAIL_BYTES, OUTPUT_FLOOD_LIMIT,
+    get_resource_limits
+)
 
 
 class InteractiveExecutionService:
     """Serviço para executar programas Python interativos."""
     
-    def __init__(self, verbose: bool = False):
+    def __init__(self, verbose: bool = False, use_cache: bool = True):
         self.verbose = verbose
         self.interactive_config = INTERACTIVE_ASSIGNMENTS_CONFIG
+        # Reaproveita resultados de execuções anteriores (ver execution_cache)
+        self.use_cache = use_cache
     
     def _debug_print(self, message: str):
         """Imprime mensagem de debug apenas se verbose estiver habilitado."""
         if self.verbose:
             print(f"  [DEBUG] {message}")
     
-    def execute_interactive_program(self, assignment_name: str, submission_path: Path) -> PythonExecutionResult:
-        """Executa programa interativo com entrada simulada."""
+    def execute_interactive_program(self, assignment_name: str, submission_path: Path,
+                                    provenance: Optional[Dict[str, Dict[str, str]]] = None,
+                                    workdir: Optional[Path] = None) -> PythonExecutionResult:
+        """
+        Executa programa interativo com entrada simulada.
+        
+        Se a mesma execução (código, argumentos e entradas) estiver no cache,
+        devolve o resultado guardado e registra a origem em provenance["execution"].
+        
+        Com workdir, roda nessa cópia da submissão, que é mantida, sem usar o
+        cache: os arquivos que o programa gera são usados depois (ex.: o CSV
+        lido pelo dashboard).
+        """
         
         # Verifica se é um assignment interativo
         if assignment_name not in self.interactive_config:
@@ -43,33 +69,64 @@ class InteractiveExecutionService:
         self._debug_print(f"Argumentos: {config['command_args']}")
         self._debug_print(f"Inputs: {config['inputs']}")
         
+        resource_limits = get_resource_limits(assignment_name)
+        key, cached = None, None
+        if workdir is None:
+            key, cached = self._lookup_cache(submission_path, config, resource_limits, provenance)
+        if cached is not None:
+            self._debug_print("Resultado reaproveitado do cache")
+            # A chave não inclui o assignment: a identificação vem desta execução
+            return dataclasses.replace(cached, submission_identifier="interactive_test",
+                                       display_name=f"{assignment_name}_interactive")
+        
         # Executa o programa interativo
         start_time = time.time()
         
         try:
-            result = self._run_interactive_program(
-                python_file, 
-                config['command_args'], 
-                config['inputs'], 
-                config['timeout']
-            )
+            # Executa em uma cópia da submissão (a pasta do aluno não é alterada),
+            # nova ou a compartilhada com o thumbnail
+            workspace = (contextlib.nullcontext(Path(workdir)) if workdir is not None
+                         else get_workspace_manager().workspace(submission_path))
+            with workspace as workdir:
+                result = self._run_interactive_program(
+                    workdir / config['python_file'], 
+                    config['command_args'], 
+                    config['inputs'], 
+                    config['timeout'],
+                    resource_limits
+                )
             
             execution_time = time.time() - start_time
             
             # Analisa o resultado
             success = self._analyze_execution_result(result, config)
+            if result.get('limit_violation'):
+                status, error_message = "resource_limit_exceeded", result['limit_violation']
+            elif result['return_code'] != 0 and EOF_ERROR in result['stderr']:
+                # O stdin é fechado após o último input: um input() a mais falha na hora
+                status = "waiting_for_input"
+                error_message = f"Programa pediu mais entradas que as {len(config['inputs'])} configuradas"
+            elif success:
+                status, error_message = "success", ""
+            else:
+                status, error_message = "partial_success", "Execução interativa não produziu resultado esperado"
             
-            return PythonExecutionResult(
+            execution = PythonExecutionResult(
                 submission_identifier="interactive_test",
                 display_name=f"{assignment_name}_interactive",
                 execution_timestamp=datetime.now().isoformat(),
-                execution_status="success" if success else "partial_success",
+                execution_status=status,
                 stdout_output=result['stdout'],
                 stderr_output=result['stderr'],
                 return_code=result['return_code'],
                 execution_time=execution_time,
-                error_message="" if success else "Execução interativa não produziu resultado esperado"
+                error_message=error_message,
+                stdout_bytes=result.get('stdout_bytes', 0),
+                stderr_bytes=result.get('stderr_bytes', 0)
             )
+            if key is not None:
+                get_execution_cache().store(key, execution)
+            return execution
             
         except Exception as e:
             execution_time = time.time() - start_time
@@ -87,33 +144,56 @@ class InteractiveExecutionService:
                 error_message=str(e)
             )
     
-    def _run_interactive_program(self, python_file: Path, args: List[str], inputs: List[str], timeout: int) -> Dict:
-        """Executa programa interativo com entrada simulada."""
+    def _lookup_cache(self, submission_path: Path, config: Dict,
+                      resource_limits: Optional[Dict[str, Optional[int]]],
+                      provenance: Optional[Dict[str, Dict[str, str]]]
+                      ) -> Tuple[Optional[str], Optional[PythonExecutionResult]]:
+        """Retorna (chave, resultado em cache ou None); chave None sem cache."""
+        if not self.use_cache:
+            return None, None
+        parameters = {
+            "kind": "interactive",
+            "python_file": config['python_file'],
+            "command_args": config['command_args'],
+            "inputs": config['inputs'],
+            "timeout": config['timeout'],
+            "resource_limits": resource_limits,
+            "output": [OUTPUT_CAPTURE_HEAD_BYTES, OUTPUT_CAPTURE_TAIL_BYTES, OUTPUT_FLOOD_LIMIT],
+        }
+        return get_execution_cache().lookup(submission_path, parameters, provenance)
+    
+    def _run_interactive_program(self, python_file: Path, args: List[str], inputs: List[str], timeout: int,
+                                 resource_limits: Optional[Dict[str, Optional[int]]] = None) -> Dict:
+        """Executa programa interativo com entrada simulada (e com os limites de recursos)."""
         
         # Monta comando com argumentos
-        cmd = ["pipenv", "run", "python", python_file.name] + args
+        # Ambiente com as dependências da submissão (o do Pipenv, se já as tiver)
+        environment = environment_for_submission(python_file.parent)
+        cmd = environment.command("python", python_file.name, *args)
         
         self._debug_print(f"Executando comando: {' '.join(cmd)}")
         self._debug_print(f"Diretório: {python_file.parent}")
         
-        # Inicia processo
-        process = subprocess.Popen(
-            cmd,
+        # Inicia processo (em um grupo próprio, encerrado por inteiro)
+        supervisor = get_process_supervisor()
+        process = supervisor.popen(
+            limited_command(cmd, resource_limits),
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             cwd=python_file.parent,
-            text=True,
-            encoding='utf-8',
-            errors='replace'
+            env=environment.env()
         )
         
+        # Só o início e o fim de cada stream ficam em memória
+        output = ProcessOutput(OUTPUT_CAPTURE_HEAD_BYTES, OUTPUT_CAPTURE_TAIL_BYTES,
+                               OUTPUT_FLOOD_LIMIT, on_flood=lambda: supervisor.kill(process.pid))
+        
         try:
-            # Envia inputs com delay para simular usuário real
-            self._send_inputs(process, inputs)
-
-            # Captura saída com timeout
-            stdout, stderr = process.communicate(timeout=timeout)
+            # Envia cada input quando o programa o pede e captura a saída com timeout
+            stdout, stderr = InteractiveDriver(process, self._debug_print, output).run(inputs, timeout)
+            if output.flooded:
+                stderr = f"{output.flood_notice()}\n{stderr}"
 
             self._debug_print(f"Processo finalizado com código: {process.returncode}")
             self._debug_print(f"STDOUT: {stdout[:200]}...")
@@ -122,17 +202,15 @@ class InteractiveExecutionService:
             return {
                 'stdout': stdout,
                 'stderr': stderr,
-                'return_code': process.returncode
+                'return_code': process.returncode,
+                'stdout_bytes': output.stdout.total_bytes,
+                'stderr_bytes': output.stderr.total_bytes,
+                'limit_violation': detect_violation(process.returncode, stderr, resource_limits)
             }
             
         except subprocess.TimeoutExpired:
             self._debug_print(f"Timeout na execução ({timeout}s), terminando processo...")
-            process.terminate()
-            try:
-                process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                process.kill()
-                process.wait(timeout=5)
+            supervisor.terminate(process)
             
             return {
                 'stdout': "",
@@ -142,41 +220,11 @@ class InteractiveExecutionService:
         
         except Exception as e:
             self._debug_print(f"Erro na execução: {e}")
-            # Tenta terminar o processo se ainda estiver rodando
-            try:
-                if process.poll() is None:
-                    process.terminate()
-                    process.wait(timeout=5)
-            except:
-                pass
+            # Termina o processo (e o grupo) se ainda estiver rodando
+            supervisor.terminate(process)
             
             raise e
     
-    def _send_inputs(self, process: subprocess.Popen, inputs: List[str]):
-        """Envia inputs para o processo com delay realista."""
-
-        for i, input_text in enumerate(inputs):
-            # Aguarda um pouco para simular usuário real
-            time.sleep(0.5)
-
-            self._debug_print(f"Enviando input {i+1}: '{input_text}'")
-
-            try:
-                # Envia input com quebra de linha
-                process.stdin.write(input_text + "\n")
-                process.stdin.flush()
-            except Exception as e:
-                self._debug_print(f"Erro ao enviar input {i+1}: {e}")
-                break
-
-        # Fecha stdin para indicar que não há mais inputs
-        # Isso evita que programas esperem indefinidamente por mais entradas
-        try:
-            process.stdin.close()
-            self._debug_print("STDIN fechado após enviar todos os inputs")
-        except Exception as e:
-            self._debug_print(f"Erro ao fechar STDIN: {e}")
-
     def _analyze_execution_result(self, result: Dict, config: Dict) -> bool:
         """Analisa se a execução foi bem-sucedida."""
 
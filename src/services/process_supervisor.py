@@ -0,0 +1,145 @@
+"""
+Supervisão dos processos iniciados pelo corretor.
+
+Programas dos alunos, Streamlit e pytest são iniciados aqui, cada um em uma
+sessão própria (grupo de processos cujo id é o PID do processo). Encerrar o
+grupo encerra também os subprocessos que o aluno tenha criado, sem varrer os
+processos da máquina procurando órfãos. Os grupos ativos ficam registrados e
+são encerrados na saída do corretor, inclusive após Ctrl-C (o SIGINT não chega
+a outras sessões).
+"""
+import asyncio
+import atexit
+import os
+import signal
+import subprocess
+import threading
+from typing import List, Optional, Set
+
+
+class ProcessSupervisor:
+    """Inicia processos em grupos próprios, aplica timeouts e encerra o que sobrar."""
+
+    def __init__(self):
+        self._groups: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def popen(self, cmd: List[str], **kwargs) -> subprocess.Popen:
+        """subprocess.Popen em um grupo de processos novo, registrado no supervisor."""
+        process = subprocess.Popen(cmd, **self._session_kwargs(kwargs))
+        self.adopt(process.pid)
+        return process
+
+    async def create_subprocess_exec(self, *cmd: str, **kwargs) -> asyncio.subprocess.Process:
+        """asyncio.create_subprocess_exec em um grupo de processos novo, registrado no supervisor."""
+        process = await asyncio.create_subprocess_exec(*cmd, **self._session_kwargs(kwargs))
+        self.adopt(process.pid)
+        return process
+
+    def run(self, cmd: List[str], timeout: Optional[float] = None, **kwargs) -> subprocess.CompletedProcess:
+        """
+        Como subprocess.run, mas no timeout o grupo inteiro é encerrado.
+
+        Raises:
+            subprocess.TimeoutExpired: se o processo não terminar em `timeout` segundos
+        """
+        if kwargs.pop("capture_output", False):
+            kwargs["stdout"] = kwargs["stderr"] = subprocess.PIPE
+        process = self.popen(cmd, **kwargs)
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.terminate(process, grace=0)
+            process.communicate()
+            raise
+        finally:
+            self.release(process.pid)
+        return subprocess.CompletedProcess(process.args, process.returncode, stdout, stderr)
+
+    def adopt(self, pid: int):
+        """Registra um grupo de processos liderado por pid (ex.: worker que chamou os.setsid())."""
+        with self._lock:
+            self._groups.add(pid)
+
+    def kill(self, pid: int):
+        """Envia SIGKILL ao grupo do processo (ex.: programa que inundou a saída)."""
+        self._signal_group(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+
+    def terminate(self, process: subprocess.Popen, grace: float = 5.0):
+        """Encerra o grupo: SIGTERM, `grace` segundos de espera e SIGKILL (grace=0 mata direto)."""
+        if grace > 0:
+            self._signal_group(process.pid, signal.SIGTERM)
+            try:
+                process.wait(timeout=grace)
+            except subprocess.TimeoutExpired:
+                pass
+        self.kill(process.pid)
+        process.wait()
+        self.release(process.pid)
+
+    async def terminate_async(self, process: asyncio.subprocess.Process, grace: float = 5.0):
+        """Versão assíncrona de terminate."""
+        if grace > 0:
+            self._signal_group(process.pid, signal.SIGTERM)
+            try:
+                await asyncio.wait_for(process.wait(), timeout=grace)
+            except asyncio.TimeoutError:
+                pass
+        self.kill(process.pid)
+        await process.wait()
+        self.release(process.pid)
+
+    def release(self, pid: int):
+        """
+        Encerra o que restar do grupo e deixa de acompanhá-lo.
+
+        Chamado quando o processo principal terminou: subprocessos deixados pelo
+        aluno em segundo plano morrem junto. PIDs não registrados são ignorados.
+        """
+        with self._lock:
+            if pid not in self._groups:
+                return
+            self._groups.discard(pid)
+        self._signal_group(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+
+    def shutdown(self):
+        """Encerra todos os grupos ainda ativos (registrado no atexit)."""
+        with self._lock:
+            groups, self._groups = list(self._groups), set()
+        for pid in groups:
+            self._signal_group(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+
+    @staticmethod
+    def _session_kwargs(kwargs: dict) -> dict:
+        """Argumentos de criação do processo em uma sessão (Windows: grupo) própria."""
+        if os.name == "nt":
+            kwargs["creationflags"] = kwargs.get("creationflags", 0) | subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+        return kwargs
+
+    @staticmethod
+    def _signal_group(pid: int, sig: int):
+        """Envia um sinal ao grupo liderado por pid (no Windows, só ao processo)."""
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(pid, sig)
+            else:
+                os.kill(pid, sig)
+        except OSError:
+            pass  # o grupo já terminou
+
+
+_supervisor: Optional[ProcessSupervisor] = None
+_supervisor_lock = threading.Lock()
+
+
+def get_process_supervisor() -> ProcessSupervisor:
+    """Retorna o supervisor compartilhado, que encerra os grupos restantes na saída."""
+    global _supervisor
+
+    with _supervisor_lock:
+        if _supervisor is None:
+            _supervisor = ProcessSupervisor()
+            atexit.register(_supervisor.shutdown)
+        return _supervisor
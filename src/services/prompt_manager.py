@@ -200,6 +200,13 @@ Por favor, analise o código considerando:
             # Usa template padrão
             return self._format_default_prompt(assignment, assignment_type, student_code, assessment_criteria, python_execution, test_results, streamlit_thumbnail)
     
+    def get_prompt_template(self, assignment_name: str, assignment_type: str) -> str:
+        """Retorna o template (personalizado ou padrão) usado para o assignment, sem formatação."""
+        custom_prompt = self._load_custom_prompt(assignment_name)
+        if custom_prompt:
+            return custom_prompt
+        return self.prompt_templates.get(assignment_type, self.prompt_templates["python"])
+    
     def _load_custom_prompt(self, assignment_name: str) -> Optional[str]:
         """Carrega prompt personalizado do assignment se existir."""
         # Primeiro tenta na pasta prompts/ (versionada)
@@ -0,0 +1 @@
+# Plugin pytest carregado nas execuções dos testes dos alunos
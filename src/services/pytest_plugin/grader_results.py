@@ -0,0 +1,204 @@
+"""
+Plugin pytest que envia o resultado de cada teste assim que ele termina.
+
+Substitui o pytest-json-report: nada é gravado na pasta do aluno. Cada teste
+gera um dicionário {nodeid, outcome, duration, message} entregue a uma função
+emit. Em um subprocesso (`-p grader_results --grader-results-fd N`), cada
+resultado vira uma linha JSON escrita no descritor N, herdado do processo de
+correção; no pool de workers, o plugin é instanciado direto com um emit que
+envia pelo Pipe.
+
+Como os resultados saem durante a execução, um timeout ainda devolve os testes
+que já terminaram.
+
+Opções adicionais:
+- --grader-test-timeout S: cada teste (setup, chamada e teardown) tem S
+  segundos; um teste travado vira "error" e os demais continuam rodando.
+- --grader-fail-fast: o primeiro erro de coleta (ex.: ImportError ou
+  SyntaxError no código do aluno) encerra a sessão sem coletar o resto, já
+  que o pytest não executaria nenhum teste nesse caso.
+- --grader-rlimits JSON: limites de recursos ({"RLIMIT_AS": bytes, ...})
+  aplicados ao próprio processo antes dos testes. Só o limite flexível muda,
+  então um worker do pool pode reaplicá-los na submissão seguinte; o tempo de
+  CPU conta a partir do início da sessão.
+
+Este módulo não importa nada do projeto: no subprocesso ele é carregado a
+partir do próprio diretório (PYTHONPATH), com o cwd na pasta do aluno.
+"""
+import json
+import os
+import signal
+from typing import Any, Callable, Dict
+
+import pytest
+
+
+class GraderTestTimeout(BaseException):
+    """Levantada dentro do teste que passou do tempo limite (BaseException para escapar de `except Exception`)."""
+
+
+class GraderResultsPlugin:
+    """Acompanha as fases de cada teste e emite o resultado final."""
+
+    def __init__(self, emit: Callable[[Dict[str, Any]], None]):
+        self.emit = emit
+        self._pending: Dict[str, Dict[str, Any]] = {}
+
+    def pytest_collectreport(self, report):
+        # Erro de coleta (import do código do aluno, sintaxe) vira um resultado "error"
+        if report.failed:
+            self.emit({
+                "nodeid": report.nodeid or "collection",
+                "outcome": "error",
+                "duration": 0.0,
+                "message": str(report.longrepr),
+            })
+
+    def pytest_runtest_logreport(self, report):
+        entry = self._pending.setdefault(report.nodeid, {
+            "nodeid": report.nodeid, "outcome": "passed", "duration": 0.0, "message": ""
+        })
+        entry["duration"] += getattr(report, "duration", 0.0) or 0.0
+
+        if report.when == "call":
+            if hasattr(report, "wasxfail"):
+                entry["outcome"] = "xfailed" if report.skipped else "xpassed"
+            else:
+                entry["outcome"] = report.outcome
+        elif report.failed:
+            # Falha em setup/teardown
+            entry["outcome"] = "error"
+        elif report.skipped and report.when == "setup":
+            entry["outcome"] = "skipped"
+
+        if getattr(report, "grader_timeout", None):
+            entry["outcome"] = "error"
+            entry["message"] = f"Tempo limite de {report.grader_timeout:g}s excedido neste teste"
+        elif report.failed or (report.skipped and not entry["message"]):
+            entry["message"] = _longrepr_text(report)
+
+        if report.when == "teardown":
+            self.emit(self._pending.pop(report.nodeid))
+
+
+class TestTimeoutPlugin:
+    """Interrompe, com SIGALRM, cada fase de teste que passar de timeout segundos."""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+
+    def _alarm(self, signum, frame):
+        raise GraderTestTimeout()
+
+    def _run_with_timeout(self):
+        previous = signal.signal(signal.SIGALRM, self._alarm)
+        # Repete a cada segundo caso o código do aluno engula a exceção
+        signal.setitimer(signal.ITIMER_REAL, self.timeout, 1.0)
+        try:
+            yield
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_setup(self, item):
+        yield from self._run_with_timeout()
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item):
+        yield from self._run_with_timeout()
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_teardown(self, item):
+        yield from self._run_with_timeout()
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_makereport(self, item, call):
+        outcome = yield
+        if call.excinfo is not None and call.excinfo.errisinstance(GraderTestTimeout):
+            report = outcome.get_result()
+            report.outcome = "failed"
+            report.grader_timeout = self.timeout
+
+
+class FailFastPlugin:
+    """Encerra a sessão no primeiro erro de coleta."""
+
+    def __init__(self):
+        self.session = None
+
+    def pytest_sessionstart(self, session):
+        self.session = session
+
+    def pytest_collectreport(self, report):
+        if report.failed and self.session is not None:
+            self.session.shouldfail = "erro estrutural na coleta (--grader-fail-fast)"
+
+
+def _longrepr_text(report) -> str:
+    """Traceback (--tb) da falha, ou o motivo do skip."""
+    longrepr = report.longrepr
+    if longrepr is None:
+        return ""
+    if isinstance(longrepr, tuple) and len(longrepr) == 3:
+        # Skip: (arquivo, linha, motivo)
+        return str(longrepr[2])
+    return str(longrepr)
+
+
+def fd_emitter(fd: int) -> Callable[[Dict[str, Any]], None]:
+    """Emite cada resultado como uma linha JSON no descritor herdado."""
+    def emit(entry: Dict[str, Any]) -> None:
+        os.write(fd, (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8"))
+    return emit
+
+
+def pytest_addoption(parser):
+    parser.addoption("--grader-results-fd", type=int, default=None,
+                     help="Descritor onde escrever os resultados dos testes (JSON Lines)")
+    parser.addoption("--grader-test-timeout", type=float, default=None,
+                     help="Tempo limite (segundos) de cada teste")
+    parser.addoption("--grader-fail-fast", action="store_true", default=False,
+                     help="Encerra a sessão no primeiro erro de coleta")
+    parser.addoption("--grader-rlimits", default=None,
+                     help="Limites de recursos em JSON ({\"RLIMIT_AS\": bytes, ...})")
+
+
+def pytest_configure(config):
+    fd = config.getoption("grader_results_fd")
+    if fd is not None:
+        config.pluginmanager.register(GraderResultsPlugin(fd_emitter(fd)), "grader-results-reporter")
+
+    timeout = config.getoption("grader_test_timeout")
+    if timeout and hasattr(signal, "SIGALRM"):
+        config.pluginmanager.register(TestTimeoutPlugin(timeout), "grader-test-timeout")
+
+    if config.getoption("grader_fail_fast"):
+        config.pluginmanager.register(FailFastPlugin(), "grader-fail-fast")
+
+    rlimits = config.getoption("grader_rlimits")
+    if rlimits:
+        apply_rlimits(json.loads(rlimits))
+
+
+def apply_rlimits(limits: Dict[str, int]) -> None:
+    """Aplica os limites flexíveis ao processo atual (o tempo de CPU soma ao já usado)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return
+
+    for name, value in limits.items():
+        limit = getattr(resource, name, None)
+        if limit is None:
+            continue
+        if name == "RLIMIT_CPU":
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            value += int(usage.ru_utime + usage.ru_stime) + 1
+        hard = resource.getrlimit(limit)[1]
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        try:
+            resource.setrlimit(limit, (value, hard))
+        except (ValueError, OSError):
+            pass
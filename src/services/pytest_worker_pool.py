@@ -0,0 +1,274 @@
+"""
+Pool de processos pytest pré-aquecidos.
+
+Rodar `python -m pytest` para cada submissão paga, toda vez, a inicialização do
+interpretador e o import do pytest, dos plugins e das bibliotecas pesadas usadas
+nos testes (pandas, requests...). Aqui esses imports acontecem uma única vez em
+um processo "zygote" (o forkserver do multiprocessing), e cada worker é um fork
+dele que já nasce com tudo carregado.
+
+Cada worker executa uma única submissão (ou um lote, em run_batch) e termina:
+módulos do aluno, estado global e arquivos abertos morrem com o processo, e um
+novo worker é criado para repor o pool. Dentro de um lote, os módulos
+importados por uma submissão são removidos antes da seguinte. Os resultados de cada teste voltam para o processo principal por
+um Pipe, à medida que terminam (plugin grader_results).
+
+Os workers não são filhos do corretor (e sim do forkserver), então o CPU e o
+pico de RSS de cada submissão também voltam pelo Pipe, para stage_metrics.
+"""
+import atexit
+import multiprocessing
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .process_supervisor import get_process_supervisor
+from ..utils.stage_metrics import record_external_usage
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Plugin que envia os resultados de cada teste pelo Pipe
+GRADER_PLUGIN_MODULE = f"{__package__}.pytest_plugin.grader_results"
+
+
+class PytestWorkerPool:
+    """Mantém workers pytest prontos, forkados de um zygote com os imports já feitos."""
+
+    def __init__(self, size: int, preload_modules: Sequence[str] = ()):
+        self.size = max(1, size)
+        self._context = multiprocessing.get_context("forkserver")
+        # O módulo principal (ex.: src.main) e o do worker também são pré-carregados
+        # no zygote, para que os workers não precisem reimportá-los
+        self._context.set_forkserver_preload(["__main__", __name__, GRADER_PLUGIN_MODULE,
+                                              *preload_modules, *_pytest_plugin_modules()])
+        self._idle: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(self.size):
+            self._idle.put(self._spawn_worker())
+
+    def _spawn_worker(self):
+        """Cria um worker (fork do zygote) que aguarda um job no pipe."""
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        # O worker abre uma sessão própria: processos criados pelos testes morrem com ele
+        get_process_supervisor().adopt(process.pid)
+        return process, parent_conn
+
+    def run(self, submission_path: Path, pytest_args: List[str], timeout: float) -> Tuple[List[Dict], str, str]:
+        """
+        Executa os testes de uma submissão em um worker pré-aquecido.
+
+        O worker envia cada resultado pelo Pipe assim que o teste termina; em
+        timeout ou morte do worker, os resultados já recebidos são mantidos.
+
+        Returns:
+            (resultados emitidos pelo plugin, saída do pytest, "done" | "timeout" | "crashed")
+        """
+        return self.run_batch([(submission_path, pytest_args)], timeout)[0]
+
+    def run_batch(self, jobs: List[Tuple[Path, List[str]]], timeout: float) -> List[Tuple[List[Dict], str, str]]:
+        """
+        Executa várias submissões em sequência no mesmo worker.
+
+        O interpretador, o pytest e os plugins são aproveitados de uma submissão
+        para a outra; entre elas, o worker remove os módulos importados e
+        restaura sys.path e o diretório atual. O timeout vale para cada
+        submissão. Se uma submissão estourar o tempo ou derrubar o worker, as
+        seguintes ficam com status "not_run" para serem executadas à parte.
+
+        Args:
+            jobs: Lista de (submission_path, argumentos do pytest)
+            timeout: Tempo máximo de cada submissão (segundos)
+
+        Returns:
+            Uma tupla (resultados, saída, status) por job, na ordem de jobs
+        """
+        try:
+            process, conn = self._idle.get_nowait()
+        except queue.Empty:
+            # Todos os workers ocupados: cria um extra, que não volta para o pool
+            process, conn = self._spawn_worker()
+
+        outcomes: List[Tuple[List[Dict], str, str]] = []
+        entries: List[Dict] = []
+        started = False
+        try:
+            conn.send([(str(path), list(args)) for path, args in jobs])
+            deadline = time.monotonic() + timeout
+            while len(outcomes) < len(jobs):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not conn.poll(remaining):
+                    status = "timeout"
+                    break
+                try:
+                    kind, payload = conn.recv()
+                except EOFError:
+                    status = "crashed"
+                    break
+                if kind == "start":
+                    entries, started = [], True
+                    deadline = time.monotonic() + timeout
+                elif kind == "result":
+                    entries.append(payload)
+                elif kind == "usage":
+                    record_external_usage(*payload)
+                else:
+                    outcomes.append((entries, payload, "done"))
+                    entries, started = [], False
+                    deadline = time.monotonic() + timeout
+            else:
+                return outcomes
+
+            # Submissão interrompida e as que nem começaram
+            if started or not outcomes:
+                outcomes.append((entries, "", status))
+            outcomes.extend(([], "", "not_run") for _ in range(len(jobs) - len(outcomes)))
+            return outcomes
+        finally:
+            conn.close()
+            process.join(1)
+            if process.is_alive():
+                process.kill()
+                process.join()
+            get_process_supervisor().release(process.pid)
+            self._replenish()
+
+    def _replenish(self):
+        """Repõe um worker no pool depois que outro foi consumido."""
+        with self._lock:
+            if not self._closed and self._idle.qsize() < self.size:
+                self._idle.put(self._spawn_worker())
+
+    def close(self):
+        """Encerra os workers ociosos."""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                process, conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            process.kill()
+            process.join()
+            get_process_supervisor().release(process.pid)
+
+
+def _pytest_plugin_modules() -> List[str]:
+    """Módulos dos plugins pytest instalados (entry points pytest11), carregados a cada pytest.main."""
+    try:
+        from importlib.metadata import entry_points
+        return sorted({ep.value.split(":")[0] for ep in entry_points(group="pytest11")})
+    except Exception:
+        return []
+
+
+def _worker_main(conn) -> None:
+    """Processo worker: recebe [(submission_path, pytest_args), ...], roda o pytest em cada uma e devolve os resultados."""
+    if hasattr(os, "setsid"):
+        os.setsid()
+    try:
+        jobs = conn.recv()
+    except EOFError:
+        return
+
+    import importlib
+    import pytest
+    from .pytest_plugin import grader_results
+    # O módulo registra as opções --grader-* (timeout por teste, fail-fast)
+    plugins = [grader_results, grader_results.GraderResultsPlugin(lambda entry: conn.send(("result", entry)))]
+
+    # Estado de referência, restaurado entre uma submissão e outra
+    baseline_modules = set(sys.modules)
+    baseline_path = list(sys.path)
+    sys.argv = ["pytest"]
+
+    for submission_path, pytest_args in jobs:
+        conn.send(("start", submission_path))
+        start_cpu = _worker_cpu_time()
+
+        # A saída do pytest vai para um arquivo, como o capture_output do subprocesso
+        with tempfile.TemporaryFile() as output:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(output.fileno(), 1)
+            os.dup2(output.fileno(), 2)
+
+            # Mesmo ambiente de `python -m pytest` executado na pasta do aluno
+            os.chdir(submission_path)
+            sys.path[:] = [submission_path] + baseline_path
+            importlib.invalidate_caches()
+            try:
+                # Plugins já importados no zygote não passam pelo assertion rewriting
+                pytest.main(["-W", "ignore::pytest.PytestAssertRewriteWarning"] + pytest_args, plugins=plugins)
+            except BaseException as e:
+                print(f"Erro ao rodar pytest: {e}")
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+
+            output.seek(0)
+            stdout = output.read().decode(errors="replace")
+
+        # Módulos do aluno e dos testes não podem vazar para a próxima submissão
+        for name in set(sys.modules) - baseline_modules:
+            del sys.modules[name]
+        sys.path[:] = baseline_path
+
+        conn.send(("usage", (_worker_cpu_time() - start_cpu, _worker_peak_rss_mb())))
+        conn.send(("done", stdout))
+
+    conn.close()
+
+
+def _worker_cpu_time() -> float:
+    """CPU (s) do worker e dos processos que os testes criaram e já terminaram."""
+    if resource is None:
+        return 0.0
+    return sum(usage.ru_utime + usage.ru_stime
+               for usage in (resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)))
+
+
+def _worker_peak_rss_mb() -> float:
+    """Pico de RSS (MB) do worker (desde o fork, inclui o que veio do zygote) e dos seus subprocessos."""
+    if resource is None:
+        return 0.0
+    # ru_maxrss é em KB no Linux
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+
+
+_pool: Optional[PytestWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pytest_worker_pool() -> Optional[PytestWorkerPool]:
+    """
+    Retorna o pool compartilhado, criando-o na primeira chamada.
+
+    Retorna None quando o pool está desativado (PYTEST_WORKER_POOL_SIZE = 0) ou
+    a plataforma não tem forkserver (Windows).
+    """
+    global _pool
+    from config import PYTEST_WORKER_POOL_SIZE, PYTEST_PRELOAD_MODULES
+
+    if PYTEST_WORKER_POOL_SIZE <= 0 or "forkserver" not in multiprocessing.get_all_start_methods():
+        return None
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = PytestWorkerPool(PYTEST_WORKER_POOL_SIZE, PYTEST_PRELOAD_MODULES)
+            atexit.register(_pool.close)
+        return _pool
@@ -1,24 +1,52 @@
 """
 Serviço para executar código Python de terminal e capturar output.
 """
-import os
+import asyncio
+import dataclasses
 import time
 import subprocess
-import threading
 from datetime import datetime
 from pathlib import Path
 from typing import List, Optional, Tuple, Dict, Any
-import psutil
 
 from ..domain.models import PythonExecutionResult
-from config import TEST_TIMEOUT, MAX_TEST_OUTPUT
+from ..utils.output_capture import ProcessOutput
+from .dependency_provisioner import get_dependency_provisioner
+from .execution_cache import get_execution_cache
+from .hang_detector import HangDetector, hang_message
+from .process_supervisor import get_process_supervisor
+from .resource_limits import detect_violation, limited_command
+from .submission_environments import environment_for_submission
+from .workspace_manager import get_workspace_manager
+from config import (
+    TEST_TIMEOUT, MAX_TEST_OUTPUT, OUTPUT_CAPTURE_HEAD_BYTES, OUTPUT_CAPTURE_TAIL_BYTES, OUTPUT_FLOOD_LIMIT,
+    HANG_IDLE_TIMEOUT, get_resource_limits
+)
+
+# Dependências usadas com frequência pelas submissões (instaladas só se ausentes)
+SUBMISSION_DEPENDENCIES = [
+    "requests",
+    "beautifulsoup4",
+    "pandas",
+    "numpy",
+    "matplotlib",
+    "seaborn",
+    "lxml",
+    "selenium",
+    "webdriver-manager",
+    "sqlalchemy",
+    "psycopg2-binary",
+    "python-dotenv",
+]
 
 
 class PythonExecutionService:
     """Serviço para executar código Python de terminal e capturar output."""
     
-    def __init__(self, verbose: bool = False):
+    def __init__(self, verbose: bool = False, use_cache: bool = True):
         self.verbose = verbose
+        # Reaproveita resultados de execuções anteriores (ver execution_cache)
+        self.use_cache = use_cache
     
     def _debug_print(self, message: str):
         """Imprime mensagem de debug apenas se verbose estiver habilitado."""
@@ -63,9 +91,19 @@ class PythonExecutionService:
         
         return results
     
-    def _execute_submission_python(self, submission, assignment_name: str, 
-                                 turma_name: str) -> PythonExecutionResult:
-        """Executa código Python de uma submissão específica."""
+    def _execute_submission_python(self, submission, assignment_name: str, turma_name: str,
+                                   provenance: Optional[Dict[str, Dict[str, str]]] = None,
+                                   workdir: Optional[Path] = None) -> PythonExecutionResult:
+        """
+        Executa código Python de uma submissão específica.
+        
+        Se a mesma execução (código e parâmetros) estiver no cache, devolve o
+        resultado guardado e registra a origem em provenance["execution"].
+        
+        Com workdir, roda nessa cópia da submissão, que é mantida, sem usar o
+        cache: os arquivos que o programa gera são usados depois (ex.: o CSV
+        lido pelo dashboard).
+        """
         # Encontra o arquivo main.py da submissão
         main_file = submission.submission_path / "main.py"
         if not main_file.exists():
@@ -74,17 +112,58 @@ class PythonExecutionService:
         # Identificador da submissão
         identifier = getattr(submission, 'github_login', None) or getattr(submission, 'group_name', None)
         
+        resource_limits = get_resource_limits(assignment_name)
+        if workdir is not None:
+            self._debug_print(f"  [DEBUG] Executando main.py para {identifier} em {workdir}")
+            return self._execute_main_file(submission, identifier, Path(workdir) / "main.py", resource_limits)
+        
+        key, cached = self._lookup_cache(submission.submission_path, resource_limits, provenance)
+        if cached is not None:
+            self._debug_print(f"  [DEBUG] Resultado de {identifier} reaproveitado do cache")
+            # A chave não inclui o aluno: submissões idênticas compartilham a entrada
+            return dataclasses.replace(cached, submission_identifier=identifier,
+                                       display_name=submission.display_name)
+        
         self._debug_print(f"  [DEBUG] Executando main.py para {identifier}")
         
+        # Executa em uma cópia da submissão (a pasta do aluno não é alterada)
+        with get_workspace_manager().workspace(submission.submission_path) as workdir:
+            result = self._execute_main_file(submission, identifier, workdir / "main.py", resource_limits)
+        self._store_cache(key, result)
+        return result
+    
+    def _lookup_cache(self, submission_path: Path, resource_limits: Optional[Dict[str, Optional[int]]],
+                      provenance: Optional[Dict[str, Dict[str, str]]]
+                      ) -> Tuple[Optional[str], Optional[PythonExecutionResult]]:
+        """Retorna (chave, resultado em cache ou None); chave None sem cache."""
+        if not self.use_cache:
+            return None, None
+        parameters = {
+            "kind": "terminal",
+            "timeout": TEST_TIMEOUT,
+            "hang_idle_timeout": HANG_IDLE_TIMEOUT,
+            "resource_limits": resource_limits,
+            "output": [OUTPUT_CAPTURE_HEAD_BYTES, OUTPUT_CAPTURE_TAIL_BYTES, OUTPUT_FLOOD_LIMIT, MAX_TEST_OUTPUT],
+        }
+        return get_execution_cache().lookup(submission_path, parameters, provenance)
+    
+    def _store_cache(self, key: Optional[str], result: PythonExecutionResult):
+        """Guarda o resultado no cache (sem chave, não faz nada)."""
+        if key is not None:
+            get_execution_cache().store(key, result)
+    
+    def _execute_main_file(self, submission, identifier: str, main_file: Path,
+                           resource_limits: Optional[Dict[str, Optional[int]]] = None) -> PythonExecutionResult:
+        """Executa o main.py (já no workspace) e monta o resultado, reinstalando dependências em ImportError."""
         # Executa o código Python
         start_time = time.time()
         
         try:
             # Limpa cache Python para garantir execução limpa
-            self._clear_python_cache(submission.submission_path)
+            self._clear_python_cache(main_file.parent)
             
             # Executa o código Python
-            result = self._run_python_code(main_file)
+            result = self._run_python_code(main_file, resource_limits)
             
             execution_time = time.time() - start_time
             
@@ -94,11 +173,13 @@ class PythonExecutionService:
                 submission_identifier=identifier,
                 display_name=submission.display_name,
                 execution_timestamp=datetime.now().isoformat(),
-                execution_status="success",
                 stdout_output=result['stdout'],
                 stderr_output=result['stderr'],
                 return_code=result['return_code'],
-                execution_time=execution_time
+                execution_time=execution_time,
+                stdout_bytes=result['stdout_bytes'],
+                stderr_bytes=result['stderr_bytes'],
+                **self._status_fields(result)
             )
             
         except Exception as e:
@@ -114,7 +195,7 @@ class PythonExecutionService:
                 # Tenta novamente após instalar dependências
                 self._debug_print(f"  [DEBUG] Tentando novamente após instalar dependências...")
                 try:
-                    result = self._run_python_code(main_file)
+                    result = self._run_python_code(main_file, resource_limits)
                     execution_time = time.time() - start_time
                     
                     self._debug_print(f"  [DEBUG] Execução bem-sucedida após instalar dependências")
@@ -122,11 +203,13 @@ class PythonExecutionService:
                         submission_identifier=identifier,
                         display_name=submission.display_name,
                         execution_timestamp=datetime.now().isoformat(),
-                        execution_status="success",
                         stdout_output=result['stdout'],
                         stderr_output=result['stderr'],
                         return_code=result['return_code'],
-                        execution_time=execution_time
+                        execution_time=execution_time,
+                        stdout_bytes=result['stdout_bytes'],
+                        stderr_bytes=result['stderr_bytes'],
+                        **self._status_fields(result)
                     )
                 except Exception as retry_exc:
                     self._debug_print(f"  [DEBUG] Falha na segunda tentativa: {retry_exc}")
@@ -144,67 +227,249 @@ class PythonExecutionService:
             
             raise e
     
-    def _run_python_code(self, main_file: Path) -> Dict[str, Any]:
-        """Executa código Python e captura output."""
-        cmd = [
-            "pipenv", "run", "python", "main.py"
-        ]
+    def _run_python_code(self, main_file: Path,
+                         resource_limits: Optional[Dict[str, Optional[int]]] = None) -> Dict[str, Any]:
+        """Executa código Python (com os limites de recursos) e captura output."""
+        # Ambiente com as dependências da submissão (o do Pipenv, se já as tiver)
+        environment = environment_for_submission(main_file.parent)
+        cmd = environment.command("python", "main.py")
         
         self._debug_print(f"  [DEBUG] Executando comando: {' '.join(cmd)}")
         
-        process = subprocess.Popen(
-            cmd,
+        # O programa roda em um grupo de processos próprio, encerrado por inteiro
+        supervisor = get_process_supervisor()
+        process = supervisor.popen(
+            limited_command(cmd, resource_limits),
+            stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             cwd=main_file.parent,
-            text=True,
-            encoding='utf-8',
-            errors='replace'
+            env=environment.env()
         )
         
+        # Lê a saída aos poucos: só o início e o fim de cada stream ficam em memória
+        output = self._new_output(process)
+        readers = output.start_readers(process)
+        # Um input() sem entrada encerra o programa na hora, sem esperar o timeout
+        detector = self._new_hang_detector(process, process.stdin.fileno(), process.stdin.close, output)
+        detector.start()
+        
         try:
             # Aguarda execução com timeout
-            stdout, stderr = process.communicate(timeout=TEST_TIMEOUT)
+            process.wait(timeout=TEST_TIMEOUT)
+            detector.stop()
+            # Subprocessos deixados pelo aluno morrem junto (e fecham os pipes)
+            supervisor.release(process.pid)
+            for reader in readers:
+                reader.join()
+            process.stdin.close()
             
-            # Limita tamanho do output para evitar problemas
-            if len(stdout) > MAX_TEST_OUTPUT:
-                stdout = stdout[:MAX_TEST_OUTPUT] + "\n... (output truncado)"
-            if len(stderr) > MAX_TEST_OUTPUT:
-                stderr = stderr[:MAX_TEST_OUTPUT] + "\n... (output truncado)"
-            
-            return {
-                'stdout': stdout,
-                'stderr': stderr,
-                'return_code': process.returncode
-            }
+            return self._output_result(output, process.returncode, resource_limits, detector)
             
         except subprocess.TimeoutExpired:
             self._debug_print(f"  [DEBUG] Timeout na execução, terminando processo...")
-            process.terminate()
-            try:
-                process.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                process.kill()
-                process.wait(timeout=5)
+            detector.stop()
+            supervisor.terminate(process)
+            process.stdin.close()
             
             return {
                 'stdout': "",
                 'stderr': f"Timeout: execução excedeu {TEST_TIMEOUT} segundos",
-                'return_code': -1
+                'return_code': -1,
+                'stdout_bytes': output.stdout.total_bytes,
+                'stderr_bytes': output.stderr.total_bytes
             }
         
         except Exception as e:
             self._debug_print(f"  [DEBUG] Erro na execução: {e}")
-            # Tenta terminar o processo se ainda estiver rodando
-            try:
-                if process.poll() is None:
-                    process.terminate()
-                    process.wait(timeout=5)
-            except:
-                pass
+            detector.stop()
+            # Termina o processo (e o grupo) se ainda estiver rodando
+            supervisor.terminate(process)
             
             raise e
     
+    async def _execute_submission_python_async(self, submission, assignment_name: str, turma_name: str,
+                                               provenance: Optional[Dict[str, Dict[str, str]]] = None,
+                                               workdir: Optional[Path] = None) -> PythonExecutionResult:
+        """
+        Versão assíncrona de _execute_submission_python.
+        
+        O programa roda como subprocesso asyncio; limpeza de cache e instalação
+        de dependências (bloqueantes) rodam em threads do executor.
+        """
+        main_file = submission.submission_path / "main.py"
+        if not main_file.exists():
+            raise FileNotFoundError(f"Arquivo main.py não encontrado em {submission.submission_path}")
+        
+        identifier = getattr(submission, 'github_login', None) or getattr(submission, 'group_name', None)
+        resource_limits = get_resource_limits(assignment_name)
+        if workdir is not None:
+            self._debug_print(f"  [DEBUG] Executando main.py (async) para {identifier} em {workdir}")
+            return await self._execute_main_file_async(submission, identifier, Path(workdir) / "main.py",
+                                                       time.time(), resource_limits)
+        
+        # Hash dos arquivos e leitura do cache ficam fora do event loop
+        key, cached = await asyncio.to_thread(self._lookup_cache, submission.submission_path,
+                                              resource_limits, provenance)
+        if cached is not None:
+            self._debug_print(f"  [DEBUG] Resultado de {identifier} reaproveitado do cache")
+            # A chave não inclui o aluno: submissões idênticas compartilham a entrada
+            return dataclasses.replace(cached, submission_identifier=identifier,
+                                       display_name=submission.display_name)
+        
+        self._debug_print(f"  [DEBUG] Executando main.py (async) para {identifier}")
+        
+        start_time = time.time()
+        workspaces = get_workspace_manager()
+        main_file = await asyncio.to_thread(workspaces.create, submission.submission_path) / "main.py"
+        try:
+            result = await self._execute_main_file_async(submission, identifier, main_file, start_time,
+                                                         resource_limits)
+        finally:
+            await asyncio.to_thread(workspaces.release, main_file.parent)
+        await asyncio.to_thread(self._store_cache, key, result)
+        return result
+    
+    async def _execute_main_file_async(self, submission, identifier: str, main_file: Path, start_time: float,
+                                       resource_limits: Optional[Dict[str, Optional[int]]] = None
+                                       ) -> PythonExecutionResult:
+        """Versão assíncrona de _execute_main_file."""
+        await asyncio.to_thread(self._clear_python_cache, main_file.parent)
+        
+        try:
+            result = await self._run_python_code_async(main_file, resource_limits)
+        except Exception as e:
+            error_str = str(e).lower()
+            if not any(keyword in error_str for keyword in ['module', 'import', 'no module named']):
+                raise
+            self._debug_print(f"  [DEBUG] Detectado erro de importação, tentando instalar dependências...")
+            await asyncio.to_thread(self._install_common_dependencies, main_file.parent)
+            try:
+                result = await self._run_python_code_async(main_file, resource_limits)
+            except Exception as retry_exc:
+                self._debug_print(f"  [DEBUG] Falha na segunda tentativa: {retry_exc}")
+                return PythonExecutionResult(
+                    submission_identifier=identifier,
+                    display_name=submission.display_name,
+                    execution_timestamp=datetime.now().isoformat(),
+                    execution_status="error",
+                    stdout_output="",
+                    stderr_output="",
+                    return_code=-1,
+                    execution_time=time.time() - start_time,
+                    error_message=str(retry_exc)
+                )
+        
+        execution_time = time.time() - start_time
+        self._debug_print(f"  [DEBUG] Execução concluída para {identifier} em {execution_time:.2f}s")
+        
+        return PythonExecutionResult(
+            submission_identifier=identifier,
+            display_name=submission.display_name,
+            execution_timestamp=datetime.now().isoformat(),
+            stdout_output=result['stdout'],
+            stderr_output=result['stderr'],
+            return_code=result['return_code'],
+            execution_time=execution_time,
+            stdout_bytes=result['stdout_bytes'],
+            stderr_bytes=result['stderr_bytes'],
+            **self._status_fields(result)
+        )
+    
+    async def _run_python_code_async(self, main_file: Path,
+                                     resource_limits: Optional[Dict[str, Optional[int]]] = None) -> Dict[str, Any]:
+        """Executa o código Python como subprocesso asyncio e captura o output."""
+        environment = await asyncio.to_thread(environment_for_submission, main_file.parent)
+        cmd = environment.command("python", "main.py")
+        self._debug_print(f"  [DEBUG] Executando comando (async): {' '.join(cmd)}")
+        
+        supervisor = get_process_supervisor()
+        process = await supervisor.create_subprocess_exec(
+            *limited_command(cmd, resource_limits),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=main_file.parent,
+            env=environment.env()
+        )
+        
+        output = self._new_output(process)
+        readers = asyncio.ensure_future(output.read_async(process))
+        stdin_fd = process.stdin.get_extra_info('pipe').fileno()
+        detector = self._new_hang_detector(process, stdin_fd, process.stdin.close, output)
+        watcher = asyncio.ensure_future(detector.watch_async())
+        try:
+            await asyncio.wait_for(process.wait(), timeout=TEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._debug_print(f"  [DEBUG] Timeout na execução, terminando processo...")
+            detector.stop()
+            await watcher
+            await supervisor.terminate_async(process)
+            await readers
+            process.stdin.close()
+            
+            return {
+                'stdout': "",
+                'stderr': f"Timeout: execução excedeu {TEST_TIMEOUT} segundos",
+                'return_code': -1,
+                'stdout_bytes': output.stdout.total_bytes,
+                'stderr_bytes': output.stderr.total_bytes
+            }
+        
+        detector.stop()
+        await watcher
+        # Subprocessos deixados pelo aluno morrem junto (e fecham os pipes)
+        supervisor.release(process.pid)
+        await readers
+        process.stdin.close()
+        return self._output_result(output, process.returncode, resource_limits, detector)
+    
+    @staticmethod
+    def _new_output(process) -> ProcessOutput:
+        """Captura limitada da saída do processo, encerrando o grupo se escrever demais."""
+        return ProcessOutput(OUTPUT_CAPTURE_HEAD_BYTES, OUTPUT_CAPTURE_TAIL_BYTES, OUTPUT_FLOOD_LIMIT,
+                             on_flood=lambda: get_process_supervisor().kill(process.pid))
+    
+    @staticmethod
+    def _new_hang_detector(process, stdin_fd: int, close_stdin, output: ProcessOutput) -> HangDetector:
+        """Vigia o programa, encerrando o grupo se ficar esperando entrada (ou parado)."""
+        return HangDetector(process.pid, stdin_fd, close_stdin,
+                            on_hang=lambda: get_process_supervisor().kill(process.pid),
+                            output=output, idle_timeout=HANG_IDLE_TIMEOUT)
+    
+    def _output_result(self, output: ProcessOutput, return_code: int,
+                       resource_limits: Optional[Dict[str, Optional[int]]] = None,
+                       detector: Optional[HangDetector] = None) -> Dict[str, Any]:
+        """Resultado da execução: saída limitada a MAX_TEST_OUTPUT, total de bytes, limite violado e espera por entrada."""
+        stderr = output.stderr.text()
+        if output.flooded:
+            stderr = f"{output.flood_notice()}\n{stderr}"
+        return {
+            'stdout': self._truncate_output(output.stdout.text()),
+            'stderr': self._truncate_output(stderr),
+            'return_code': return_code,
+            'stdout_bytes': output.stdout.total_bytes,
+            'stderr_bytes': output.stderr.total_bytes,
+            'limit_violation': detect_violation(return_code, stderr, resource_limits),
+            'hang_message': hang_message(detector, return_code, stderr)
+        }
+    
+    @staticmethod
+    def _status_fields(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Status da execução concluída: "resource_limit_exceeded" ou "waiting_for_input" se for o caso."""
+        if result.get('limit_violation'):
+            return {'execution_status': "resource_limit_exceeded", 'error_message': result['limit_violation']}
+        if result.get('hang_message'):
+            return {'execution_status': "waiting_for_input", 'error_message': result['hang_message']}
+        return {'execution_status': "success"}
+    
+    @staticmethod
+    def _truncate_output(output: str) -> str:
+        """Limita o tamanho do output para evitar problemas."""
+        if len(output) > MAX_TEST_OUTPUT:
+            return output[:MAX_TEST_OUTPUT] + "\n... (output truncado)"
+        return output
+    
     def _clear_python_cache(self, submission_path: Path):
         """Limpa cache Python para garantir execução limpa."""
         try:
@@ -224,73 +489,11 @@ class PythonExecutionService:
             self._debug_print(f"  [DEBUG] Erro ao limpar cache: {e}")
     
     def _install_fundamental_dependencies(self, submission_path: Path):
-        """Instala dependências fundamentais necessárias para execução das submissões."""
-        fundamental_deps = [
-            "requests",
-            "beautifulsoup4",
-            "pandas",
-            "numpy",
-            "matplotlib",
-            "seaborn",
-            "lxml",
-            "selenium",
-            "webdriver-manager",
-            "sqlalchemy",
-            "psycopg2-binary",
-            "python-dotenv"
-        ]
-        
-        self._debug_print(f"  [DEBUG] Instalando dependências fundamentais...")
-        
-        for dep in fundamental_deps:
-            try:
-                # Usa pipenv run pip install para instalar no ambiente correto
-                result = subprocess.run(
-                    ["pipenv", "run", "pip", "install", dep],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    timeout=60  # Timeout maior para instalações
-                )
-                if result.returncode == 0:
-                    self._debug_print(f"  [DEBUG] Instalado: {dep}")
-                else:
-                    self._debug_print(f"  [DEBUG] Falha ao instalar {dep}: {result.stderr.decode()}")
-            except Exception as e:
-                self._debug_print(f"  [DEBUG] Falha ao instalar {dep}: {e}")
-                continue
+        """Instala as dependências fundamentais que ainda não estão no ambiente (uma única chamada ao pip)."""
+        installed = get_dependency_provisioner().ensure(SUBMISSION_DEPENDENCIES)
+        self._debug_print(f"  [DEBUG] Dependências fundamentais instaladas agora: {installed or 'nenhuma'}")
     
     def _install_common_dependencies(self, submission_path: Path):
-        """Instala dependências comuns que podem estar faltando."""
-        common_deps = [
-            "requests",
-            "beautifulsoup4",
-            "pandas",
-            "numpy",
-            "matplotlib",
-            "seaborn",
-            "lxml",
-            "selenium",
-            "webdriver-manager",
-            "sqlalchemy",
-            "psycopg2-binary",
-            "python-dotenv"
-        ]
-        
-        self._debug_print(f"  [DEBUG] Tentando instalar dependências comuns...")
-        
-        for dep in common_deps:
-            try:
-                # Usa pipenv run pip install para instalar no ambiente correto
-                result = subprocess.run(
-                    ["pipenv", "run", "pip", "install", dep],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    timeout=30
-                )
-                if result.returncode == 0:
-                    self._debug_print(f"  [DEBUG] Instalado: {dep}")
-                else:
-                    self._debug_print(f"  [DEBUG] Falha ao instalar {dep}: {result.stderr.decode()}")
-            except Exception as e:
-                self._debug_print(f"  [DEBUG] Falha ao instalar {dep}: {e}")
-                continue 
\ No newline at end of file
+        """Instala dependências comuns que podem estar faltando (só as ausentes)."""
+        installed = get_dependency_provisioner().ensure(SUBMISSION_DEPENDENCIES)
+        self._debug_print(f"  [DEBUG] Dependências comuns instaladas agora: {installed or 'nenhuma'}")
@@ -56,7 +56,7 @@ class PythonExecutionVisualService:
         partial = sum(1 for item in submissions_with_execution 
                      if item['execution'].execution_status == "partial_success")
         failed = sum(1 for item in submissions_with_execution 
-                    if item['execution'].execution_status == "error")
+                    if item['execution'].execution_status in ("error", "resource_limit_exceeded", "waiting_for_input"))
         
         avg_time = sum(item['execution'].execution_time for item in submissions_with_execution) / total if total > 0 else 0
         
@@ -90,6 +90,14 @@ class PythonExecutionVisualService:
                 status_icon = "⚠️"
                 status_text = "Parcial"
                 status_class = "partial"
+            elif execution.execution_status == "resource_limit_exceeded":
+                status_icon = "⛔"
+                status_text = "Limite de recursos"
+                status_class = "error"
+            elif execution.execution_status == "waiting_for_input":
+                status_icon = "⌛"
+                status_text = "Esperando entrada"
+                status_class = "error"
             else:
                 status_icon = "❌"
                 status_text = "Erro"
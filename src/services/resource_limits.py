@@ -0,0 +1,113 @@
+"""
+Limites de recursos (rlimits) das execuções do código dos alunos.
+
+Sem limites, um loop descontrolado (ex.: pandas acumulando dados) pode levar
+a máquina a usar swap e atrasar todas as correções em paralelo. Os limites de
+RESOURCE_LIMITS (config.py) são aplicados a cada programa: tempo de CPU,
+espaço de endereçamento, arquivos abertos, processos e tamanho de arquivo.
+
+Os limites não são aplicados com preexec_fn, que não é seguro com as threads
+do corretor. O comando é iniciado por um lançador mínimo (`python -S -c`) que
+chama setrlimit e faz exec do programa: o PID e o grupo de processos não
+mudam. No pytest, o plugin grader_results aplica os mesmos limites no
+próprio processo (--grader-rlimits).
+
+Uma violação é reconhecida pelo sinal que encerrou o processo (SIGXCPU) ou
+pelo erro no stderr (MemoryError, "Too many open files"...), e a execução
+recebe o status "resource_limit_exceeded".
+"""
+import json
+import signal
+import sys
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Chave em RESOURCE_LIMITS → (rlimit, multiplicador para a unidade do rlimit)
+LIMIT_RESOURCES = {
+    "cpu_seconds": ("RLIMIT_CPU", 1),
+    "memory_mb": ("RLIMIT_AS", 1024 * 1024),
+    "open_files": ("RLIMIT_NOFILE", 1),
+    "processes": ("RLIMIT_NPROC", 1),
+    "file_size_mb": ("RLIMIT_FSIZE", 1024 * 1024),
+}
+
+# Como cada limite aparece ao ser violado por um programa Python
+LIMIT_ERRORS = {
+    "memory_mb": ("MemoryError", "Cannot allocate memory", "Unable to allocate"),
+    "open_files": ("Too many open files",),
+    "file_size_mb": ("File too large",),
+    "processes": ("Resource temporarily unavailable",),
+}
+
+LIMIT_DESCRIPTIONS = {
+    "cpu_seconds": "tempo de CPU ({value}s)",
+    "memory_mb": "memória ({value} MB)",
+    "open_files": "arquivos abertos ({value})",
+    "processes": "processos ({value})",
+    "file_size_mb": "tamanho de arquivo ({value} MB)",
+}
+
+# Aplica os rlimits de argv[1] (JSON) e executa o comando de argv[2:].
+# No tempo de CPU, o limite rígido fica 1s acima: o programa recebe SIGXCPU antes do SIGKILL.
+_LAUNCHER = (
+    "import json, os, resource, sys\n"
+    "for name, value in json.loads(sys.argv[1]).items():\n"
+    "    limit = getattr(resource, name)\n"
+    "    hard = resource.getrlimit(limit)[1]\n"
+    "    wanted = value + 1 if name == 'RLIMIT_CPU' else value\n"
+    "    if hard != resource.RLIM_INFINITY:\n"
+    "        value, wanted = min(value, hard), min(wanted, hard)\n"
+    "    resource.setrlimit(limit, (value, wanted))\n"
+    "os.execvp(sys.argv[2], sys.argv[2:])\n"
+)
+
+
+def rlimit_values(limits: Optional[Dict[str, Optional[int]]]) -> Dict[str, int]:
+    """Limites configurados como {nome do rlimit: valor}, sem os desativados ou sem suporte."""
+    if not limits or resource is None:
+        return {}
+    values = {}
+    for key, value in limits.items():
+        if value is None or key not in LIMIT_RESOURCES:
+            continue
+        name, unit = LIMIT_RESOURCES[key]
+        if hasattr(resource, name):
+            values[name] = int(value * unit)
+    return values
+
+
+def limited_command(cmd: List[str], limits: Optional[Dict[str, Optional[int]]]) -> List[str]:
+    """Comando que aplica os limites e executa cmd (o próprio cmd se não há limites)."""
+    values = rlimit_values(limits)
+    if not values:
+        return cmd
+    return [sys.executable, "-S", "-c", _LAUNCHER, json.dumps(values), *cmd]
+
+
+def detect_violation(return_code: int, stderr: str,
+                     limits: Optional[Dict[str, Optional[int]]]) -> Optional[str]:
+    """
+    Identifica uma violação de limite a partir do código de saída e do stderr.
+
+    Returns:
+        Mensagem (ex.: "Limite de memória (4096 MB) excedido") ou None
+    """
+    if not rlimit_values(limits):
+        return None
+    sigxcpu = getattr(signal, "SIGXCPU", None)
+    if limits.get("cpu_seconds") is not None and sigxcpu is not None and return_code == -sigxcpu:
+        return _violation_message("cpu_seconds", limits)
+    if return_code == 0:
+        return None
+    for key, patterns in LIMIT_ERRORS.items():
+        if limits.get(key) is not None and any(pattern in stderr for pattern in patterns):
+            return _violation_message(key, limits)
+    return None
+
+
+def _violation_message(key: str, limits: Dict[str, Optional[int]]) -> str:
+    return f"Limite de {LIMIT_DESCRIPTIONS[key].format(value=limits[key])} excedido"
@@ -1,7 +1,9 @@
 """
 Serviço para gerar thumbnails de dashboards Streamlit.
 """
-import os
+import asyncio
+import dataclasses
+import shutil
 import time
 import subprocess
 import threading
@@ -18,8 +20,33 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
 
 from ..domain.models import ThumbnailResult
+from .dependency_provisioner import get_dependency_provisioner
+from .process_supervisor import get_process_supervisor
+from .submission_environments import environment_for_submission
+from .workspace_manager import get_workspace_manager
 from config import STREAMLIT_STARTUP_TIMEOUT, SCREENSHOT_WAIT_TIME, CHROME_WINDOW_SIZE, STREAMLIT_PORT_RANGE, STREAMLIT_FILE_CONFIG
 
+# Portas em uso por capturas em andamento (compartilhado entre threads)
+_reserved_ports = set()
+_reserved_ports_lock = threading.Lock()
+
+# Dependências usadas com frequência pelos dashboards (instaladas só se ausentes)
+STREAMLIT_DEPENDENCIES = [
+    "streamlit",
+    "plotly",
+    "pandas",
+    "requests",
+    "beautifulsoup4",
+    "numpy",
+    "matplotlib",
+    "seaborn",
+    "altair",
+    "lxml",
+    "sqlalchemy",
+    "psycopg2-binary",
+    "python-dotenv",
+]
+
 
 class StreamlitThumbnailService:
     """Serviço para gerar thumbnails de dashboards Streamlit."""
@@ -36,22 +63,41 @@ class StreamlitThumbnailService:
             print(message)
         
     def generate_thumbnails_for_assignment(self, assignment_name: str, turma_name: str,
-                                         submissions: List) -> List[ThumbnailResult]:
-        """Gera thumbnails para todas as submissões de um assignment."""
+                                         submissions: List, force_recapture: bool = False) -> List[ThumbnailResult]:
+        """
+        Gera thumbnails para todas as submissões de um assignment.
+        
+        Submissões que já têm streamlit_thumbnail (capturado durante a correção)
+        reaproveitam esse resultado; o Streamlit só é iniciado para as que não
+        têm, ou para todas com force_recapture.
+        """
         print(f"Gerando thumbnails para {assignment_name} da turma {turma_name}")
 
         # Armazena o assignment atual para uso posterior
         self.current_assignment = assignment_name
 
+        reused = {}
+        if not force_recapture:
+            for submission in submissions:
+                thumbnail = self._reuse_captured_thumbnail(submission)
+                if thumbnail is not None:
+                    reused[id(submission)] = thumbnail
+        if reused:
+            print(f"Reaproveitando {len(reused)} thumbnail(s) capturado(s) durante a correção")
+
         # Instala dependências fundamentais uma única vez para toda a execução
-        if submissions:
-            first_submission_path = submissions[0].submission_path.parent
+        to_capture = [s for s in submissions if id(s) not in reused]
+        if to_capture:
+            first_submission_path = to_capture[0].submission_path.parent
             self._debug_print(f"Instalando dependências fundamentais uma única vez...")
             self._install_fundamental_dependencies(first_submission_path)
 
         results = []
         
         for submission in submissions:
+            if id(submission) in reused:
+                results.append(reused[id(submission)])
+                continue
             try:
                 print(f"Gerando thumbnail para {submission.display_name} ({'grupo' if hasattr(submission, 'group_name') else 'individual'})...")
                 result = self._capture_submission_thumbnail(submission, assignment_name, turma_name)
@@ -73,9 +119,36 @@ class StreamlitThumbnailService:
         
         return results
     
+    def _reuse_captured_thumbnail(self, submission) -> Optional[ThumbnailResult]:
+        """
+        Retorna o thumbnail capturado na correção, copiando a imagem para output_dir se preciso.
+        
+        Capturas que falharam (erro ou timeout) também são reaproveitadas, para não
+        esperar o timeout do Streamlit de novo; um resultado "success" cuja imagem
+        sumiu é recapturado.
+        """
+        thumbnail = getattr(submission, 'streamlit_thumbnail', None)
+        if thumbnail is None:
+            return None
+        
+        path = thumbnail.thumbnail_path
+        if not (path and path.is_file()):
+            return None if thumbnail.streamlit_status == "success" else thumbnail
+        
+        target = self.output_dir / path.name
+        if path.resolve() != target.resolve():
+            shutil.copy2(path, target)
+            thumbnail = dataclasses.replace(thumbnail, thumbnail_path=target)
+        return thumbnail
+    
     def _capture_submission_thumbnail(self, submission, assignment_name: str,
-                                    turma_name: str) -> ThumbnailResult:
-        """Captura thumbnail de uma submissão específica."""
+                                    turma_name: str, workdir: Optional[Path] = None) -> ThumbnailResult:
+        """
+        Captura thumbnail de uma submissão específica.
+        
+        Com workdir, o dashboard roda nessa cópia (a da execução do main.py,
+        com os arquivos que ele gerou), que não é removida aqui.
+        """
         # Determina o arquivo Streamlit a ser usado
         streamlit_filename = STREAMLIT_FILE_CONFIG.get(assignment_name, "main.py")
         main_file = submission.submission_path / streamlit_filename
@@ -85,11 +158,25 @@ class StreamlitThumbnailService:
         # Identificador da submissão
         identifier = getattr(submission, 'github_login', None) or getattr(submission, 'group_name', None)
         
-        # Encontra porta disponível
+        # Encontra porta disponível (reservada até o fim da captura)
         port = self._find_available_port()
-        
+        try:
+            if workdir is not None:
+                return self._capture_on_port(submission, assignment_name, Path(workdir) / streamlit_filename,
+                                             identifier, port)
+            # Executa em uma cópia da submissão (a pasta do aluno não é alterada)
+            with get_workspace_manager().workspace(submission.submission_path) as workdir:
+                return self._capture_on_port(submission, assignment_name, workdir / streamlit_filename, identifier, port)
+        finally:
+            self._release_port(port)
+    
+    def _capture_on_port(self, submission, assignment_name: str, main_file: Path,
+                         identifier: str, port: int) -> ThumbnailResult:
+        """Executa o Streamlit na porta reservada e captura o thumbnail."""
         self._debug_print(f"  [DEBUG] Iniciando Streamlit na porta {port} para {identifier}")
         
+        thumbnail_path = self.output_dir / f"{identifier}_{assignment_name}.png"
+        
         # Executa Streamlit em background
         process = self._start_streamlit(main_file, port)
         
@@ -99,7 +186,6 @@ class StreamlitThumbnailService:
                 raise RuntimeError("Streamlit não inicializou corretamente")
             
             # Captura screenshot e detecta erros
-            thumbnail_path = self.output_dir / f"{identifier}_{assignment_name}.png"
             streamlit_errors = []
             try:
                 streamlit_errors = self._capture_screenshot(port, thumbnail_path)
@@ -131,8 +217,9 @@ class StreamlitThumbnailService:
                 self._debug_print(f"  [DEBUG] Detectado erro de importação, tentando instalar dependências...")
                 self._install_common_dependencies(main_file.parent)
                 
-                # Tenta novamente após instalar dependências
+                # Tenta novamente após instalar dependências, com um Streamlit novo na mesma porta
                 self._debug_print(f"  [DEBUG] Tentando novamente após instalar dependências...")
+                self._stop_streamlit(process)
                 process = self._start_streamlit(main_file, port)
                 
                 if not self._wait_for_streamlit_ready(port, identifier):
@@ -155,13 +242,11 @@ class StreamlitThumbnailService:
                 except Exception as retry_exc:
                     self._debug_print(f"  [DEBUG] Falha na segunda tentativa: {retry_exc}")
                     raise retry_exc
-                finally:
-                    self._stop_streamlit(process)
             
             raise e
             
         finally:
-            # Para o processo Streamlit e aguarda um pouco para garantir que a porta seja liberada
+            # Para o processo Streamlit (o da segunda tentativa, se houve) e aguarda um pouco para garantir que a porta seja liberada
             self._stop_streamlit(process)
             time.sleep(5)  # Aguarda 5 segundos para liberar a porta completamente
     
@@ -189,6 +274,114 @@ class StreamlitThumbnailService:
         self._debug_print(f"  [DEBUG] Timeout aguardando Streamlit para {identifier}")
         return False
     
+    async def _capture_submission_thumbnail_async(self, submission, assignment_name: str,
+                                                  turma_name: str, workdir: Optional[Path] = None) -> ThumbnailResult:
+        """
+        Versão assíncrona de _capture_submission_thumbnail.
+        
+        A espera pelo Streamlit (probe HTTP e pausas) acontece no event loop;
+        Selenium, início e parada do processo rodam em threads do executor.
+        """
+        streamlit_filename = STREAMLIT_FILE_CONFIG.get(assignment_name, "main.py")
+        main_file = submission.submission_path / streamlit_filename
+        if not main_file.exists():
+            raise FileNotFoundError(f"Arquivo {streamlit_filename} não encontrado em {submission.submission_path}")
+        
+        identifier = getattr(submission, 'github_login', None) or getattr(submission, 'group_name', None)
+        
+        # Executa em uma cópia da submissão (a pasta do aluno não é alterada),
+        # ou na da execução do main.py, que fica com quem a criou
+        workspaces = get_workspace_manager()
+        owned = workdir is None
+        if owned:
+            workdir = await asyncio.to_thread(workspaces.create, submission.submission_path)
+        main_file = Path(workdir) / streamlit_filename
+        try:
+            port = await asyncio.to_thread(self._find_available_port)
+            try:
+                return await self._capture_on_port_async(submission, assignment_name, main_file, identifier, port)
+            except Exception as e:
+                error_str = str(e).lower()
+                if not any(keyword in error_str for keyword in ['module', 'import', 'no module named']):
+                    raise
+                self._debug_print(f"  [DEBUG] Detectado erro de importação, tentando instalar dependências...")
+                await asyncio.to_thread(self._install_common_dependencies, main_file.parent)
+                return await self._capture_on_port_async(submission, assignment_name, main_file, identifier, port)
+            finally:
+                self._release_port(port)
+        finally:
+            if owned:
+                await asyncio.to_thread(workspaces.release, workdir)
+    
+    async def _capture_on_port_async(self, submission, assignment_name: str, main_file: Path,
+                                     identifier: str, port: int) -> ThumbnailResult:
+        """Executa o Streamlit na porta reservada e captura o thumbnail sem bloquear o event loop."""
+        self._debug_print(f"  [DEBUG] Iniciando Streamlit (async) na porta {port} para {identifier}")
+        process = await asyncio.to_thread(self._start_streamlit, main_file, port)
+        
+        try:
+            if not await self._wait_for_streamlit_ready_async(port, identifier):
+                raise RuntimeError("Streamlit não inicializou corretamente")
+            
+            thumbnail_path = self.output_dir / f"{identifier}_{assignment_name}.png"
+            try:
+                streamlit_errors = await asyncio.to_thread(self._capture_screenshot, port, thumbnail_path)
+            except Exception:
+                await asyncio.to_thread(self._log_process_output, process, identifier)
+                raise
+            
+            return ThumbnailResult(
+                submission_identifier=identifier,
+                display_name=submission.display_name,
+                thumbnail_path=thumbnail_path,
+                capture_timestamp=datetime.now().isoformat(),
+                streamlit_status="error" if streamlit_errors else "success",
+                streamlit_exceptions=streamlit_errors
+            )
+        finally:
+            await asyncio.to_thread(self._stop_streamlit, process)
+            await asyncio.sleep(5)  # Aguarda a porta ser liberada sem bloquear as demais capturas
+    
+    async def _wait_for_streamlit_ready_async(self, port: int, identifier: str) -> bool:
+        """Versão assíncrona de _wait_for_streamlit_ready."""
+        max_attempts = STREAMLIT_STARTUP_TIMEOUT // 2  # Tenta a cada 2 segundos
+        
+        for attempt in range(1, max_attempts + 1):
+            if await self._probe_http_async(port):
+                # Aguarda um pouco mais para garantir que o Streamlit carregou completamente
+                await asyncio.sleep(3)
+                self._debug_print(f"  [DEBUG] Streamlit está respondendo na porta {port} para {identifier}")
+                return True
+            
+            await asyncio.sleep(2)
+            self._debug_print(f"  [DEBUG] Tentativa {attempt}/{max_attempts} - aguardando Streamlit para {identifier}")
+        
+        self._debug_print(f"  [DEBUG] Timeout aguardando Streamlit para {identifier}")
+        return False
+    
+    async def _probe_http_async(self, port: int, timeout: float = 5) -> bool:
+        """Faz um GET / na porta e retorna True se a resposta for HTTP 200."""
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection("localhost", port), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        
+        try:
+            writer.write(f"GET / HTTP/1.0\r\nHost: localhost:{port}\r\n\r\n".encode("ascii"))
+            await writer.drain()
+            status_line = await asyncio.wait_for(reader.readline(), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+        
+        parts = status_line.decode("latin-1").split()
+        return len(parts) >= 2 and parts[1] == "200"
+    
     def _log_process_output(self, process: subprocess.Popen, identifier: str):
         """Loga a saída do processo Streamlit para debug."""
         try:
@@ -204,9 +397,23 @@ class StreamlitThumbnailService:
             self._debug_print(f"  [DEBUG] Erro ao ler saída do processo: {e}")
     
     def _find_available_port(self) -> int:
-        """Encontra uma porta disponível para o Streamlit."""
+        """Encontra e reserva uma porta disponível para o Streamlit."""
+        with _reserved_ports_lock:
+            port = self._probe_available_port()
+            _reserved_ports.add(port)
+            return port
+    
+    def _release_port(self, port: int):
+        """Libera uma porta reservada por _find_available_port."""
+        with _reserved_ports_lock:
+            _reserved_ports.discard(port)
+    
+    def _probe_available_port(self) -> int:
+        """Procura uma porta livre que não esteja reservada por outra captura."""
         start_port, end_port = STREAMLIT_PORT_RANGE
         for port in range(start_port, end_port):
+            if port in _reserved_ports:
+                continue
             try:
                 with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
                     s.bind(('localhost', port))
@@ -229,8 +436,10 @@ class StreamlitThumbnailService:
         # Usa o nome do arquivo correto
         streamlit_filename = main_file.name
 
-        cmd = [
-            "pipenv", "run", "streamlit", "run", streamlit_filename,
+        # Ambiente com as dependências da submissão (o do Pipenv, se já as tiver)
+        environment = environment_for_submission(main_file.parent)
+        cmd = environment.command(
+            "streamlit", "run", streamlit_filename,
             "--server.port", str(port),
             "--server.headless", "true",
             "--server.enableCORS", "false",
@@ -238,13 +447,14 @@ class StreamlitThumbnailService:
             "--server.runOnSave", "false",
             "--browser.gatherUsageStats", "false",
             "--server.maxUploadSize", "200"
-        ]
+        )
         
-        process = subprocess.Popen(
+        process = get_process_supervisor().popen(
             cmd,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            cwd=main_file.parent
+            cwd=main_file.parent,
+            env=environment.env()
         )
         return process
     
@@ -268,120 +478,21 @@ class StreamlitThumbnailService:
             self._debug_print(f"  [DEBUG] Erro ao limpar cache: {e}")
     
     def _install_fundamental_dependencies(self, submission_path: Path):
-        """Instala dependências fundamentais necessárias para execução das submissões."""
-        fundamental_deps = [
-            "streamlit",
-            "plotly",
-            "pandas",
-            "requests",
-            "beautifulsoup4",
-            "numpy",
-            "matplotlib",
-            "seaborn",
-            "altair",
-            "lxml",
-            "sqlalchemy",
-            "psycopg2-binary",
-            "python-dotenv"
-        ]
-        
-        self._debug_print(f"  [DEBUG] Instalando dependências fundamentais...")
-        
-        for dep in fundamental_deps:
-            try:
-                # Usa pipenv run pip install para instalar no ambiente correto
-                result = subprocess.run(
-                    ["pipenv", "run", "pip", "install", dep],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    timeout=60  # Timeout maior para instalações
-                )
-                if result.returncode == 0:
-                    self._debug_print(f"  [DEBUG] Instalado: {dep}")
-                else:
-                    self._debug_print(f"  [DEBUG] Falha ao instalar {dep}: {result.stderr.decode()}")
-            except Exception as e:
-                self._debug_print(f"  [DEBUG] Falha ao instalar {dep}: {e}")
-                continue
+        """Instala as dependências fundamentais que ainda não estão no ambiente (uma única chamada ao pip)."""
+        installed = get_dependency_provisioner().ensure(STREAMLIT_DEPENDENCIES)
+        self._debug_print(f"  [DEBUG] Dependências fundamentais instaladas agora: {installed or 'nenhuma'}")
     
     def _install_common_dependencies(self, submission_path: Path):
-        """Instala dependências comuns que podem estar faltando."""
-        common_deps = [
-            "plotly",
-            "altair",
-            "matplotlib",
-            "seaborn",
-            "numpy",
-            "pandas",
-            "requests",
-            "beautifulsoup4",
-            "lxml",
-            "sqlalchemy",
-            "psycopg2-binary",
-            "python-dotenv"
-        ]
-        
-        self._debug_print(f"  [DEBUG] Tentando instalar dependências comuns...")
-        
-        for dep in common_deps:
-            try:
-                # Usa pipenv run pip install para instalar no ambiente correto
-                result = subprocess.run(
-                    ["pipenv", "run", "pip", "install", dep],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    timeout=30
-                )
-                if result.returncode == 0:
-                    self._debug_print(f"  [DEBUG] Instalado: {dep}")
-                else:
-                    self._debug_print(f"  [DEBUG] Falha ao instalar {dep}: {result.stderr.decode()}")
-            except Exception as e:
-                self._debug_print(f"  [DEBUG] Falha ao instalar {dep}: {e}")
-                continue
+        """Instala dependências comuns que podem estar faltando (só as ausentes)."""
+        installed = get_dependency_provisioner().ensure(STREAMLIT_DEPENDENCIES)
+        self._debug_print(f"  [DEBUG] Dependências comuns instaladas agora: {installed or 'nenhuma'}")
     
     def _stop_streamlit(self, process: subprocess.Popen):
-        """Para o processo Streamlit."""
-        try:
-            if process.poll() is None:  # Processo ainda está rodando
-                self._debug_print(f"  [DEBUG] Terminando processo Streamlit...")
-                process.terminate()
-                try:
-                    process.wait(timeout=10)
-                    self._debug_print(f"  [DEBUG] Processo Streamlit terminado com sucesso")
-                except subprocess.TimeoutExpired:
-                    self._debug_print(f"  [DEBUG] Forçando kill do processo Streamlit...")
-                    process.kill()
-                    process.wait(timeout=5)
-                    self._debug_print(f"  [DEBUG] Processo Streamlit forçadamente finalizado")
-        except Exception as e:
-            self._debug_print(f"  [DEBUG] Erro ao parar processo Streamlit: {e}")
-            try:
-                process.kill()
-                process.wait(timeout=5)
-            except:
-                pass
-        
-        # Mata processos órfãos do Streamlit que possam estar rodando
-        self._kill_orphan_streamlit_processes()
-    
-    def _kill_orphan_streamlit_processes(self):
-        """Mata processos órfãos do Streamlit que possam estar rodando."""
-        try:
-            import psutil
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                try:
-                    cmdline = proc.info['cmdline']
-                    if cmdline and any('streamlit' in arg.lower() for arg in cmdline):
-                        self._debug_print(f"  [DEBUG] Matando processo órfão do Streamlit: PID {proc.info['pid']}")
-                        proc.terminate()
-                        proc.wait(timeout=5)
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.TimeoutExpired):
-                    continue
-        except ImportError:
-            self._debug_print(f"  [DEBUG] psutil não disponível, pulando limpeza de processos órfãos")
-        except Exception as e:
-            self._debug_print(f"  [DEBUG] Erro ao matar processos órfãos: {e}")
+        """Para o processo Streamlit e os subprocessos do grupo dele."""
+        if process.poll() is None:  # Processo ainda está rodando
+            self._debug_print(f"  [DEBUG] Terminando processo Streamlit...")
+        # SIGTERM no grupo, SIGKILL após 10s; só afeta o Streamlit desta captura
+        get_process_supervisor().terminate(process, grace=10)
     
     def _capture_screenshot(self, port: int, output_path: Path):
         """Captura screenshot da página Streamlit completa e detecta erros."""
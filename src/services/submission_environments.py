@@ -0,0 +1,303 @@
+"""
+Ambientes Python por conjunto de dependências das submissões.
+
+Os alunos importam bibliotecas além das listas fixas dos serviços de execução
+e Streamlit. Aqui as dependências de cada submissão são detectadas (imports
+dos arquivos .py e requirements.txt). Se o ambiente do Pipenv já as atende,
+a submissão usa esse ambiente. Caso contrário, ela usa um virtualenv em
+cache, identificado pelo hash do conjunto de dependências extras e
+compartilhado por todas as submissões que precisam do mesmo conjunto.
+
+Esses virtualenvs são leves: um arquivo .pth aponta para o site-packages do
+ambiente base, então só as dependências extras são instaladas neles. Os
+menos usados são removidos quando passam de SUBMISSION_ENVS_MAX.
+
+Só pacotes de SUBMISSION_ALLOWED_PACKAGES são instalados: o setup de um pacote
+roda no host do corretor, e um import de um módulo local esquecido (ou com
+erro de digitação) não pode baixar um pacote arbitrário do PyPI. O pip roda no
+supervisor de processos, com os limites de RESOURCE_LIMITS.
+"""
+import ast
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+from ..utils.fingerprint import IGNORED_DIRS
+from .dependency_provisioner import DependencyProvisioner, get_dependency_provisioner, normalize_name
+from .environment_resolver import EnvironmentResolver, venv_executable, get_environment_resolver
+from .process_supervisor import get_process_supervisor
+from .resource_limits import limited_command
+
+# Módulos cujo pacote no PyPI tem outro nome
+IMPORT_ALIASES = {
+    "bs4": "beautifulsoup4",
+    "cv2": "opencv-python",
+    "dateutil": "python-dateutil",
+    "dotenv": "python-dotenv",
+    "PIL": "pillow",
+    "sklearn": "scikit-learn",
+    "yaml": "pyyaml",
+}
+
+# Arquivo que marca um virtualenv completo (o mtime registra o último uso)
+READY_MARKER = ".grader-ready"
+
+# Requisito instalável: nome, extras opcionais e especificadores de versão (sem URLs nem caminhos)
+_REQUIREMENT_PATTERN = re.compile(
+    r"(?P<name>[A-Za-z0-9][A-Za-z0-9._-]*)\s*(\[[A-Za-z0-9._,\s-]*\])?"
+    r"\s*((===?|[<>!~]=|[<>])\s*[A-Za-z0-9.*+!-]+(\s*,\s*(===?|[<>!~]=|[<>])\s*[A-Za-z0-9.*+!-]+)*)?"
+)
+
+
+def requirement_name(requirement: str) -> Optional[str]:
+    """Nome do pacote de um requisito ("plotly>=5" → "plotly"), ou None se não for nome + versão."""
+    match = _REQUIREMENT_PATTERN.fullmatch(requirement.strip())
+    return match.group("name") if match else None
+
+
+def detect_requirements(submission_path: Path) -> Set[str]:
+    """
+    Dependências de uma submissão: linhas do requirements.txt e imports de terceiros.
+
+    Módulos da biblioteca padrão e módulos da própria submissão (arquivos e
+    pastas com o mesmo nome) são ignorados.
+    """
+    submission_path = Path(submission_path)
+    requirements: Set[str] = set()
+
+    requirements_file = submission_path / "requirements.txt"
+    if requirements_file.is_file():
+        for line in requirements_file.read_text(encoding="utf-8", errors="replace").splitlines():
+            line = line.split("#", 1)[0].strip()
+            if line and not line.startswith("-"):
+                requirements.add(line)
+
+    local_modules = {path.stem for path in submission_path.iterdir()
+                     if path.suffix == ".py" or (path.is_dir() and path.name not in IGNORED_DIRS)}
+    for module in _imported_modules(submission_path):
+        if module in sys.stdlib_module_names or module in local_modules:
+            continue
+        requirements.add(module)
+    return requirements
+
+
+def _imported_modules(submission_path: Path) -> Set[str]:
+    """Módulos de topo importados (import absoluto) pelos arquivos .py da submissão."""
+    modules: Set[str] = set()
+    for path in submission_path.rglob("*.py"):
+        if any(part in IGNORED_DIRS for part in path.relative_to(submission_path).parts):
+            continue
+        try:
+            tree = ast.parse(path.read_bytes(), filename=str(path))
+        except (SyntaxError, ValueError, OSError):
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules.update(alias.name.split(".")[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                modules.add(node.module.split(".")[0])
+    return modules
+
+
+class SubmissionEnvironment:
+    """Virtualenv em cache com as dependências extras de um grupo de submissões."""
+
+    def __init__(self, path: Path, base: EnvironmentResolver):
+        self.path = Path(path)
+        self.base = base
+
+    def command(self, executable: str, *args: str) -> List[str]:
+        """Como EnvironmentResolver.command; outros executáveis rodam como `python -m`."""
+        python = str(venv_executable(self.path, "python"))
+        if executable == "python":
+            return [python, *args]
+        return [python, "-m", executable, *args]
+
+    def env(self) -> Dict[str, str]:
+        """Ambiente do subprocesso com este virtualenv ativado."""
+        env = self.base.env()
+        env["VIRTUAL_ENV"] = str(self.path)
+        env["PATH"] = os.pathsep.join(filter(None, [str(venv_executable(self.path, "python").parent),
+                                                    env.get("PATH")]))
+        return env
+
+
+class SubmissionEnvironmentPool:
+    """Mapeia o conjunto de dependências de cada submissão para um ambiente."""
+
+    def __init__(self, root: Path, base: EnvironmentResolver, provisioner: DependencyProvisioner,
+                 max_environments: int = 20, enabled: bool = True, allowed_packages: Iterable[str] = (),
+                 resource_limits: Optional[Dict[str, Optional[int]]] = None):
+        self.root = Path(root)
+        self.base = base
+        self.provisioner = provisioner
+        self.max_environments = max_environments
+        self.enabled = enabled
+        # Pacotes que podem ser instalados (nomes normalizados); os demais são ignorados
+        self.allowed_packages = {normalize_name(package) for package in allowed_packages}
+        # Limites aplicados ao pip e aos demais comandos de criação do ambiente
+        self.resource_limits = resource_limits
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._failed: Set[str] = set()
+        self._used: Set[str] = set()
+
+    def environment_for(self, submission_path: Path) -> Union[EnvironmentResolver, SubmissionEnvironment]:
+        """
+        Ambiente para executar a submissão.
+
+        Returns:
+            O ambiente base (EnvironmentResolver) se ele já atende a submissão,
+            ou um SubmissionEnvironment com as dependências extras
+        """
+        if not self.enabled:
+            return self.base
+
+        extras = self.allowed_requirements(self.missing_requirements(detect_requirements(submission_path)))
+        if not extras:
+            return self.base
+
+        key = self._environment_key(extras)
+        with self._lock:
+            if key in self._failed:
+                return self.base
+            self._used.add(key)
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            path = self.root / key
+            if not (path / READY_MARKER).exists():
+                print(f"🐍 Criando ambiente para dependências extras: {', '.join(extras)}")
+                if not self._create_environment(path, extras):
+                    with self._lock:
+                        self._failed.add(key)
+                    return self.base
+                self._evict()
+            os.utime(path / READY_MARKER)
+        return SubmissionEnvironment(path, self.base)
+
+    def missing_requirements(self, requirements: Iterable[str]) -> List[str]:
+        """Dependências (nomes do PyPI) que o ambiente base não tem, em ordem."""
+        installed = self.provisioner.installed_distributions()
+        if not installed:
+            # Sem a lista de instalados não dá para saber o que falta: usa o ambiente base
+            return []
+        modules = self.provisioner.installed_modules()
+        missing = set()
+        for requirement in requirements:
+            if requirement in modules:
+                continue
+            distribution = IMPORT_ALIASES.get(requirement, requirement)
+            if normalize_name(distribution) not in installed:
+                missing.add(distribution)
+        return sorted(missing, key=normalize_name)
+
+    def allowed_requirements(self, requirements: Iterable[str]) -> List[str]:
+        """Requisitos que podem ser instalados (SUBMISSION_ALLOWED_PACKAGES), avisando dos demais."""
+        allowed, blocked = [], []
+        for requirement in requirements:
+            name = requirement_name(requirement)
+            if name is not None and normalize_name(name) in self.allowed_packages:
+                allowed.append(requirement)
+            else:
+                blocked.append(requirement)
+        if blocked:
+            print(f"⚠️  Dependências fora de SUBMISSION_ALLOWED_PACKAGES não serão instaladas: {', '.join(blocked)}")
+        return allowed
+
+    def _environment_key(self, extras: List[str]) -> str:
+        """Hash do conjunto de dependências extras e do ambiente base."""
+        digest = hashlib.sha256()
+        for part in (str(self.base.venv_path() or sys.prefix), *extras):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()[:24]
+
+    def _create_environment(self, path: Path, extras: List[str]) -> bool:
+        """Cria o virtualenv (sem pip próprio, enxergando o site-packages base) e instala os extras."""
+        shutil.rmtree(path, ignore_errors=True)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        env = self.base.env()
+        try:
+            base_paths = json.loads(self._run(self.base.command(
+                "python", "-c", "import json, sysconfig; print(json.dumps(sysconfig.get_paths()))"), env))
+            self._run(self.base.command("python", "-m", "venv", "--without-pip", str(path)), env,
+                      resource_limits=self.resource_limits)
+
+            venv = SubmissionEnvironment(path, self.base)
+            venv_paths = json.loads(self._run(venv.command(
+                "python", "-c", "import json, sysconfig; print(json.dumps(sysconfig.get_paths()))"), venv.env(),
+                resource_limits=self.resource_limits))
+            # O pip e as bibliotecas do ambiente base ficam visíveis no virtualenv
+            base_dirs = dict.fromkeys([base_paths["purelib"], base_paths["platlib"]])
+            Path(venv_paths["purelib"], "_grader_base.pth").write_text("\n".join(base_dirs) + "\n")
+
+            self._run(venv.command("python", "-m", "pip", "install",
+                                   *self.provisioner.pip_source_args(), *extras),
+                      venv.env(), timeout=self.provisioner.timeout, resource_limits=self.resource_limits)
+        except (OSError, ValueError, KeyError, subprocess.SubprocessError) as e:
+            print(f"⚠️  Não foi possível criar o ambiente para {', '.join(extras)}: {e}")
+            shutil.rmtree(path, ignore_errors=True)
+            return False
+
+        (path / READY_MARKER).touch()
+        return True
+
+    @staticmethod
+    def _run(cmd: List[str], env: Dict[str, str], timeout: int = 120,
+             resource_limits: Optional[Dict[str, Optional[int]]] = None) -> str:
+        """Roda um comando (supervisionado, com os limites) e devolve o stdout; falha com CalledProcessError."""
+        result = get_process_supervisor().run(limited_command(cmd, resource_limits), timeout=timeout,
+                                              capture_output=True, env=env, text=True)
+        if result.returncode != 0:
+            raise subprocess.CalledProcessError(result.returncode, cmd, result.stdout, result.stderr.strip()[-500:])
+        return result.stdout
+
+    def _evict(self) -> None:
+        """Remove os ambientes usados há mais tempo, preservando os usados nesta execução."""
+        environments = []
+        for path in self.root.iterdir():
+            marker = path / READY_MARKER
+            try:
+                environments.append((marker.stat().st_mtime, path))
+            except OSError:
+                continue
+        excess = len(environments) - self.max_environments
+        for _, path in sorted(environments):
+            if excess <= 0:
+                break
+            if path.name in self._used:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            excess -= 1
+
+
+_pool: Optional[SubmissionEnvironmentPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_submission_environment_pool() -> SubmissionEnvironmentPool:
+    """Retorna o pool compartilhado de ambientes (SUBMISSION_ENVS_* no config.py)."""
+    global _pool
+    from config import (CACHE_DIR, SUBMISSION_ENVS_ENABLED, SUBMISSION_ENVS_MAX, SUBMISSION_ALLOWED_PACKAGES,
+                        RESOURCE_LIMITS)
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = SubmissionEnvironmentPool(CACHE_DIR / "venvs", get_environment_resolver(),
+                                              get_dependency_provisioner(), SUBMISSION_ENVS_MAX,
+                                              SUBMISSION_ENVS_ENABLED, SUBMISSION_ALLOWED_PACKAGES,
+                                              RESOURCE_LIMITS)
+        return _pool
+
+
+def environment_for_submission(submission_path: Path) -> Union[EnvironmentResolver, SubmissionEnvironment]:
+    """Atalho: ambiente (com command/env) para executar a submissão em submission_path."""
+    return get_submission_environment_pool().environment_for(submission_path)
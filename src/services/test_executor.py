@@ -1,55 +1,340 @@
 """
 Serviço para executar testes Python usando pytest.
 """
+import asyncio
+import os
 import subprocess
 import sys
 import json
+import tempfile
+from contextlib import ExitStack
+from datetime import datetime
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from ..domain.models import AssignmentTestExecution, AssignmentTestResult
+from ..utils.disk_cache import DiskCache
+from ..utils.fingerprint import compute_test_results_key
+from .process_supervisor import get_process_supervisor
+from .pytest_worker_pool import get_pytest_worker_pool
+from .resource_limits import rlimit_values
+from .workspace_manager import get_workspace_manager
+
+
+# Tempo máximo de uma execução do pytest (segundos)
+PYTEST_TIMEOUT = 60
+
+# Diretório do plugin grader_results (carregado com -p no subprocesso do pytest)
+PLUGIN_DIR = Path(__file__).parent / "pytest_plugin"
 
 
 class PytestExecutor:
     """Serviço para executar testes Python."""
     
-    def __init__(self):
-        pass
+    def __init__(self, use_worker_pool: bool = True, use_cache: bool = True):
+        # Usa o pool de workers pytest pré-aquecidos (PYTEST_WORKER_POOL_SIZE no config.py)
+        self.use_worker_pool = use_worker_pool
+        # Reaproveita resultados de execuções idênticas (CACHE_DIR/pytest no config.py)
+        self.use_cache = use_cache
+        self._cache = None
     
-    def run_tests(self, submission_path: Path, test_files: List[str]) -> List[AssignmentTestExecution]:
-        """Executa testes em uma submissão diretamente na pasta do aluno, detalhando cada função de teste."""
-        results = []
+    def run_tests(self, submission_path: Path, test_files: List[str],
+                  provenance: Optional[Dict[str, Dict[str, str]]] = None,
+                  test_timeout: Optional[float] = None, fail_fast: bool = False,
+                  tests_dir: Optional[Path] = None,
+                  resource_limits: Optional[Dict[str, Optional[int]]] = None) -> List[AssignmentTestExecution]:
+        """
+        Executa testes em uma submissão, detalhando cada função de teste.
+        
+        O pytest roda em uma cópia temporária da submissão (ver WorkspaceManager),
+        sem alterar a pasta do aluno.
+        
+        Se os arquivos da submissão, os testes e o ambiente Python forem os mesmos
+        de uma execução anterior, devolve o resultado do cache e registra a origem
+        em provenance["tests"].
         
-        # Remove .report.json antigo, se existir
-        report_json = submission_path / ".report.json"
-        if report_json.exists():
-            report_json.unlink()
+        Args:
+            test_timeout: Tempo limite de cada teste (segundos); só o teste que
+                estourar vira ERROR e os demais continuam
+            fail_fast: Encerra o pytest no primeiro erro de coleta (ex.: ImportError
+                do módulo do aluno) em vez de coletar os outros arquivos
+            tests_dir: Pasta do enunciado; seus test_files substituem os da submissão
+            resource_limits: Limites de recursos do pytest (RESOURCE_LIMITS no config.py)
+        """
+        pytest_args = self._pytest_args(test_files, test_timeout, fail_fast, resource_limits)
+        key, cached = self._lookup_cache(submission_path, test_files, pytest_args, provenance, tests_dir)
+        if cached is not None:
+            return cached
         
-        # Executa pytest com --json-report usando caminhos relativos
+        with get_workspace_manager().workspace(submission_path, tests_dir, test_files if tests_dir else ()) as workdir:
+            results = self._run_tests_uncached(workdir, pytest_args)
+        self._store_cache(key, results)
+        return results
+    
+    async def run_tests_async(self, submission_path: Path, test_files: List[str],
+                              provenance: Optional[Dict[str, Dict[str, str]]] = None,
+                              test_timeout: Optional[float] = None, fail_fast: bool = False,
+                              tests_dir: Optional[Path] = None,
+                              resource_limits: Optional[Dict[str, Optional[int]]] = None) -> List[AssignmentTestExecution]:
+        """Versão assíncrona de run_tests: aguarda o pytest como subprocesso asyncio."""
+        pytest_args = self._pytest_args(test_files, test_timeout, fail_fast, resource_limits)
+        # Hash dos arquivos, leitura do cache e cópia do workspace ficam fora do event loop
+        key, cached = await asyncio.to_thread(self._lookup_cache, submission_path, test_files, pytest_args,
+                                              provenance, tests_dir)
+        if cached is not None:
+            return cached
+        
+        workspaces = get_workspace_manager()
+        workdir = await asyncio.to_thread(workspaces.create, submission_path, tests_dir,
+                                          test_files if tests_dir else ())
         try:
-            result = subprocess.run(
-                [sys.executable, "-m", "pytest", "-v", "--tb=short", "--json-report"] + test_files,
-                capture_output=True,
-                text=True,
-                cwd=submission_path,
-                timeout=60
+            results = await self._run_tests_uncached_async(workdir, pytest_args)
+        finally:
+            await asyncio.to_thread(workspaces.release, workdir)
+        await asyncio.to_thread(self._store_cache, key, results)
+        return results
+    
+    def run_tests_batch(self, jobs: List[Tuple[Path, List[str]]],
+                        provenances: Optional[List[Dict[str, Dict[str, str]]]] = None,
+                        test_timeout: Optional[float] = None, fail_fast: bool = False,
+                        tests_dir: Optional[Path] = None,
+                        resource_limits: Optional[Dict[str, Optional[int]]] = None) -> List[List[AssignmentTestExecution]]:
+        """
+        Executa os testes de várias submissões em uma única sessão de worker.
+        
+        Para assignments com testes rápidos, o custo dominante é iniciar o
+        interpretador e o pytest; aqui ele é pago uma vez por lote. Submissões
+        em cache não entram no lote. Sem o pool de workers, cada submissão roda
+        separadamente.
+        
+        Args:
+            jobs: Lista de (submission_path, test_files)
+            provenances: Um dicionário de origem por job (ver run_tests)
+            test_timeout, fail_fast, tests_dir, resource_limits: Como em run_tests, para todos os jobs
+        
+        Returns:
+            Os resultados de cada job, na mesma ordem
+        """
+        provenances = provenances or [None] * len(jobs)
+        args = [self._pytest_args(test_files, test_timeout, fail_fast, resource_limits) for _, test_files in jobs]
+        results: List[Optional[List[AssignmentTestExecution]]] = [None] * len(jobs)
+        keys: List[Optional[str]] = [None] * len(jobs)
+        for index, (submission_path, test_files) in enumerate(jobs):
+            keys[index], results[index] = self._lookup_cache(submission_path, test_files, args[index],
+                                                             provenances[index], tests_dir)
+        
+        misses = [index for index, result in enumerate(results) if result is None]
+        with ExitStack() as stack:
+            workdirs = {
+                index: stack.enter_context(get_workspace_manager().workspace(
+                    jobs[index][0], tests_dir, jobs[index][1] if tests_dir else ()))
+                for index in misses
+            }
+            
+            pool = self._get_worker_pool() if len(misses) > 1 else None
+            if pool is not None:
+                try:
+                    outcomes = pool.run_batch([(workdirs[index], args[index]) for index in misses], PYTEST_TIMEOUT)
+                except Exception as e:
+                    print(f"⚠️  Erro no lote de testes, executando submissões separadamente: {e}")
+                    outcomes = [([], "", "not_run")] * len(misses)
+                for index, (entries, stdout, status) in zip(misses, outcomes):
+                    if status != "not_run":
+                        results[index] = self._build_results(entries, stdout, "", status)
+            
+            for index in misses:
+                if results[index] is None:
+                    results[index] = self._run_tests_uncached(workdirs[index], args[index])
+                self._store_cache(keys[index], results[index])
+        
+        return results
+    
+    def _run_tests_uncached(self, submission_path: Path, pytest_args: List[str]) -> List[AssignmentTestExecution]:
+        """Executa o pytest (no pool de workers ou em um subprocesso)."""
+        pool = self._get_worker_pool()
+        if pool is not None:
+            return self._run_in_pool(pool, submission_path, pytest_args)
+        
+        # O plugin escreve os resultados em um arquivo temporário anônimo herdado
+        # pelo pytest, fora da pasta do aluno
+        with tempfile.TemporaryFile() as results_file:
+            fd = results_file.fileno()
+            try:
+                # No timeout, o pytest e os processos criados pelos testes são encerrados
+                result = get_process_supervisor().run(
+                    self._build_command(pytest_args, fd),
+                    capture_output=True,
+                    text=True,
+                    cwd=submission_path,
+                    timeout=PYTEST_TIMEOUT,
+                    pass_fds=(fd,),
+                    env=self._plugin_env()
+                )
+                stdout, stderr, status = result.stdout, result.stderr, "done"
+            except subprocess.TimeoutExpired:
+                stdout, stderr, status = "", "", "timeout"
+            except Exception as e:
+                return [AssignmentTestExecution(test_name="pytest", result=AssignmentTestResult.ERROR, message=f"Erro ao rodar pytest: {e}")]
+            
+            entries = self._read_entries(results_file)
+        
+        return self._build_results(entries, stdout, stderr, status)
+    
+    async def _run_tests_uncached_async(self, submission_path: Path, pytest_args: List[str]) -> List[AssignmentTestExecution]:
+        """Versão assíncrona de _run_tests_uncached."""
+        pool = self._get_worker_pool()
+        if pool is not None:
+            return await asyncio.to_thread(self._run_in_pool, pool, submission_path, pytest_args)
+        
+        with tempfile.TemporaryFile() as results_file:
+            fd = results_file.fileno()
+            try:
+                supervisor = get_process_supervisor()
+                process = await supervisor.create_subprocess_exec(
+                    *self._build_command(pytest_args, fd),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    cwd=submission_path,
+                    pass_fds=(fd,),
+                    env=self._plugin_env()
+                )
+                try:
+                    stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=PYTEST_TIMEOUT)
+                    status = "done"
+                except asyncio.TimeoutError:
+                    await supervisor.terminate_async(process, grace=0)
+                    stdout, stderr, status = b"", b"", "timeout"
+                finally:
+                    supervisor.release(process.pid)
+            except Exception as e:
+                return [AssignmentTestExecution(test_name="pytest", result=AssignmentTestResult.ERROR, message=f"Erro ao rodar pytest: {e}")]
+            
+            entries = self._read_entries(results_file)
+        
+        return self._build_results(entries, stdout.decode(errors="replace"), stderr.decode(errors="replace"), status)
+    
+    def _get_cache(self) -> Optional[DiskCache]:
+        """Cache em disco dos resultados do pytest, ou None se desativado."""
+        if not self.use_cache:
+            return None
+        if self._cache is None:
+            from config import CACHE_DIR, PYTEST_CACHE_MAX_BYTES
+            self._cache = DiskCache(CACHE_DIR / "pytest", PYTEST_CACHE_MAX_BYTES)
+        return self._cache
+    
+    def _lookup_cache(self, submission_path: Path, test_files: List[str], pytest_args: List[str],
+                      provenance: Optional[Dict[str, Dict[str, str]]],
+                      tests_dir: Optional[Path] = None) -> Tuple[Optional[str], Optional[List[AssignmentTestExecution]]]:
+        """Retorna (chave, resultados em cache ou None)."""
+        cache = self._get_cache()
+        if cache is None or not test_files:
+            return None, None
+        
+        key = compute_test_results_key(submission_path, test_files, pytest_args, tests_dir)
+        entry = cache.get(key)
+        if entry is None:
+            return key, None
+        
+        if provenance is not None:
+            provenance["tests"] = {"cache_key": key[:16], "cached_at": entry.get("cached_at", "")}
+        results = [
+            AssignmentTestExecution(
+                test_name=test["test_name"],
+                result=AssignmentTestResult(test["result"]),
+                message=test.get("message", ""),
+                execution_time=test.get("execution_time", 0.0)
             )
+            for test in entry.get("results", [])
+        ]
+        return key, results
+    
+    def _store_cache(self, key: Optional[str], results: List[AssignmentTestExecution]) -> None:
+        """Guarda os resultados no cache, exceto falhas da própria execução (timeout, pytest ausente)."""
+        cache = self._get_cache()
+        if cache is None or key is None:
+            return
+        if any(test.test_name == "pytest" and test.result == AssignmentTestResult.ERROR for test in results):
+            return
+        
+        cache.set(key, {
+            "cached_at": datetime.now().isoformat(),
+            "results": [
+                {
+                    "test_name": test.test_name,
+                    "result": test.result.value,
+                    "message": test.message,
+                    "execution_time": test.execution_time
+                }
+                for test in results
+            ]
+        })
+    
+    def _get_worker_pool(self):
+        """Pool compartilhado de workers pytest, ou None para usar um subprocesso por submissão."""
+        if not self.use_worker_pool:
+            return None
+        try:
+            return get_pytest_worker_pool()
+        except Exception as e:
+            print(f"⚠️  Pool de workers pytest indisponível, usando subprocessos: {e}")
+            self.use_worker_pool = False
+            return None
+    
+    def _run_in_pool(self, pool, submission_path: Path, pytest_args: List[str]) -> List[AssignmentTestExecution]:
+        """Executa os testes em um worker pré-aquecido do pool."""
+        try:
+            entries, stdout, status = pool.run(submission_path, pytest_args, PYTEST_TIMEOUT)
         except Exception as e:
             return [AssignmentTestExecution(test_name="pytest", result=AssignmentTestResult.ERROR, message=f"Erro ao rodar pytest: {e}")]
+        return self._build_results(entries, stdout, "", status)
+    
+    def _pytest_args(self, test_files: List[str], test_timeout: Optional[float] = None,
+                     fail_fast: bool = False,
+                     resource_limits: Optional[Dict[str, Optional[int]]] = None) -> List[str]:
+        """Argumentos do pytest (sem .pytest_cache), incluindo as opções do plugin grader_results."""
+        args = ["-v", "--tb=short", "-p", "no:cacheprovider"]
+        if test_timeout:
+            args += ["--grader-test-timeout", f"{test_timeout:g}"]
+        if fail_fast:
+            args.append("--grader-fail-fast")
+        rlimits = rlimit_values(resource_limits)
+        if rlimits:
+            args += ["--grader-rlimits", json.dumps(rlimits, sort_keys=True, separators=(",", ":"))]
+        return args + list(test_files)
+    
+    def _build_command(self, pytest_args: List[str], results_fd: int) -> List[str]:
+        """Comando do pytest com o plugin que escreve os resultados em results_fd."""
+        return [sys.executable, "-m", "pytest", "-p", "grader_results",
+                "--grader-results-fd", str(results_fd)] + pytest_args
+    
+    @staticmethod
+    def _plugin_env() -> Dict[str, str]:
+        """Ambiente do subprocesso com o diretório do plugin no PYTHONPATH."""
+        env = os.environ.copy()
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(PLUGIN_DIR), env.get("PYTHONPATH")]))
+        return env
+    
+    @staticmethod
+    def _read_entries(results_file) -> List[Dict]:
+        """Lê as linhas JSON escritas pelo plugin; uma linha cortada por timeout é ignorada."""
+        results_file.seek(0)
+        entries = []
+        for line in results_file.read().decode("utf-8", errors="replace").splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+        return entries
+    
+    def _build_results(self, entries: List[Dict], stdout: str, stderr: str, status: str) -> List[AssignmentTestExecution]:
+        """
+        Converte os resultados emitidos pelo plugin em AssignmentTestExecution.
         
-        # Lê o .report.json (com ponto no início)
-        if not report_json.exists():
-            # Fallback: não gerou .report.json, retorna erro genérico
-            return [AssignmentTestExecution(test_name="pytest", result=AssignmentTestResult.ERROR, message="pytest não gerou .report.json. STDOUT:\n" + result.stdout + "\nSTDERR:\n" + result.stderr)]
-        
-        with open(report_json, encoding="utf-8") as f:
-            report = json.load(f)
-        
-        # Extrai resultados detalhados
-        for test in report.get("tests", []):
-            name = test.get("nodeid", "?")
+        status é "done", "timeout" (testes já concluídos são mantidos) ou
+        "crashed" (o processo morreu antes de terminar).
+        """
+        results = []
+        for test in entries:
             outcome = test.get("outcome", "error")
-            duration = test.get("duration", 0.0)
-            message = test.get("longrepr", "") or test.get("call", {}).get("crash", {}).get("message", "")
             if outcome == "passed":
                 result_enum = AssignmentTestResult.PASSED
             elif outcome == "failed":
@@ -59,15 +344,19 @@ class PytestExecutor:
             else:
                 result_enum = AssignmentTestResult.ERROR
             results.append(AssignmentTestExecution(
-                test_name=name,
+                test_name=test.get("nodeid", "?"),
                 result=result_enum,
-                message=message,
-                execution_time=duration
+                message=test.get("message", ""),
+                execution_time=test.get("duration", 0.0)
             ))
         
-        # Se não houver testes, retorna erro
-        if not results:
-            results.append(AssignmentTestExecution(test_name="pytest", result=AssignmentTestResult.ERROR, message="Nenhum teste encontrado ou erro na execução."))
+        if status == "timeout":
+            results.append(AssignmentTestExecution(test_name="pytest", result=AssignmentTestResult.ERROR, message=f"Erro ao rodar pytest: tempo limite de {PYTEST_TIMEOUT}s excedido ({len(entries)} teste(s) concluído(s) antes do timeout)"))
+        elif status == "crashed":
+            results.append(AssignmentTestExecution(test_name="pytest", result=AssignmentTestResult.ERROR, message=f"Erro ao rodar pytest: o processo de testes terminou inesperadamente ({len(entries)} teste(s) concluído(s) antes)"))
+        elif not results:
+            # Se não houver testes, retorna erro
+            results.append(AssignmentTestExecution(test_name="pytest", result=AssignmentTestResult.ERROR, message="Nenhum teste encontrado ou erro na execução. STDOUT:\n" + stdout + "\nSTDERR:\n" + stderr))
         
         return results
     
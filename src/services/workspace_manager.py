@@ -0,0 +1,174 @@
+"""
+Workspaces temporários para executar o código dos alunos.
+
+Testes, execução e Streamlit rodavam direto na pasta do aluno (o checkout git
+em respostas/), criando e apagando __pycache__, .pytest_cache e .streamlit
+ali. Isso altera o repositório do aluno e impede que dois estágios usem a
+mesma submissão ao mesmo tempo.
+
+Cada execução recebe agora uma cópia própria da submissão em um diretório de
+rascunho, de preferência em tmpfs (/dev/shm), que é removido ao final. Os
+arquivos de teste do enunciado podem ser sobrepostos à cópia, para que a
+versão oficial dos testes prevaleça sobre a do aluno.
+"""
+import atexit
+import errno
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence, Set
+
+from ..utils.fingerprint import IGNORED_DIRS, IGNORED_FILES
+
+# ioctl FICLONE do Linux: cópia copy-on-write (reflink) em btrfs/xfs
+_FICLONE = 0x40049409
+
+
+class WorkspaceManager:
+    """Cria e remove cópias temporárias das submissões."""
+
+    def __init__(self, root: Optional[Path] = None, enabled: bool = True):
+        self.root = Path(root) if root else _default_root()
+        self.enabled = enabled
+        self._active: Set[Path] = set()
+        self._lock = threading.Lock()
+
+    def create(self, source: Path, overlay_dir: Optional[Path] = None,
+               overlay_files: Sequence[str] = ()) -> Path:
+        """
+        Copia a submissão para um workspace novo.
+
+        O workspace mantém o nome da pasta da submissão. Artefatos (.git,
+        __pycache__, .pytest_cache, .streamlit, ambientes virtuais) não são
+        copiados. Se o tmpfs não tiver espaço, usa o diretório temporário do
+        sistema.
+
+        Args:
+            source: Pasta da submissão
+            overlay_dir: Pasta de onde sobrepor arquivos (ex.: enunciado)
+            overlay_files: Caminhos relativos a overlay_dir copiados por cima
+
+        Returns:
+            Caminho do workspace, ou a própria submissão se desativado
+        """
+        source = Path(source)
+        if not self.enabled:
+            return source
+
+        roots = [self.root]
+        if Path(tempfile.gettempdir()) != self.root:
+            roots.append(Path(tempfile.gettempdir()))
+
+        for index, root in enumerate(roots):
+            scratch = Path(tempfile.mkdtemp(prefix="grader-", dir=root))
+            workspace = scratch / source.name
+            try:
+                shutil.copytree(source, workspace, symlinks=True, ignore=_ignore_artifacts,
+                                copy_function=_clone_file)
+                for relative in overlay_files:
+                    overlay_file = Path(overlay_dir) / relative
+                    if overlay_file.is_file():
+                        target = workspace / relative
+                        target.parent.mkdir(parents=True, exist_ok=True)
+                        _clone_file(overlay_file, target)
+            except OSError as e:
+                shutil.rmtree(scratch, ignore_errors=True)
+                if e.errno == errno.ENOSPC and index + 1 < len(roots):
+                    continue
+                raise
+            with self._lock:
+                self._active.add(scratch)
+            return workspace
+
+    def release(self, workspace: Path) -> None:
+        """Remove um workspace criado por create (nada acontece se desativado)."""
+        scratch = Path(workspace).parent
+        with self._lock:
+            if scratch not in self._active:
+                return
+            self._active.discard(scratch)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    @contextmanager
+    def workspace(self, source: Path, overlay_dir: Optional[Path] = None,
+                  overlay_files: Sequence[str] = ()) -> Iterator[Path]:
+        """Context manager com create/release."""
+        path = self.create(source, overlay_dir, overlay_files)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def cleanup(self) -> None:
+        """Remove todos os workspaces ainda ativos (chamado na saída do processo)."""
+        with self._lock:
+            active, self._active = self._active, set()
+        for scratch in active:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+def _default_root() -> Path:
+    """/dev/shm quando disponível (tmpfs), senão o diretório temporário do sistema."""
+    shm = Path("/dev/shm")
+    if shm.is_dir() and os.access(shm, os.W_OK):
+        return shm
+    return Path(tempfile.gettempdir())
+
+
+def _ignore_artifacts(directory: str, names: Sequence[str]) -> Set[str]:
+    """Filtro do copytree: pula diretórios e arquivos gerados (mesmos do fingerprint)."""
+    return {name for name in names
+            if name in IGNORED_DIRS or name in IGNORED_FILES or name.endswith(".pyc")}
+
+
+def _clone_file(src, dst) -> None:
+    """
+    Copia um arquivo com reflink quando o sistema de arquivos permite.
+
+    Hardlinks não são usados: o aluno que abrisse um arquivo com "w" no
+    workspace alteraria o original.
+    """
+    try:
+        # Reflink só é possível dentro do mesmo sistema de arquivos (nunca com /dev/shm)
+        if os.stat(src).st_dev == os.stat(os.path.dirname(dst)).st_dev:
+            import fcntl
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            shutil.copystat(src, dst)
+            return
+    except (ImportError, OSError):
+        pass
+    shutil.copy2(src, dst)
+
+
+def pipenv_env() -> Dict[str, str]:
+    """
+    Ambiente para `pipenv run` dentro de um workspace.
+
+    Fora da árvore do projeto o pipenv não encontra o Pipfile subindo os
+    diretórios, então ele é fixado em PIPENV_PIPFILE.
+    """
+    from config import BASE_DIR
+
+    env = os.environ.copy()
+    env.setdefault("PIPENV_PIPFILE", str(BASE_DIR / "Pipfile"))
+    return env
+
+
+_manager: Optional[WorkspaceManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_workspace_manager() -> WorkspaceManager:
+    """Retorna o gerenciador compartilhado, criando-o na primeira chamada (WORKSPACE_* no config.py)."""
+    global _manager
+    from config import WORKSPACE_ENABLED, WORKSPACE_ROOT
+
+    with _manager_lock:
+        if _manager is None:
+            _manager = WorkspaceManager(WORKSPACE_ROOT, WORKSPACE_ENABLED)
+            atexit.register(_manager.cleanup)
+        return _manager
@@ -0,0 +1,121 @@
+"""
+Cache em disco endereçado por conteúdo, com remoção LRU por tamanho.
+
+Cada entrada é um arquivo JSON em <root>/<2 primeiros caracteres da chave>/<chave>.json.
+A chave é um hash das entradas do resultado (ver src/utils/fingerprint.py): se
+uma delas mudar, a chave muda. O que não entra na chave (como as respostas da
+rede numa execução) pode deixar a entrada desatualizada; quem usa o cache
+decide a validade (o cache de execuções aplica um TTL).
+
+O mtime dos arquivos marca o último uso. O tamanho total é contado a cada
+gravação, sem percorrer o diretório; quando passa de max_bytes, as entradas
+usadas há mais tempo são removidas até sobrar uma folga (EVICT_TARGET), para
+que a varredura não se repita a cada gravação. Outros processos podem gravar
+no mesmo diretório, então a contagem é aproximada e corrigida a cada varredura.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Optional
+
+# Fração de max_bytes que sobra depois de uma remoção
+EVICT_TARGET = 0.9
+
+
+class DiskCache:
+    """Cache JSON em disco com limite de tamanho (LRU)."""
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+
+    def _entry_path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        """Retorna o valor da chave, ou None se não existir (ou estiver corrompido)."""
+        path = self._entry_path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # Marca a entrada como usada recentemente
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Grava o valor de forma atômica e remove entradas antigas se passar do limite."""
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False)
+            size = os.path.getsize(tmp_path)
+            with self._lock:
+                if self._total_bytes is None:
+                    self._total_bytes = self._scan_size()
+                self._total_bytes += size - self._file_size(path)
+                os.replace(tmp_path, path)
+                over_limit = self._total_bytes > self.max_bytes
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        if over_limit:
+            self._evict()
+
+    @staticmethod
+    def _file_size(path: Path) -> int:
+        try:
+            return path.stat().st_size
+        except OSError:
+            return 0
+
+    def _scan_size(self) -> int:
+        """Soma o tamanho das entradas em disco (só na primeira gravação)."""
+        return sum(self._file_size(path) for path in self.root.glob("*/*.json"))
+
+    def _evict(self) -> None:
+        """Remove as entradas menos usadas até o cache caber em EVICT_TARGET * max_bytes."""
+        with self._lock:
+            entries = []
+            total = 0
+            for path in self.root.glob("*/*.json"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            target = self.max_bytes * EVICT_TARGET
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    path.unlink()
+                    total -= size
+                except OSError:
+                    pass
+            self._total_bytes = total
+
+    def clear(self) -> None:
+        """Remove todas as entradas do cache."""
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self._total_bytes = 0
@@ -0,0 +1,123 @@
+"""
+Cálculo de fingerprints de conteúdo para reaproveitar correções anteriores.
+
+Uma submissão só precisa ser corrigida de novo quando muda algo que influencia
+a nota: os arquivos do aluno, os arquivos do enunciado (testes, README, código
+base) ou o prompt enviado à IA. O fingerprint combina o hash desses três
+conteúdos com o modelo configurado e uma versão do formato.
+"""
+import functools
+import hashlib
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+
+# Incrementar quando a lógica de correção mudar de forma que invalide relatórios antigos
+FINGERPRINT_VERSION = "1"
+
+# Diretórios e arquivos gerados durante a correção (não fazem parte da submissão)
+IGNORED_DIRS = {".git", "__pycache__", ".pytest_cache", ".streamlit", "venv", ".venv", "node_modules"}
+IGNORED_FILES = {".report.json", ".DS_Store"}
+
+
+def _iter_files(root: Path) -> Iterable[Path]:
+    """Lista os arquivos de um diretório em ordem determinística, ignorando artefatos."""
+    for path in sorted(root.rglob("*")):
+        relative_parts = path.relative_to(root).parts
+        if any(part in IGNORED_DIRS for part in relative_parts):
+            continue
+        if path.is_file() and path.name not in IGNORED_FILES and path.suffix != ".pyc":
+            yield path
+
+
+def hash_directory(root: Path) -> str:
+    """Calcula o hash SHA-256 do conteúdo de um diretório (caminhos relativos + bytes)."""
+    digest = hashlib.sha256()
+    if not root.exists():
+        return digest.hexdigest()
+
+    for path in _iter_files(root):
+        digest.update(path.relative_to(root).as_posix().encode("utf-8"))
+        digest.update(b"\0")
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                digest.update(chunk)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def compute_submission_fingerprint(submission_path: Path, enunciado_hash: str,
+                                   prompt_template: str, model: Optional[str] = None) -> str:
+    """
+    Combina o conteúdo da submissão com o contexto da correção.
+
+    Args:
+        submission_path: Diretório da submissão
+        enunciado_hash: Hash do diretório do enunciado (ver hash_directory)
+        prompt_template: Template do prompt usado para o assignment
+        model: Modelo de IA configurado
+    """
+    digest = hashlib.sha256()
+    for part in (FINGERPRINT_VERSION, hash_directory(submission_path), enunciado_hash,
+                 hashlib.sha256(prompt_template.encode("utf-8")).hexdigest(), model or ""):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def environment_fingerprint() -> str:
+    """Hash do interpretador e das versões dos pacotes instalados (calculado uma vez por processo)."""
+    from importlib.metadata import distributions
+    
+    packages = sorted(
+        f"{dist.metadata['Name']}=={dist.version}".lower()
+        for dist in distributions()
+        if dist.metadata['Name']
+    )
+    digest = hashlib.sha256()
+    for part in (sys.version, sys.executable, *packages):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def compute_test_results_key(submission_path: Path, test_files: List[str], pytest_args: List[str],
+                             tests_dir: Optional[Path] = None) -> str:
+    """
+    Chave do cache de resultados do pytest.
+    
+    Combina os arquivos da submissão (incluindo os arquivos de teste, que rodam
+    na pasta do aluno), os arquivos de teste do enunciado sobrepostos a ela
+    (tests_dir), a lista de testes e argumentos do pytest e o ambiente Python
+    (interpretador + pacotes instalados).
+    """
+    overlay_hashes = []
+    if tests_dir is not None:
+        for test_file in test_files:
+            path = Path(tests_dir) / test_file
+            overlay_hashes.append(hashlib.sha256(path.read_bytes()).hexdigest() if path.is_file() else "")
+    
+    digest = hashlib.sha256()
+    for part in (FINGERPRINT_VERSION, hash_directory(submission_path), *test_files, *overlay_hashes,
+                 *pytest_args, environment_fingerprint()):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def compute_execution_key(submission_path: Path, parameters: Dict[str, Any]) -> str:
+    """
+    Chave do cache de resultados das execuções (terminal e interativas).
+    
+    Combina os arquivos da submissão, os parâmetros da execução (arquivo,
+    argumentos, entradas, timeout, limites de recursos...) e o ambiente Python.
+    """
+    digest = hashlib.sha256()
+    for part in (FINGERPRINT_VERSION, hash_directory(submission_path),
+                 json.dumps(parameters, sort_keys=True, default=str), environment_fingerprint()):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
@@ -0,0 +1,117 @@
+"""
+Captura limitada da saída de processos.
+
+`communicate()` guarda tudo o que o programa escreve antes de a saída ser
+truncada: um aluno que imprime uma página raspada em loop faz o corretor
+acumular centenas de MB. Aqui stdout e stderr são lidos aos poucos e cada
+stream guarda só o início e o fim (buffer circular). O meio é descartado,
+apenas contado, e a memória usada não depende do que o programa imprime.
+
+Opcionalmente, quando o total escrito passa de um limite, o processo é
+encerrado logo (on_flood), sem esperar o timeout.
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+
+class BoundedOutput:
+    """Início e fim de um stream, com a contagem total de bytes."""
+
+    def __init__(self, head_bytes: int, tail_bytes: int):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.total_bytes = 0
+        self._head = bytearray()
+        self._tail = bytearray()
+
+    def feed(self, chunk: bytes):
+        """Acrescenta um trecho lido do stream."""
+        self.total_bytes += len(chunk)
+        room = self.head_bytes - len(self._head)
+        if room > 0:
+            self._head += chunk[:room]
+            chunk = chunk[room:]
+        if chunk and self.tail_bytes > 0:
+            self._tail += chunk[-self.tail_bytes:]
+            excess = len(self._tail) - self.tail_bytes
+            if excess > 0:
+                del self._tail[:excess]
+
+    @property
+    def omitted_bytes(self) -> int:
+        """Bytes descartados entre o início e o fim guardados."""
+        return self.total_bytes - len(self._head) - len(self._tail)
+
+    def text(self) -> str:
+        """Saída decodificada; se houve descarte, um marcador separa início e fim."""
+        head = self._head.decode("utf-8", errors="replace")
+        tail = self._tail.decode("utf-8", errors="replace")
+        if self.omitted_bytes:
+            return f"{head}\n... ({self.omitted_bytes} bytes omitidos) ...\n{tail}"
+        return head + tail
+
+
+class ProcessOutput:
+    """stdout e stderr de um processo, com limite opcional para o total escrito."""
+
+    def __init__(self, head_bytes: int, tail_bytes: int, flood_limit: Optional[int] = None,
+                 on_flood: Optional[Callable[[], None]] = None):
+        self.stdout = BoundedOutput(head_bytes, tail_bytes)
+        self.stderr = BoundedOutput(head_bytes, tail_bytes)
+        self.flood_limit = flood_limit
+        self.on_flood = on_flood
+        self.flooded = False
+        self.last_activity = time.monotonic()
+
+    @property
+    def total_bytes(self) -> int:
+        return self.stdout.total_bytes + self.stderr.total_bytes
+
+    def flood_notice(self) -> str:
+        """Mensagem para o stderr quando o processo foi encerrado pelo volume de saída."""
+        return f"Saída excedeu o limite de {self.flood_limit} bytes; execução interrompida"
+
+    def start_readers(self, process) -> List[threading.Thread]:
+        """Lê stdout e stderr de um subprocess.Popen em threads (junte-as ao final)."""
+        return [self._start_reader(process.stdout, self.stdout),
+                self._start_reader(process.stderr, self.stderr)]
+
+    async def read_async(self, process):
+        """Lê stdout e stderr de um processo asyncio até o fim dos dois streams."""
+        await asyncio.gather(self._read_stream_async(process.stdout, self.stdout),
+                             self._read_stream_async(process.stderr, self.stderr))
+
+    def _feed(self, output: BoundedOutput, chunk: bytes):
+        output.feed(chunk)
+        self.last_activity = time.monotonic()
+        if self.flood_limit is not None and not self.flooded and self.total_bytes > self.flood_limit:
+            self.flooded = True
+            if self.on_flood is not None:
+                try:
+                    self.on_flood()
+                except ProcessLookupError:
+                    pass  # o processo já terminou
+
+    def _start_reader(self, stream, output: BoundedOutput) -> threading.Thread:
+        def pump():
+            fd = stream.fileno()
+            while True:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    break
+                self._feed(output, chunk)
+            stream.close()
+
+        reader = threading.Thread(target=pump, daemon=True)
+        reader.start()
+        return reader
+
+    async def _read_stream_async(self, stream: asyncio.StreamReader, output: BoundedOutput):
+        while True:
+            chunk = await stream.read(65536)
+            if not chunk:
+                break
+            self._feed(output, chunk)
@@ -40,6 +40,12 @@ class ReportGenerator:
             summary_table.add_row("Nota Máxima", f"{report.summary['max_score']:.2f}")
             summary_table.add_row("Taxa de Aprovação", f"{report.summary['passing_rate']:.1%}")
             summary_table.add_row("Taxa de Excelência", f"{report.summary['excellent_rate']:.1%}")
+            if report.summary.get("pending_submissions"):
+                summary_table.add_row("Pendentes (sem tempo)", str(report.summary["pending_submissions"]))
+            if report.summary.get("cache_hits", {}).get("tests"):
+                summary_table.add_row("Testes do cache", str(report.summary["cache_hits"]["tests"]))
+            if report.summary.get("cache_hits", {}).get("execution"):
+                summary_table.add_row("Execuções do cache", str(report.summary["cache_hits"]["execution"]))
             
             self.console.print(summary_table)
         
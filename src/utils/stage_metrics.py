@@ -0,0 +1,211 @@
+"""
+Métricas de tempo e recursos por estágio da correção.
+
+Cada submissão guarda, para cada estágio (repository_load, tests, execution,
+thumbnail, prompt_build, ai_call, scoring), o tempo de parede, o tempo de CPU
+e o pico de memória (RSS) em MB.
+
+Os valores por submissão são aproximados; os agregados do relatório continuam
+úteis para planejamento:
+
+- CPU: o da thread que executou o estágio mais o dos subprocessos (pytest,
+  python, streamlit) encerrados durante o estágio (RUSAGE_CHILDREN). Com
+  vários workers, subprocessos de outras submissões que terminarem no mesmo
+  intervalo também entram na conta. Num estágio medido dentro do event loop
+  (--async), a thread do loop roda todas as corrotinas, então só o CPU dos
+  subprocessos é contado. Os workers do pool pytest são forks do forkserver,
+  não filhos do corretor: o próprio worker envia o seu uso (record_external_usage).
+- Pico de RSS: o maior RSS do processo do corretor amostrado a cada
+  RSS_SAMPLE_INTERVAL segundos durante o estágio (é o processo inteiro, não só
+  a submissão), ou o pico dos subprocessos e workers, se aumentou durante o estágio.
+"""
+import asyncio
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# Ordem dos estágios no relatório
+STAGES = ["repository_load", "tests", "execution", "thumbnail", "prompt_build", "ai_call", "scoring"]
+
+METRIC_KEYS = ["wall_time", "cpu_time", "peak_rss_mb"]
+
+# Intervalo (s) entre as amostras de RSS durante os estágios
+RSS_SAMPLE_INTERVAL = 0.1
+
+StageMetrics = Dict[str, Dict[str, float]]
+
+# Uso de processos que não são filhos do corretor, acumulado para o estágio em
+# medição (o contexto é copiado para as threads de asyncio.to_thread)
+_external_usage: ContextVar[Optional[Dict[str, float]]] = ContextVar("external_usage", default=None)
+
+
+def _children_usage() -> tuple:
+    """CPU total (s) e pico de RSS (MB) dos subprocessos já encerrados."""
+    if resource is None:
+        return 0.0, 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss é em KB no Linux
+    return usage.ru_utime + usage.ru_stime, usage.ru_maxrss / 1024
+
+
+def record_external_usage(cpu_time: float, peak_rss_mb: float) -> None:
+    """Soma ao estágio em medição o CPU (s) e o pico de RSS (MB) de um processo fora de RUSAGE_CHILDREN."""
+    usage = _external_usage.get()
+    if usage is not None:
+        usage["cpu_time"] += cpu_time
+        usage["peak_rss_mb"] = max(usage["peak_rss_mb"], peak_rss_mb)
+
+
+def _current_rss_mb() -> float:
+    """RSS atual do processo de correção em MB."""
+    if psutil is None:
+        return 0.0
+    try:
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except Exception:
+        return 0.0
+
+
+class _RssSampler:
+    """Amostra o RSS do processo em uma thread enquanto houver estágios sendo medidos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._peaks: Dict[int, float] = {}
+        self._next_token = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> int:
+        """Começa a acompanhar um estágio; devolve o token para stop()."""
+        rss = _current_rss_mb()
+        with self._lock:
+            token = self._next_token
+            self._next_token += 1
+            self._peaks[token] = rss
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+                self._thread.start()
+        return token
+
+    def stop(self, token: int) -> float:
+        """Encerra o acompanhamento e devolve o pico observado."""
+        rss = _current_rss_mb()
+        with self._lock:
+            return max(self._peaks.pop(token, 0.0), rss)
+
+    def _run(self):
+        while True:
+            time.sleep(RSS_SAMPLE_INTERVAL)
+            with self._lock:
+                if not self._peaks:
+                    self._thread = None
+                    return
+            rss = _current_rss_mb()
+            with self._lock:
+                for token, peak in self._peaks.items():
+                    self._peaks[token] = max(peak, rss)
+
+
+_rss_sampler = _RssSampler()
+
+
+def _in_event_loop() -> bool:
+    """Indica se o código roda dentro de um event loop asyncio (na thread do loop)."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+@contextmanager
+def measure_stage(metrics: Optional[StageMetrics], stage: str):
+    """
+    Mede um estágio e acumula o resultado em metrics[stage].
+
+    Com metrics=None não mede nada. Se o mesmo estágio for medido mais de uma
+    vez, tempos são somados e o pico de memória é o maior observado.
+    """
+    if metrics is None:
+        yield
+        return
+
+    # No event loop, o CPU da thread inclui o de todas as corrotinas: não é contado
+    thread_cpu = not _in_event_loop()
+    start_wall = time.perf_counter()
+    start_cpu = time.thread_time() if thread_cpu else 0.0
+    start_children_cpu, start_children_rss = _children_usage()
+    external = {"cpu_time": 0.0, "peak_rss_mb": 0.0}
+    external_token = _external_usage.set(external)
+    token = _rss_sampler.start()
+    try:
+        yield
+    finally:
+        process_peak = _rss_sampler.stop(token)
+        _external_usage.reset(external_token)
+        children_cpu, children_rss = _children_usage()
+        # Pico dos subprocessos só é atribuído ao estágio se aumentou durante ele
+        peak_rss = max(process_peak, children_rss if children_rss > start_children_rss else 0.0,
+                       external["peak_rss_mb"])
+        stage_cpu = ((time.thread_time() - start_cpu if thread_cpu else 0.0) + children_cpu - start_children_cpu
+                     + external["cpu_time"])
+        previous = metrics.get(stage, {})
+        metrics[stage] = {
+            "wall_time": round(previous.get("wall_time", 0.0) + time.perf_counter() - start_wall, 4),
+            "cpu_time": round(previous.get("cpu_time", 0.0) + stage_cpu, 4),
+            "peak_rss_mb": round(max(previous.get("peak_rss_mb", 0.0), peak_rss), 1),
+        }
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    """Percentil pelo método nearest-rank."""
+    rank = math.ceil(percentile / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+def summarize_stage_metrics(all_metrics: Iterable[StageMetrics]) -> Dict[str, Dict[str, Any]]:
+    """
+    Agrega as métricas das submissões em p50/p95/max por estágio.
+
+    Returns:
+        {estágio: {"count": n, "wall_time": {"p50", "p95", "max", "total"}, "cpu_time": {...}, "peak_rss_mb": {...}}}
+    """
+    values: Dict[str, Dict[str, List[float]]] = {}
+    for metrics in all_metrics:
+        for stage, stage_metrics in (metrics or {}).items():
+            stage_values = values.setdefault(stage, {key: [] for key in METRIC_KEYS})
+            for key in METRIC_KEYS:
+                if key in stage_metrics:
+                    stage_values[key].append(float(stage_metrics[key]))
+
+    ordered_stages = [s for s in STAGES if s in values] + sorted(s for s in values if s not in STAGES)
+    summary = {}
+    for stage in ordered_stages:
+        stage_summary: Dict[str, Any] = {"count": len(values[stage]["wall_time"])}
+        for key in METRIC_KEYS:
+            samples = sorted(values[stage][key])
+            if not samples:
+                continue
+            stage_summary[key] = {
+                "p50": round(_percentile(samples, 50), 4),
+                "p95": round(_percentile(samples, 95), 4),
+                "max": round(samples[-1], 4),
+            }
+            if key != "peak_rss_mb":
+                stage_summary[key]["total"] = round(sum(samples), 4)
+        summary[stage] = stage_summary
+    return summary
@@ -1,6 +1,7 @@
 """
 Testes para o serviço de exportação CSV.
 """
+import json
 import tempfile
 import csv
 from pathlib import Path
@@ -236,6 +237,26 @@ class TestCSVExportService:
         
         assert result is None
     
+    def test_load_report_falls_back_to_jsonl(self):
+        """Testa carregamento a partir do JSONL de uma correção em andamento."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            service = CSVExportService(Path(temp_dir))
+            jsonl_path = Path(temp_dir) / "prog1-prova-av_ebape-prog-aplic-barra-2025.jsonl"
+            jsonl_path.write_text(json.dumps({
+                "assignment_name": "prog1-prova-av",
+                "turma": "ebape-prog-aplic-barra-2025",
+                "submission_type": "individual",
+                "identifier": "joaosilva",
+                "display_name": "joaosilva (individual)",
+                "final_score": 7.5,
+                "feedback": "ok"
+            }) + "\n")
+            
+            result = service._load_report_from_json("prog1-prova-av", "ebape-prog-aplic-barra-2025")
+            
+            assert result.submissions[0].github_login == "joaosilva"
+            assert result.summary["average_score"] == 7.5
+    
     def test_write_csv_file_empty_data(self):
         """Testa escrita de CSV com dados vazios."""
         service = CSVExportService(Path("/tmp"))
@@ -8,7 +8,7 @@ from pathlib import Path
 from src.domain.models import (
     AssignmentType, SubmissionType, AssignmentTestResult, AssignmentTestExecution, CodeAnalysis, 
     HTMLAnalysis, IndividualSubmission, GroupSubmission, Assignment, Turma, 
-    CorrectionReport
+    CorrectionReport, ThumbnailResult
 )
 
 
@@ -353,6 +353,82 @@ class TestCorrectionReport:
             # Limpa o arquivo temporário
             temp_file.unlink(missing_ok=True)
     
+    def test_correction_report_save_and_load_fingerprint_and_thumbnail(self):
+        """Testa se fingerprint, origem do cache, thumbnail e tempos de teste sobrevivem ao ciclo salvar/carregar."""
+        submission = GroupSubmission(
+            group_name="grupo-alfa",
+            assignment_name="prog1-prova-av",
+            turma="ebape-prog-aplic-barra-2025",
+            submission_path=Path("/tmp/submission"),
+            fingerprint="abc123",
+            cache_provenance={"tests": {"cache_key": "0123456789abcdef", "cached_at": "2024-01-01T09:00:00"}},
+            test_results=[AssignmentTestExecution(
+                test_name="test_function",
+                result=AssignmentTestResult.PASSED,
+                execution_time=0.5
+            )],
+            streamlit_thumbnail=ThumbnailResult(
+                submission_identifier="grupo-alfa",
+                display_name="grupo-alfa (grupo)",
+                thumbnail_path=Path("/tmp/thumb.png"),
+                capture_timestamp="2024-01-01T10:00:00",
+                streamlit_status="success",
+                streamlit_exceptions=["ValueError"]
+            )
+        )
+        report = CorrectionReport(
+            assignment_name="prog1-prova-av",
+            turma="ebape-prog-aplic-barra-2025",
+            submissions=[submission]
+        )
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_file = Path(temp_dir) / "report.json"
+            report.save_to_file(temp_file)
+            loaded = CorrectionReport.load_from_file(temp_file).submissions[0]
+        
+        assert isinstance(loaded, GroupSubmission)
+        assert loaded.fingerprint == "abc123"
+        assert loaded.cache_provenance["tests"]["cache_key"] == "0123456789abcdef"
+        assert loaded.test_results[0].execution_time == 0.5
+        assert loaded.streamlit_thumbnail.thumbnail_path == Path("/tmp/thumb.png")
+        assert loaded.streamlit_thumbnail.streamlit_exceptions == ["ValueError"]
+    
+    def test_correction_report_load_from_jsonl(self):
+        """Testa reconstrução do relatório a partir do JSONL gravado durante a correção."""
+        from src.domain.models import submission_to_dict
+        
+        def entry(login, score):
+            submission = IndividualSubmission(
+                github_login=login,
+                assignment_name="prog1-prova-av",
+                turma="ebape-prog-aplic-barra-2025",
+                submission_path=Path("/tmp/submission"),
+                final_score=score,
+                stage_metrics={"tests": {"wall_time": 1.0, "cpu_time": 0.5, "peak_rss_mb": 50.0}}
+            )
+            return json.dumps({"assignment_name": "prog1-prova-av", "turma": "ebape-prog-aplic-barra-2025",
+                               "finished_at": "2024-01-01T10:00:00", **submission_to_dict(submission)})
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            jsonl_path = Path(temp_dir) / "prog1-prova-av_ebape-prog-aplic-barra-2025.jsonl"
+            jsonl_path.write_text("\n".join([
+                entry("joaosilva", 6.0),
+                entry("mariasantos", 9.0),
+                entry("joaosilva", 8.0),  # recorreção: vale a última linha
+                '{"submission_type": "indiv'  # escrita interrompida
+            ]))
+            
+            report = CorrectionReport.load_from_jsonl(jsonl_path)
+        
+        assert report.assignment_name == "prog1-prova-av"
+        assert report.turma == "ebape-prog-aplic-barra-2025"
+        assert [s.github_login for s in report.submissions] == ["joaosilva", "mariasantos"]
+        assert [s.final_score for s in report.submissions] == [8.0, 9.0]
+        assert report.summary["total_submissions"] == 2
+        assert report.summary["average_score"] == 8.5
+        assert report.summary["stage_metrics"]["tests"]["count"] == 2
+    
     def test_correction_report_with_code_analysis(self):
         """Testa relatório com análise de código."""
         code_analysis = CodeAnalysis(
@@ -10,6 +10,8 @@ from src.services.test_executor import PytestExecutor
 from src.services.ai_analyzer import AIAnalyzer
 from src.services.correction_service import CorrectionService
 from src.services.python_execution_visual_service import PythonExecutionVisualService
+from src.services.grading_pipeline import GradingPipeline, PipelineStage
+from src.utils.stage_metrics import measure_stage, summarize_stage_metrics
 from src.repositories.assignment_repository import AssignmentRepository
 from src.repositories.submission_repository import SubmissionRepository
 from src.domain.models import (
@@ -200,7 +202,7 @@ class TestPytestExecutor:
     """Testes para PytestExecutor."""
     
     def test_execute_tests_with_pytest_json(self):
-        """Testa execução de testes com pytest-json-report."""
+        """Testa execução de testes com o plugin de resultados do pytest."""
         with tempfile.TemporaryDirectory() as temp_dir:
             # Cria arquivo de teste simples
             test_file = Path(temp_dir) / "test_example.py"
@@ -262,13 +264,779 @@ def test_invalid():
             # Deve capturar o erro de sintaxe
             assert len(results) >= 1
             assert results[0].result.value == "error"
+    
+    def test_worker_pool_isolates_module_state(self):
+        """Testa se submissões com módulos de mesmo nome não compartilham estado no pool de workers."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for login in ("ana", "bruno"):
+                submission_dir = Path(temp_dir) / login
+                submission_dir.mkdir()
+                (submission_dir / "main.py").write_text(f"AUTOR = '{login}'\n")
+                (submission_dir / "test_main.py").write_text(
+                    f"import main\n\ndef test_autor():\n    assert main.AUTOR == '{login}'\n"
+                )
+            
+            test_executor = PytestExecutor(use_cache=False)
+            for login in ("ana", "bruno", "ana"):
+                results = test_executor.run_tests(Path(temp_dir) / login, ["test_main.py"])
+                assert [r.result.value for r in results] == ["passed"]
+    
+    @pytest.mark.parametrize("use_worker_pool", [False, True])
+    def test_tests_stage_counts_pytest_cpu(self, use_worker_pool):
+        """Testa se o CPU do pytest entra no estágio de testes, também nos workers do pool (fora de RUSAGE_CHILDREN)."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            (Path(temp_dir) / "test_cpu.py").write_text(
+                "import time\n\n"
+                "def test_ocupa_cpu():\n"
+                "    fim = time.process_time() + 0.5\n"
+                "    while time.process_time() < fim:\n"
+                "        pass\n"
+            )
+            
+            test_executor = PytestExecutor(use_worker_pool=use_worker_pool, use_cache=False)
+            metrics = {}
+            with measure_stage(metrics, "tests"):
+                results = test_executor.run_tests(Path(temp_dir), ["test_cpu.py"])
+            
+            assert [r.result.value for r in results] == ["passed"]
+            assert metrics["tests"]["cpu_time"] >= 0.4
+            assert metrics["tests"]["peak_rss_mb"] > 0
+    
+    @pytest.mark.parametrize("use_worker_pool", [False, True])
+    def test_timeout_keeps_completed_results(self, use_worker_pool):
+        """Testa se, no timeout, os testes já concluídos são mantidos e nada é gravado na pasta do aluno."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            (Path(temp_dir) / "test_parcial.py").write_text(
+                "import time\n\n"
+                "def test_rapido():\n    assert True\n\n"
+                "def test_falha():\n    assert 1 == 2\n\n"
+                "def test_lento():\n    time.sleep(30)\n"
+            )
+            
+            test_executor = PytestExecutor(use_worker_pool=use_worker_pool, use_cache=False)
+            with patch("src.services.test_executor.PYTEST_TIMEOUT", 3):
+                results = test_executor.run_tests(Path(temp_dir), ["test_parcial.py"])
+            
+            assert [(r.test_name, r.result.value) for r in results[:2]] == [
+                ("test_parcial.py::test_rapido", "passed"),
+                ("test_parcial.py::test_falha", "failed"),
+            ]
+            assert "assert 1 == 2" in results[1].message
+            assert results[-1].test_name == "pytest"
+            assert "tempo limite" in results[-1].message
+            assert sorted(p.name for p in Path(temp_dir).iterdir()) == ["test_parcial.py"]
+    
+    @pytest.mark.parametrize("use_worker_pool", [False, True])
+    def test_per_test_timeout_marks_only_hanging_test(self, use_worker_pool):
+        """Testa se um loop infinito estoura só o próprio teste e os demais continuam rodando."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            (Path(temp_dir) / "test_loop.py").write_text(
+                "def test_antes():\n    assert True\n\n"
+                "def test_loop():\n"
+                "    while True:\n"
+                "        try:\n            pass\n"
+                "        except Exception:\n            pass\n\n"
+                "def test_depois():\n    assert 1 == 2\n"
+            )
+
+            test_executor = PytestExecutor(use_worker_pool=use_worker_pool, use_cache=False)
+            results = test_executor.run_tests(Path(temp_dir), ["test_loop.py"], test_timeout=0.5)
+
+            assert [(r.test_name, r.result.value) for r in results] == [
+                ("test_loop.py::test_antes", "passed"),
+                ("test_loop.py::test_loop", "error"),
+                ("test_loop.py::test_depois", "failed"),
+            ]
+            assert "0.5s" in results[1].message
+
+    @pytest.mark.skipif(not hasattr(__import__("os"), "setsid"), reason="rlimits só em POSIX")
+    @pytest.mark.parametrize("use_worker_pool", [False, True])
+    def test_resource_limits_apply_to_tests(self, use_worker_pool):
+        """Testa se os limites de recursos do assignment valem dentro dos testes."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            (Path(temp_dir) / "test_arquivos.py").write_text(
+                "def test_abre_muitos_arquivos():\n"
+                "    arquivos = [open(__file__) for _ in range(200)]\n"
+            )
+
+            test_executor = PytestExecutor(use_worker_pool=use_worker_pool, use_cache=False)
+            results = test_executor.run_tests(Path(temp_dir), ["test_arquivos.py"],
+                                              resource_limits={"open_files": 64, "memory_mb": None})
+
+            assert [(r.test_name, r.result.value) for r in results] == [
+                ("test_arquivos.py::test_abre_muitos_arquivos", "failed"),
+            ]
+            assert "Too many open files" in results[0].message
+
+    @pytest.mark.parametrize("use_worker_pool", [False, True])
+    def test_fail_fast_stops_at_collection_error(self, use_worker_pool):
+        """Testa se, com fail_fast, um ImportError do aluno encerra o pytest sem coletar os outros arquivos."""
+        import time
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            (Path(temp_dir) / "test_a.py").write_text("import modulo_do_aluno\n\ndef test_a():\n    pass\n")
+            (Path(temp_dir) / "test_b.py").write_text("import time\ntime.sleep(5)\n\ndef test_b():\n    pass\n")
+
+            test_executor = PytestExecutor(use_worker_pool=use_worker_pool, use_cache=False)
+            start = time.monotonic()
+            results = test_executor.run_tests(Path(temp_dir), ["test_a.py", "test_b.py"], fail_fast=True)
+
+            assert time.monotonic() - start < 4
+            assert [(r.test_name, r.result.value) for r in results] == [("test_a.py", "error")]
+            assert "modulo_do_aluno" in results[0].message
+
+    def test_batch_maps_results_to_each_submission(self):
+        """Testa se o lote devolve os resultados de cada aluno sem vazar módulos entre submissões."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            jobs = []
+            for login in ("ana", "bruno", "carla"):
+                submission_dir = Path(temp_dir) / login
+                submission_dir.mkdir()
+                (submission_dir / "main.py").write_text(f"AUTOR = '{login}'\n")
+                expected = "bruno" if login == "bruno" else "ana"
+                (submission_dir / "test_main.py").write_text(
+                    f"import main\n\ndef test_autor():\n    assert main.AUTOR == '{expected}'\n"
+                )
+                jobs.append((submission_dir, ["test_main.py"]))
+            
+            test_executor = PytestExecutor(use_cache=False)
+            with patch.object(test_executor, '_run_tests_uncached') as run_separately:
+                results = test_executor.run_tests_batch(jobs)
+                run_separately.assert_not_called()
+            
+            assert [[r.result.value for r in result] for result in results] == [["passed"], ["passed"], ["failed"]]
+            assert "carla" in results[2][0].message
+    
+    def test_batch_timeout_runs_remaining_submissions_separately(self):
+        """Testa se uma submissão travada no lote não impede a correção das seguintes."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            jobs = []
+            for login, body in (("ana", "assert True"), ("bruno", "time.sleep(30)"), ("carla", "assert True")):
+                submission_dir = Path(temp_dir) / login
+                submission_dir.mkdir()
+                (submission_dir / "test_main.py").write_text(f"import time\n\ndef test_main():\n    {body}\n")
+                jobs.append((submission_dir, ["test_main.py"]))
+            
+            test_executor = PytestExecutor(use_cache=False)
+            with patch("src.services.test_executor.PYTEST_TIMEOUT", 2):
+                results = test_executor.run_tests_batch(jobs)
+            
+            assert [r.result.value for r in results[0]] == ["passed"]
+            assert "tempo limite" in results[1][-1].message
+            assert [r.result.value for r in results[2]] == ["passed"]
+    
+    def test_results_cache(self):
+        """Testa se resultados de uma submissão inalterada vêm do cache, com a origem registrada."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            submission_dir = Path(temp_dir) / "ana"
+            submission_dir.mkdir()
+            (submission_dir / "test_main.py").write_text("def test_ok():\n    assert True\n")
+            
+            with patch("config.CACHE_DIR", Path(temp_dir) / "cache"):
+                test_executor = PytestExecutor()
+                first_provenance, second_provenance = {}, {}
+                first = test_executor.run_tests(submission_dir, ["test_main.py"], provenance=first_provenance)
+                with patch.object(test_executor, '_run_tests_uncached') as run_pytest:
+                    second = test_executor.run_tests(submission_dir, ["test_main.py"], provenance=second_provenance)
+                    run_pytest.assert_not_called()
+                
+                assert first_provenance == {}
+                assert "cached_at" in second_provenance["tests"]
+                assert [(r.test_name, r.result) for r in second] == [(r.test_name, r.result) for r in first]
+                
+                # Qualquer mudança nos arquivos invalida a entrada
+                (submission_dir / "test_main.py").write_text("def test_ok():\n    assert False\n")
+                third = test_executor.run_tests(submission_dir, ["test_main.py"])
+                assert [r.result.value for r in third] == ["failed"]
+                
+                # Sem cache, o pytest roda sempre
+                uncached = PytestExecutor(use_cache=False)
+                with patch.object(uncached, '_run_tests_uncached', return_value=[]) as run_pytest:
+                    uncached.run_tests(submission_dir, ["test_main.py"])
+                    run_pytest.assert_called_once()
+    
+    def test_disk_cache_evicts_least_recently_used(self):
+        """Testa se o cache em disco remove as entradas usadas há mais tempo ao passar do limite."""
+        import os
+        from src.utils.disk_cache import DiskCache
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # Cada entrada tem 92 bytes: cabem duas, também abaixo da folga (225)
+            cache = DiskCache(Path(temp_dir), max_bytes=250)
+            for mtime, key in enumerate(["aa1", "bb2"], start=1):
+                cache.set(key, "x" * 90)
+                os.utime(cache._entry_path(key), (mtime, mtime))
+            
+            assert cache.get("aa1") is not None  # passa a ser a mais recente
+            cache.set("cc3", "x" * 90)
+            
+            assert cache.get("bb2") is None
+            assert cache.get("aa1") is not None
+            assert cache.get("cc3") is not None
+            cache.clear()
+            assert cache.get("aa1") is None
+    
+    def test_disk_cache_counts_size_without_scanning(self):
+        """Testa se gravar abaixo do limite não percorre o diretório do cache."""
+        from src.utils.disk_cache import DiskCache
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            DiskCache(Path(temp_dir), max_bytes=1000).set("aa1", "x" * 90)
+            cache = DiskCache(Path(temp_dir), max_bytes=1000)
+            cache.set("bb2", "x" * 90)  # primeira gravação: conta o que já existe
+            assert cache._total_bytes == 184
+            
+            with patch.object(Path, "glob", side_effect=AssertionError("varreu o cache")):
+                cache.set("bb2", "x" * 10)
+                cache.set("cc3", "x" * 90)
+            assert cache._total_bytes == 92 + 12 + 92
+    
+    def test_worker_pool_timeout(self):
+        """Testa se um teste travado é interrompido pelo timeout sem derrubar o pool."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            (Path(temp_dir) / "test_lento.py").write_text("import time\n\ndef test_lento():\n    time.sleep(30)\n")
+            (Path(temp_dir) / "test_rapido.py").write_text("def test_rapido():\n    assert True\n")
+            
+            test_executor = PytestExecutor(use_cache=False)
+            with patch("src.services.test_executor.PYTEST_TIMEOUT", 1):
+                results = test_executor.run_tests(Path(temp_dir), ["test_lento.py"])
+            assert results[0].result.value == "error"
+            assert "pytest" in results[0].message
+            
+            results = test_executor.run_tests(Path(temp_dir), ["test_rapido.py"])
+            assert [r.result.value for r in results] == ["passed"]
+
+    def test_runs_official_tests_in_workspace(self):
+        """Testa se os testes do enunciado substituem os do aluno e a pasta do aluno não é alterada."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            submission_dir = Path(temp_dir) / "ana"
+            enunciado_dir = Path(temp_dir) / "enunciado"
+            submission_dir.mkdir()
+            enunciado_dir.mkdir()
+            (submission_dir / "main.py").write_text("def soma(a, b):\n    return a - b\n")
+            (submission_dir / "test_main.py").write_text("def test_soma():\n    assert True\n")
+            (enunciado_dir / "test_main.py").write_text("import main\n\ndef test_soma():\n    assert main.soma(1, 2) == 3\n")
+
+            test_executor = PytestExecutor(use_cache=False)
+            results = test_executor.run_tests(submission_dir, ["test_main.py"], tests_dir=enunciado_dir)
+
+            assert [r.result.value for r in results] == ["failed"]
+            assert sorted(p.name for p in submission_dir.iterdir()) == ["main.py", "test_main.py"]
+
+
+class TestWorkspaceManager:
+    """Testes para WorkspaceManager."""
+
+    def test_workspace_copies_submission_and_cleans_up(self):
+        """Testa se o workspace copia a submissão sem artefatos, sobrepõe os testes e é removido ao final."""
+        from src.services.workspace_manager import WorkspaceManager
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            submission_dir = Path(temp_dir) / "prog1-tarefa-ana"
+            (submission_dir / "__pycache__").mkdir(parents=True)
+            (submission_dir / ".git").mkdir()
+            (submission_dir / "dados").mkdir()
+            (submission_dir / "main.py").write_text("print('oi')\n")
+            (submission_dir / "dados" / "precos.csv").write_text("a,b\n")
+            (submission_dir / "test_main.py").write_text("# versão do aluno\n")
+            (submission_dir / "__pycache__" / "main.cpython-311.pyc").write_bytes(b"\0")
+            enunciado_dir = Path(temp_dir) / "enunciado"
+            enunciado_dir.mkdir()
+            (enunciado_dir / "test_main.py").write_text("# versão oficial\n")
+
+            manager = WorkspaceManager(Path(temp_dir) / "scratch")
+            (Path(temp_dir) / "scratch").mkdir()
+            with manager.workspace(submission_dir, enunciado_dir, ["test_main.py"]) as workdir:
+                assert workdir.name == "prog1-tarefa-ana"
+                assert sorted(p.relative_to(workdir).as_posix() for p in workdir.rglob("*")) == [
+                    "dados", "dados/precos.csv", "main.py", "test_main.py"
+                ]
+                assert (workdir / "test_main.py").read_text() == "# versão oficial\n"
+                (workdir / "main.py").write_text("alterado\n")
+
+            assert not workdir.exists()
+            assert list((Path(temp_dir) / "scratch").iterdir()) == []
+            assert (submission_dir / "main.py").read_text() == "print('oi')\n"
+            assert (submission_dir / "test_main.py").read_text() == "# versão do aluno\n"
+
+            # Desativado, o workspace é a própria submissão
+            with WorkspaceManager(enabled=False).workspace(submission_dir) as workdir:
+                assert workdir == submission_dir
+            assert submission_dir.exists()
+
+
+class TestEnvironmentResolver:
+    """Testes para EnvironmentResolver."""
+
+    def test_resolves_venv_once_and_caches_by_lock_hash(self):
+        """Testa se o virtualenv é resolvido uma vez, reaproveitado pelo Pipfile.lock e com fallback para pipenv run."""
+        import subprocess
+        from src.services.environment_resolver import EnvironmentResolver
+        from src.utils.disk_cache import DiskCache
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            project_dir = Path(temp_dir) / "projeto"
+            venv = Path(temp_dir) / "venv"
+            (venv / "bin").mkdir(parents=True)
+            (venv / "bin" / "python").write_text("")
+            project_dir.mkdir()
+            (project_dir / "Pipfile.lock").write_text('{"default": {}}')
+            cache = DiskCache(Path(temp_dir) / "cache", 1024 * 1024)
+
+            found = subprocess.CompletedProcess(["pipenv", "--venv"], 0, stdout=f"{venv}\n", stderr="")
+            with patch("src.services.environment_resolver.subprocess.run", return_value=found) as run:
+                resolver = EnvironmentResolver(project_dir, cache)
+                assert resolver.command("python", "main.py") == [str(venv / "bin" / "python"), "main.py"]
+                assert resolver.env()["VIRTUAL_ENV"] == str(venv)
+                # streamlit não está no venv: volta para pipenv run
+                assert resolver.command("streamlit", "run", "app.py") == ["pipenv", "run", "streamlit", "run", "app.py"]
+                assert run.call_count == 1
+
+            # Nova execução com o mesmo Pipfile.lock: nem chama o pipenv
+            with patch("src.services.environment_resolver.subprocess.run") as run:
+                assert EnvironmentResolver(project_dir, cache).venv_path() == venv
+                run.assert_not_called()
+
+            # Lock alterado e pipenv ausente: fallback
+            (project_dir / "Pipfile.lock").write_text('{"default": {"pandas": {}}}')
+            with patch("src.services.environment_resolver.subprocess.run", side_effect=FileNotFoundError("pipenv")):
+                resolver = EnvironmentResolver(project_dir, cache)
+                assert resolver.command("python", "main.py") == ["pipenv", "run", "python", "main.py"]
+
+
+class TestDependencyProvisioner:
+    """Testes para DependencyProvisioner."""
+
+    def test_installs_only_missing_in_single_pip_call(self):
+        """Testa se só as dependências ausentes são instaladas, em uma chamada ao pip, e usando o wheelhouse."""
+        import subprocess
+        from src.services.dependency_provisioner import DependencyProvisioner
+
+        installed = ["pandas", "Requests", "python_dotenv"]
+        calls = []
+
+        def fake_run(cmd, **kwargs):
+            calls.append(cmd)
+            if "-c" in cmd:
+                return subprocess.CompletedProcess(cmd, 0, stdout=json.dumps({"distributions": installed}), stderr="")
+            installed.extend(arg for arg in cmd[cmd.index("install") + 1:] if not arg.startswith("-") and "/" not in arg)
+            return subprocess.CompletedProcess(cmd, 0, stdout="", stderr="")
+
+        resolver = Mock()
+        resolver.venv_path.return_value = None
+        resolver.command.side_effect = lambda *args: ["python", *args[1:]]
+        resolver.env.return_value = {}
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            provisioner = DependencyProvisioner(resolver, wheelhouse=Path(temp_dir), offline=True)
+            with patch("src.services.dependency_provisioner.subprocess.run", side_effect=fake_run):
+                missing = provisioner.ensure(["pandas", "requests", "python-dotenv", "beautifulsoup4", "lxml>=4"])
+                assert missing == ["beautifulsoup4", "lxml>=4"]
+                pip_calls = [cmd for cmd in calls if "install" in cmd]
+                assert pip_calls == [["python", "-m", "pip", "install", "--find-links", temp_dir, "--no-index",
+                                      "beautifulsoup4", "lxml>=4"]]
+
+                # Tudo presente: nenhuma chamada ao pip
+                calls.clear()
+                assert provisioner.ensure(["pandas", "beautifulsoup4"]) == []
+                assert provisioner.ensure(["requests"]) == []
+                assert not [cmd for cmd in calls if "install" in cmd]
+
+
+class TestSubmissionEnvironments:
+    """Testes para os ambientes por conjunto de dependências das submissões."""
+
+    def test_detect_requirements(self):
+        """Testa se imports de terceiros e o requirements.txt viram dependências, sem stdlib nem módulos locais."""
+        from src.services.submission_environments import detect_requirements
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            submission_dir = Path(temp_dir)
+            (submission_dir / "utils").mkdir()
+            (submission_dir / "main.py").write_text(
+                "import os, json\nimport pandas as pd\nfrom bs4 import BeautifulSoup\n"
+                "from utils import ajuda\nimport scraper\nfrom . import local\n"
+            )
+            (submission_dir / "scraper.py").write_text("import yfinance.ticker\n")
+            (submission_dir / "quebrado.py").write_text("def (:\n")
+            (submission_dir / "requirements.txt").write_text("# dependências\nplotly>=5\n-r outro.txt\n")
+
+            assert detect_requirements(submission_dir) == {"pandas", "bs4", "yfinance", "plotly>=5"}
+
+    def test_environments_are_shared_by_dependency_set_and_evicted_lru(self):
+        """Testa se submissões com as mesmas dependências extras compartilham o ambiente e os antigos são removidos."""
+        import os
+        from src.services.submission_environments import (
+            READY_MARKER, SubmissionEnvironment, SubmissionEnvironmentPool
+        )
+
+        base = Mock()
+        base.venv_path.return_value = Path("/venv-base")
+        provisioner = Mock()
+        provisioner.installed_distributions.return_value = {"pandas", "beautifulsoup4", "requests"}
+        provisioner.installed_modules.return_value = {"pandas", "bs4", "requests"}
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir) / "venvs"
+            (root / "antigo").mkdir(parents=True)
+            (root / "antigo" / READY_MARKER).touch()
+            os.utime(root / "antigo" / READY_MARKER, (1, 1))
+
+            submissions = {}
+            for login, code in (("ana", "import pandas, yfinance"), ("bruno", "import yfinance\nimport bs4"),
+                                ("carla", "import requests"), ("davi", "import plotly")):
+                submissions[login] = Path(temp_dir) / login
+                submissions[login].mkdir()
+                (submissions[login] / "main.py").write_text(code + "\n")
+
+            def fake_create(path, extras):
+                path.mkdir(parents=True)
+                (path / READY_MARKER).touch()
+                return True
+
+            pool = SubmissionEnvironmentPool(root, base, provisioner, max_environments=2,
+                                             allowed_packages=["yfinance", "plotly"])
+            with patch.object(pool, "_create_environment", side_effect=fake_create) as create:
+                ana, bruno = pool.environment_for(submissions["ana"]), pool.environment_for(submissions["bruno"])
+                carla = pool.environment_for(submissions["carla"])
+                davi = pool.environment_for(submissions["davi"])
+
+            assert carla is base
+            assert isinstance(ana, SubmissionEnvironment) and ana.path == bruno.path != davi.path
+            assert [call.args[1] for call in create.call_args_list] == [["yfinance"], ["plotly"]]
+            assert ana.command("streamlit", "run", "app.py")[1:] == ["-m", "streamlit", "run", "app.py"]
+            # O ambiente antigo (não usado nesta execução) foi removido
+            assert sorted(p.name for p in root.iterdir()) == sorted([ana.path.name, davi.path.name])
+
+    def test_only_allowed_packages_are_installed(self):
+        """Testa se imports e requisitos fora de SUBMISSION_ALLOWED_PACKAGES (ou com URL) não são instalados."""
+        from src.services.submission_environments import SubmissionEnvironmentPool
+
+        base = Mock()
+        base.venv_path.return_value = Path("/venv-base")
+        provisioner = Mock()
+        provisioner.installed_distributions.return_value = {"pandas"}
+        provisioner.installed_modules.return_value = {"pandas"}
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            submission_dir = Path(temp_dir) / "ana"
+            submission_dir.mkdir()
+            (submission_dir / "main.py").write_text("import pandas\nimport meus_helpers\nimport yfinance\n")
+            (submission_dir / "requirements.txt").write_text("Plotly>=5\ngit+https://example.com/pacote.git\n")
+
+            pool = SubmissionEnvironmentPool(Path(temp_dir) / "venvs", base, provisioner,
+                                             allowed_packages=["yfinance", "plotly"])
+            with patch.object(pool, "_create_environment", return_value=False) as create:
+                assert pool.environment_for(submission_dir) is base
+
+            assert create.call_args.args[1] == ["Plotly>=5", "yfinance"]
+
+            # Sem nada permitido, nada é instalado
+            strict = SubmissionEnvironmentPool(Path(temp_dir) / "venvs", base, provisioner)
+            with patch.object(strict, "_create_environment") as create:
+                assert strict.environment_for(submission_dir) is base
+            create.assert_not_called()
+
+
+class TestInteractiveDriver:
+    """Testes para o envio de entradas a programas interativos."""
+
+    @pytest.mark.skipif(not Path("/proc/self/wchan").exists(), reason="requer /proc")
+    def test_inputs_are_sent_when_program_asks(self):
+        """Testa se cada input é enviado só quando o programa o pede, sem esperas fixas."""
+        import subprocess
+        import sys
+        import time
+        from src.services.interactive_driver import InteractiveDriver
+
+        # Antes de cada input() o programa verifica se já havia entrada esperando no stdin
+        code = (
+            "import select, sys, time\n"
+            "def pergunta(texto):\n"
+            "    if select.select([sys.stdin], [], [], 0)[0]:\n"
+            "        print('adiantado')\n"
+            "    return input(texto)\n"
+            "inicio = pergunta('Data inicial: ')\n"
+            "time.sleep(0.3)\n"
+            "fim = pergunta('Data final: ')\n"
+            "print(inicio, fim)\n"
+        )
+        process = subprocess.Popen([sys.executable, "-c", code], stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        start = time.monotonic()
+        stdout, stderr = InteractiveDriver(process).run(["2024-01-01", "2024-01-31"], timeout=10)
+
+        assert process.returncode == 0, stderr
+        assert stdout == "Data inicial: Data final: 2024-01-01 2024-01-31\n"
+        # Só o sleep do próprio programa, sem os 0.5s antes de cada input
+        assert time.monotonic() - start < 0.9
+
+class TestProcessSupervisor:
+    """Testes para o supervisor de processos."""
+
+    @pytest.mark.skipif(not Path("/proc/self/stat").exists(), reason="requer /proc")
+    def test_timeout_kills_whole_process_group(self):
+        """Testa se o timeout encerra também os subprocessos criados pelo programa."""
+        import subprocess
+        import sys
+        import time
+        from src.services.process_supervisor import ProcessSupervisor
+
+        def running(pid):
+            try:
+                state = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()[0]
+            except OSError:
+                return False
+            return state != "Z"
+
+        # O programa cria um neto que sobreviveria a um kill só do processo principal
+        code = (
+            "import subprocess, sys, time\n"
+            "neto = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+            "print(neto.pid, flush=True)\n"
+            "time.sleep(60)\n"
+        )
+        supervisor = ProcessSupervisor()
+        process = supervisor.popen([sys.executable, "-c", code], stdout=subprocess.PIPE, text=True)
+        grandchild = int(process.stdout.readline())
+        process.stdout.close()
+
+        supervisor.terminate(process, grace=0)
+        deadline = time.monotonic() + 5
+        while running(grandchild) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not running(grandchild)
+
+        with pytest.raises(subprocess.TimeoutExpired):
+            supervisor.run([sys.executable, "-c", "import time; time.sleep(60)"], timeout=0.5)
+        assert supervisor._groups == set()
+
+class TestResourceLimits:
+    """Testes para os limites de recursos das execuções."""
+
+    @pytest.mark.skipif(not hasattr(__import__("os"), "setsid"), reason="rlimits só em POSIX")
+    def test_memory_violation_has_distinct_status(self):
+        """Testa se estourar o limite de memória gera o status resource_limit_exceeded."""
+        import sys
+        from src.services.python_execution_service import PythonExecutionService
+
+        environment = Mock()
+        environment.command.side_effect = lambda executable, *args: [sys.executable, *args]
+        environment.env.return_value = None
+        submission = Mock(display_name="ana (individual)")
+        limits = {"cpu_seconds": 10, "memory_mb": 512, "open_files": None, "processes": None, "file_size_mb": None}
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            main_file = Path(temp_dir) / "main.py"
+            main_file.write_text("print('carregando')\ndados = bytearray(1024 * 1024 * 1024)\n")
+
+            with patch("src.services.python_execution_service.environment_for_submission",
+                       return_value=environment):
+                result = PythonExecutionService()._execute_main_file(submission, "ana", main_file, limits)
+
+        assert result.execution_status == "resource_limit_exceeded"
+        assert result.error_message == "Limite de memória (512 MB) excedido"
+        assert result.stdout_output == "carregando\n"
+        assert "MemoryError" in result.stderr_output
+
+class TestOutputCapture:
+    """Testes para a captura limitada da saída dos programas."""
+
+    def test_keeps_head_and_tail_and_counts_bytes(self):
+        """Testa se só o início e o fim ficam guardados, com o total de bytes escrito."""
+        from src.utils.output_capture import BoundedOutput
+
+        output = BoundedOutput(head_bytes=5, tail_bytes=4)
+        for chunk in (b"abc", b"defgh", b"ijklmnop", b"qr"):
+            output.feed(chunk)
+
+        assert output.total_bytes == 18
+        assert output.omitted_bytes == 9
+        assert output.text() == "abcde\n... (9 bytes omitidos) ...\nopqr"
+
+    def test_flooding_program_is_killed(self):
+        """Testa se um programa que imprime sem parar é encerrado ao passar do limite de saída."""
+        import sys
+        from src.services.python_execution_service import PythonExecutionService
+
+        environment = Mock()
+        environment.command.side_effect = lambda executable, *args: [sys.executable, *args]
+        environment.env.return_value = None
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            main_file = Path(temp_dir) / "main.py"
+            main_file.write_text("while True:\n    print('x' * 1000)\n")
+
+            with patch("src.services.python_execution_service.environment_for_submission",
+                       return_value=environment), \
+                 patch("src.services.python_execution_service.OUTPUT_FLOOD_LIMIT", 1024 * 1024), \
+                 patch("src.services.python_execution_service.OUTPUT_CAPTURE_HEAD_BYTES", 4096), \
+                 patch("src.services.python_execution_service.OUTPUT_CAPTURE_TAIL_BYTES", 4096):
+                result = PythonExecutionService()._run_python_code(main_file)
+
+        assert result['return_code'] != 0
+        assert result['stderr'].startswith("Saída excedeu o limite de 1048576 bytes")
+        assert result['stdout_bytes'] > 1024 * 1024
+        assert len(result['stdout']) <= 1100
+
+
+class TestHangDetector:
+    """Testes para a detecção de programas esperando entrada."""
+
+    @staticmethod
+    def _run(code: str, **patches):
+        import sys
+        from contextlib import ExitStack
+        from src.services.python_execution_service import PythonExecutionService
+
+        environment = Mock()
+        environment.command.side_effect = lambda executable, *args: [sys.executable, *args]
+        environment.env.return_value = None
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            main_file = Path(temp_dir) / "main.py"
+            main_file.write_text(code)
+            with ExitStack() as stack:
+                stack.enter_context(patch("src.services.python_execution_service.environment_for_submission",
+                                          return_value=environment))
+                for name, value in patches.items():
+                    stack.enter_context(patch(f"src.services.python_execution_service.{name}", value))
+                return PythonExecutionService()._run_python_code(main_file)
+
+    def test_input_without_data_ends_early(self):
+        """Testa se um input() na execução de terminal encerra o programa sem esperar o timeout."""
+        import time
+        from src.services.python_execution_service import PythonExecutionService
+
+        start = time.monotonic()
+        result = self._run("print('Digite seu nome:')\nnome = input()\nprint('Olá', nome)\n")
+
+        assert time.monotonic() - start < 5
+        assert result['stdout'].startswith("Digite seu nome:")
+        assert "input()" in result['hang_message']
+        assert PythonExecutionService._status_fields(result)['execution_status'] == "waiting_for_input"
+
+    def test_program_without_input_is_not_flagged(self):
+        """Testa se um programa que lê a saída de um subprocesso não é confundido com um input()."""
+        result = self._run("import subprocess, sys\n"
+                           "out = subprocess.check_output([sys.executable, '-c', 'import time; time.sleep(0.5); print(1)'])\n"
+                           "print(out.decode().strip())\n")
+
+        assert result['return_code'] == 0
+        assert result['stdout'].strip() == "1"
+        assert result['hang_message'] is None
+
+    def test_idle_timeout(self):
+        """Testa se um programa parado (sem CPU nem saída) é encerrado quando HANG_IDLE_TIMEOUT está ativo."""
+        result = self._run("import time\ntime.sleep(20)\n", HANG_IDLE_TIMEOUT=0.5)
+
+        assert result['return_code'] != 0
+        assert "sem usar CPU" in result['hang_message']
+
+
+class TestExecutionCache:
+    """Testes para o cache de resultados das execuções de terminal e interativas."""
+
+    def test_terminal_results_cache(self):
+        """Testa se a execução de uma submissão inalterada vem do cache, com a origem registrada."""
+        import sys
+        from src.services.execution_cache import ExecutionCache
+        from src.services.python_execution_service import PythonExecutionService
+        from src.utils.disk_cache import DiskCache
+
+        environment = Mock()
+        environment.command.side_effect = lambda executable, *args: [sys.executable, *args]
+        environment.env.return_value = None
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            submission_dir = Path(temp_dir) / "ana"
+            submission_dir.mkdir()
+            (submission_dir / "main.py").write_text("print('cotação: 5.42')\n")
+            submission = Mock(submission_path=submission_dir, github_login="ana", display_name="Ana")
+            cache = ExecutionCache(DiskCache(Path(temp_dir) / "cache", 1024 * 1024), ttl=3600)
+
+            with patch("src.services.execution_cache._cache", cache), \
+                 patch("src.services.python_execution_service.environment_for_submission",
+                       return_value=environment):
+                service = PythonExecutionService()
+                first_provenance, second_provenance = {}, {}
+                first = service._execute_submission_python(submission, "scrap", "turma", first_provenance)
+                with patch.object(service, '_execute_main_file') as execute:
+                    second = service._execute_submission_python(submission, "scrap", "turma", second_provenance)
+                    execute.assert_not_called()
+
+                assert first_provenance == {}
+                assert second_provenance["execution"]["cached_at"]
+                assert second.stdout_output == first.stdout_output == "cotação: 5.42\n"
+                assert second.execution_timestamp == first.execution_timestamp
+
+                # Entradas vencidas (TTL) são executadas de novo
+                cache.ttl = 0
+                with patch.object(service, '_execute_main_file', return_value=first) as execute:
+                    service._execute_submission_python(submission, "scrap", "turma")
+                    execute.assert_called_once()
+
+    def test_identical_submissions_keep_their_identity(self):
+        """Testa se um acerto de outra submissão idêntica traz a identificação de quem chamou."""
+        import sys
+        from src.services.execution_cache import ExecutionCache
+        from src.services.python_execution_service import PythonExecutionService
+        from src.utils.disk_cache import DiskCache
+
+        environment = Mock()
+        environment.command.side_effect = lambda executable, *args: [sys.executable, *args]
+        environment.env.return_value = None
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            submissions = []
+            for login, name in [("ana", "Ana"), ("bruno", "Bruno")]:
+                submission_dir = Path(temp_dir) / login
+                submission_dir.mkdir()
+                (submission_dir / "main.py").write_text("print('mesmo código')\n")
+                submissions.append(Mock(submission_path=submission_dir, github_login=login, display_name=name))
+            cache = ExecutionCache(DiskCache(Path(temp_dir) / "cache", 1024 * 1024))
+
+            with patch("src.services.execution_cache._cache", cache), \
+                 patch("src.services.python_execution_service.environment_for_submission",
+                       return_value=environment):
+                service = PythonExecutionService()
+                first = service._execute_submission_python(submissions[0], "scrap", "turma")
+                provenance = {}
+                second = service._execute_submission_python(submissions[1], "scrap", "turma", provenance)
+
+            assert provenance["execution"]["cached_at"]
+            assert second.stdout_output == first.stdout_output
+            assert (first.submission_identifier, first.display_name) == ("ana", "Ana")
+            assert (second.submission_identifier, second.display_name) == ("bruno", "Bruno")
+
+    def test_failed_executions_are_not_cached(self):
+        """Testa se erros e timeouts não são guardados, e se entradas diferentes mudam a chave."""
+        from src.domain.models import PythonExecutionResult
+        from src.services.execution_cache import ExecutionCache
+        from src.utils.disk_cache import DiskCache
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            submission_dir = Path(temp_dir) / "ana"
+            submission_dir.mkdir()
+            (submission_dir / "main.py").write_text("print(input())\n")
+            cache = ExecutionCache(DiskCache(Path(temp_dir) / "cache", 1024 * 1024))
+            timeout = PythonExecutionResult("ana", "Ana", "", "success", "", "Timeout", -1, 30.0)
+            done = PythonExecutionResult("ana", "Ana", "", "success", "x\n", "", 0, 0.1)
+
+            key, _ = cache.lookup(submission_dir, {"inputs": ["x"]})
+            cache.store(key, timeout)
+            assert cache.lookup(submission_dir, {"inputs": ["x"]})[1] is None
+
+            cache.store(key, done)
+            assert cache.lookup(submission_dir, {"inputs": ["x"]})[1] == done
+            assert cache.lookup(submission_dir, {"inputs": ["y"]})[1] is None
 
 
 class TestAIAnalyzer:
     """Testes para AIAnalyzer."""
     
     @patch('src.services.ai_analyzer.OpenAI')
-    def test_analyze_code(self, mock_openai):
+    def test_analyze_code(self, mock_openai, tmp_path):
         """Testa análise de código com mock da OpenAI."""
         # Configura mock
         mock_client = Mock()
@@ -302,7 +1070,7 @@ PROBLEMAS:
                 description="Test assignment"
             )
             
-            analyzer = AIAnalyzer(api_key="fake-key")
+            analyzer = AIAnalyzer(api_key="fake-key", logs_path=tmp_path / "logs")
             result = analyzer.analyze_python_code(submission_path, assignment)
             
             assert result.score == 8.5
@@ -311,7 +1079,7 @@ PROBLEMAS:
             assert "Missing docstring" in result.issues_found
     
     @patch('src.services.ai_analyzer.OpenAI')
-    def test_analyze_html(self, mock_openai):
+    def test_analyze_html(self, mock_openai, tmp_path):
         """Testa análise HTML com mock da OpenAI."""
         # Configura mock
         mock_client = Mock()
@@ -350,7 +1118,7 @@ PROBLEMAS:
                 description="Test assignment"
             )
             
-            analyzer = AIAnalyzer(api_key="fake-key")
+            analyzer = AIAnalyzer(api_key="fake-key", logs_path=tmp_path / "logs")
             result = analyzer.analyze_html_code(submission_path, assignment)
             
             assert result.score == 7.0
@@ -389,9 +1157,38 @@ PROBLEMAS:
             assert log_content["raw_response"] == "Test response"
             assert log_content["parsed_result"]["score"] == 8.0
     
-    def test_parse_python_analysis_acento(self):
+    @patch('src.services.ai_analyzer.AsyncOpenAI')
+    def test_async_client_per_event_loop(self, mock_async_openai, tmp_path):
+        """Testa se cada event loop tem o seu cliente AsyncOpenAI, fechado ao fim do loop."""
+        import asyncio
+        import threading
+        from unittest.mock import AsyncMock
+        
+        mock_async_openai.side_effect = lambda **kwargs: Mock(close=AsyncMock())
+        analyzer = AIAnalyzer(api_key="fake-key", logs_path=tmp_path / "logs")
+        clients = []
+        
+        async def correction():
+            client = analyzer._get_async_client()
+            await asyncio.sleep(0.05)
+            assert analyzer._get_async_client() is client
+            clients.append(client)
+            await analyzer.close_async_client()
+        
+        threads = [threading.Thread(target=asyncio.run, args=(correction(),)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert len(clients) == 2 and clients[0] is not clients[1]
+        for client in clients:
+            client.close.assert_awaited_once()
+        assert analyzer._async_clients == {}
+    
+    def test_parse_python_analysis_acento(self, tmp_path):
         """Testa o parsing da resposta da IA para análise Python com acentos."""
-        analyzer = AIAnalyzer(api_key="fake-key")
+        analyzer = AIAnalyzer(api_key="fake-key", logs_path=tmp_path / "logs")
         test_response = """NOTA: 9
 
 COMENTÁRIOS:
@@ -416,9 +1213,9 @@ PROBLEMAS:
         assert "Adicionar mais comentários explicativos ao código" in result.suggestions[0]
         assert "Não foram identificados problemas" in result.issues_found[0]
     
-    def test_parse_python_analysis_justification(self):
+    def test_parse_python_analysis_justification(self, tmp_path):
         """Testa se a justificativa da nota é capturada corretamente na análise Python."""
-        analyzer = AIAnalyzer(api_key="fake-key")
+        analyzer = AIAnalyzer(api_key="fake-key", logs_path=tmp_path / "logs")
         analysis_text = """
 NOTA: 8.5
 JUSTIFICATIVA: Código bem estruturado com implementação correta dos requisitos principais
@@ -439,9 +1236,9 @@ PROBLEMAS:
         assert "Adicionar mais comentários" in result.suggestions
         assert "Falta tratamento de erro em uma função" in result.issues_found
     
-    def test_parse_html_analysis_justification(self):
+    def test_parse_html_analysis_justification(self, tmp_path):
         """Testa se a justificativa da nota é capturada corretamente na análise HTML."""
-        analyzer = AIAnalyzer(api_key="fake-key")
+        analyzer = AIAnalyzer(api_key="fake-key", logs_path=tmp_path / "logs")
         analysis_text = """
 NOTA: 7.0
 JUSTIFICATIVA: Estrutura HTML adequada mas CSS poderia ser melhorado
@@ -470,9 +1267,9 @@ PROBLEMAS:
         assert result.required_elements["a"] == True
         assert result.required_elements["table"] == True
     
-    def test_parse_html_analysis_elements_inline_format(self):
+    def test_parse_html_analysis_elements_inline_format(self, tmp_path):
         """Testa parsing de elementos HTML quando vêm na mesma linha após ELEMENTOS:."""
-        analyzer = AIAnalyzer(api_key="fake-key")
+        analyzer = AIAnalyzer(api_key="fake-key", logs_path=tmp_path / "logs")
         analysis_text = """
 NOTA: 8.0
 JUSTIFICATIVA: Boa implementação dos elementos HTML obrigatórios
@@ -495,9 +1292,9 @@ PROBLEMAS:
         assert result.required_elements["a"] == True
         assert result.required_elements["table"] == True
     
-    def test_parse_html_analysis_elements_mixed_format(self):
+    def test_parse_html_analysis_elements_mixed_format(self, tmp_path):
         """Testa parsing de elementos HTML em formato misto (alguns com hífen, outros não)."""
-        analyzer = AIAnalyzer(api_key="fake-key")
+        analyzer = AIAnalyzer(api_key="fake-key", logs_path=tmp_path / "logs")
         analysis_text = """
 NOTA: 6.0
 JUSTIFICATIVA: Implementação parcial dos elementos HTML
@@ -525,9 +1322,9 @@ PROBLEMAS:
         assert result.required_elements["a"] == True
         assert result.required_elements["table"] == False
     
-    def test_parse_html_analysis_elements_with_parentheses(self):
+    def test_parse_html_analysis_elements_with_parentheses(self, tmp_path):
         """Testa parsing de elementos HTML com informações adicionais em parênteses."""
-        analyzer = AIAnalyzer(api_key="fake-key")
+        analyzer = AIAnalyzer(api_key="fake-key", logs_path=tmp_path / "logs")
         analysis_text = """
 NOTA: 9.0
 JUSTIFICATIVA: Excelente implementação com todos os elementos
@@ -555,9 +1352,9 @@ PROBLEMAS:
         assert result.required_elements["a"] == True
         assert result.required_elements["table"] == True
     
-    def test_parse_html_analysis_justification_multiline(self):
+    def test_parse_html_analysis_justification_multiline(self, tmp_path):
         """Testa se justificativa multilinha é capturada corretamente."""
-        analyzer = AIAnalyzer(api_key="fake-key")
+        analyzer = AIAnalyzer(api_key="fake-key", logs_path=tmp_path / "logs")
         analysis_text = """
 NOTA: 7.5
 JUSTIFICATIVA: O aluno implementou corretamente a estrutura básica do site de currículo, 
@@ -583,9 +1380,9 @@ PROBLEMAS:
         assert result.score == 7.5
         assert result.score_justification == expected_justification
     
-    def test_parse_html_analysis_real_log_examples(self):
+    def test_parse_html_analysis_real_log_examples(self, tmp_path):
         """Testa parsing com exemplos reais dos logs problemáticos."""
-        analyzer = AIAnalyzer(api_key="fake-key")
+        analyzer = AIAnalyzer(api_key="fake-key", logs_path=tmp_path / "logs")
         
         # Exemplo do log tarefa-html-curriculo-anaclaravtoledo_html_08-06-46.json
         analysis_text_1 = """
@@ -752,6 +1549,7 @@ class TestCorrectionService:
                 service = CorrectionService(
                     enunciados_path=enunciados_dir,
                     respostas_path=respostas_dir,
+                    logs_path=Path(temp_dir) / "logs",
                     verbose=False
                 )
                 
@@ -770,7 +1568,7 @@ class TestCorrectionService:
                 assert submission.group_name == "joaosilva"
                 assert isinstance(submission.final_score, float)
 
-    def test_summary_rounding_consistency(self):
+    def test_summary_rounding_consistency(self, tmp_path):
         """Testa se as estatísticas de nota no summary são arredondadas para uma casa decimal."""
         from src.domain.models import IndividualSubmission, CorrectionReport
         submissions = [
@@ -783,7 +1581,7 @@ class TestCorrectionService:
             )
             for i, nota in enumerate([9.1, 7.7, 6.4, 8.8, 9.9])
         ]
-        service = CorrectionService(Path("."), Path("."), verbose=False)
+        service = CorrectionService(Path("."), Path("."), logs_path=tmp_path / "logs", verbose=False)
         summary = service._calculate_summary(submissions)
         # Todos devem ter apenas uma casa decimal
         for key in ["average_score", "min_score", "max_score"]:
@@ -796,7 +1594,7 @@ class TestCorrectionService:
         # Checagem visual
         print("Resumo arredondado:", summary)
 
-    def test_generate_feedback_python_assignment(self):
+    def test_generate_feedback_python_assignment(self, tmp_path):
         """Testa geração de feedback para assignment Python com campos padronizados."""
         from src.domain.models import IndividualSubmission, CodeAnalysis, AssignmentTestExecution, AssignmentTestResult
         
@@ -838,7 +1636,7 @@ class TestCorrectionService:
         )
         
         # Gera feedback
-        service = CorrectionService(Path("."), Path("."), verbose=False)
+        service = CorrectionService(Path("."), Path("."), logs_path=tmp_path / "logs", verbose=False)
         feedback = service._generate_feedback(submission, assignment)
         
         # Verifica estrutura do feedback
@@ -865,7 +1663,7 @@ class TestCorrectionService:
         assert not any("Pontos positivos:" in line for line in lines)
         assert not any("Problemas encontrados:" in line for line in lines)
 
-    def test_generate_feedback_html_assignment(self):
+    def test_generate_feedback_html_assignment(self, tmp_path):
         """Testa geração de feedback para assignment HTML com campos padronizados."""
         from src.domain.models import IndividualSubmission, HTMLAnalysis
         
@@ -900,7 +1698,7 @@ class TestCorrectionService:
         )
         
         # Gera feedback
-        service = CorrectionService(Path("."), Path("."), verbose=False)
+        service = CorrectionService(Path("."), Path("."), logs_path=tmp_path / "logs", verbose=False)
         feedback = service._generate_feedback(submission, assignment)
         
         # Verifica estrutura do feedback
@@ -926,7 +1724,7 @@ class TestCorrectionService:
         assert any("CSS muito básico" in line for line in lines)
         assert any("Falta responsividade" in line for line in lines)
 
-    def test_generate_feedback_without_analysis(self):
+    def test_generate_feedback_without_analysis(self, tmp_path):
         """Testa geração de feedback quando não há análise de IA."""
         from src.domain.models import IndividualSubmission
         
@@ -947,7 +1745,7 @@ class TestCorrectionService:
         )
         
         # Gera feedback
-        service = CorrectionService(Path("."), Path("."), verbose=False)
+        service = CorrectionService(Path("."), Path("."), logs_path=tmp_path / "logs", verbose=False)
         feedback = service._generate_feedback(submission, assignment)
         
         # Deve retornar string vazia ou apenas informações básicas
@@ -958,6 +1756,725 @@ class TestCorrectionService:
         assert "Justificativa:" not in feedback
         assert "Problemas:" not in feedback
 
+    def test_parallel_processing_matches_serial_order(self):
+        """Testa se o processamento paralelo mantém a ordem e isola erros por submissão."""
+        import random
+        import time
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            enunciados_dir, respostas_dir = _create_correction_fixture(
+                Path(temp_dir), ["carla", "ana", "bruno", "daniel", "erika"]
+            )
+            
+            def fake_process(submission, assignment):
+                time.sleep(random.uniform(0, 0.05))
+                if submission.github_login == "bruno":
+                    raise RuntimeError("falha simulada")
+                submission.final_score = float(len(submission.github_login))
+            
+            reports = []
+            for workers in (1, 4):
+                service = CorrectionService(enunciados_dir, respostas_dir, logs_path=Path(temp_dir) / "logs",
+                                            max_workers=workers)
+                with patch.object(service, '_process_submission', side_effect=fake_process):
+                    reports.append(service.correct_assignment("prog1-tarefa-scrap-simples", "turma-teste"))
+            
+            serial, parallel = reports
+            assert [s.github_login for s in parallel.submissions] == ["ana", "bruno", "carla", "daniel", "erika"]
+            assert [s.final_score for s in parallel.submissions] == [s.final_score for s in serial.submissions]
+            # Métricas de tempo variam entre execuções; as estatísticas de nota não
+            without_metrics = lambda summary: {k: v for k, v in summary.items() if k != "stage_metrics"}
+            assert without_metrics(parallel.summary) == without_metrics(serial.summary)
+            # A falha de uma submissão não impede as demais
+            bruno = next(s for s in parallel.submissions if s.github_login == "bruno")
+            assert bruno.final_score == 0.0
+
+
+    def test_pipeline_ai_stage_receives_own_results(self):
+        """Testa se, no pipeline, o estágio de IA recebe os resultados da própria submissão."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            enunciados_dir, respostas_dir = _create_correction_fixture(
+                Path(temp_dir), ["ana", "bruno", "carla", "daniel"]
+            )
+            service = CorrectionService(enunciados_dir, respostas_dir, logs_path=Path(temp_dir) / "logs",
+                                        use_pipeline=True)
+            
+            def fake_tests(submission, assignment):
+                submission.test_results = [submission.github_login]
+            
+            def fake_execution(submission, assignment):
+                submission.python_execution = f"exec-{submission.github_login}"
+            
+            seen = {}
+            
+            def fake_ai(submission, assignment):
+                seen[submission.github_login] = (submission.test_results, submission.python_execution)
+            
+            with patch.object(service, '_run_tests_stage', side_effect=fake_tests), \
+                 patch.object(service, '_run_execution_stage', side_effect=fake_execution), \
+                 patch.object(service, '_run_thumbnail_stage'), \
+                 patch.object(service, '_run_ai_stage', side_effect=fake_ai), \
+                 patch.object(service, '_run_scoring_stage'):
+                report = service.correct_assignment("prog1-tarefa-scrap-simples", "turma-teste")
+            
+            assert [s.github_login for s in report.submissions] == ["ana", "bruno", "carla", "daniel"]
+            for login, (tests, execution) in seen.items():
+                assert tests == [login]
+                assert execution == f"exec-{login}"
+            assert len(seen) == 4
+
+
+    def test_correct_all_assignments_shares_global_budget(self):
+        """Testa correção concorrente de assignments com orçamento global e progresso por assignment."""
+        import threading
+        import time
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            base_dir = Path(temp_dir)
+            enunciados_dir, respostas_dir = _create_correction_fixture(
+                base_dir, ["ana", "bruno", "carla"], assignment_name="prog1-tarefa-scrap-simples"
+            )
+            _create_correction_fixture(
+                base_dir, ["daniel", "erika", "fabio"], assignment_name="prog1-tarefa-html-curriculo"
+            )
+            service = CorrectionService(enunciados_dir, respostas_dir, logs_path=base_dir / "logs", max_workers=2)
+            
+            lock = threading.Lock()
+            state = {"running": 0, "peak": 0}
+            progress = {}
+            
+            def fake_process(submission, assignment):
+                with lock:
+                    state["running"] += 1
+                    state["peak"] = max(state["peak"], state["running"])
+                time.sleep(0.02)
+                with lock:
+                    state["running"] -= 1
+            
+            def on_progress(assignment_name, done, total):
+                progress.setdefault(assignment_name, []).append((done, total))
+            
+            with patch.object(service, '_process_submission', side_effect=fake_process):
+                reports = service.correct_all_assignments("turma-teste", parallel_assignments=2,
+                                                          progress_callback=on_progress)
+            
+            assert len(reports) == 2
+            assert state["peak"] <= 2
+            assert sorted(progress) == ["prog1-tarefa-html-curriculo", "prog1-tarefa-scrap-simples"]
+            for updates in progress.values():
+                assert sorted(updates) == [(1, 3), (2, 3), (3, 3)]
+
+    
+    def test_unchanged_submissions_are_reused_from_previous_report(self):
+        """Testa se submissões com o mesmo fingerprint não são corrigidas de novo."""
+        from src.domain.models import CodeAnalysis
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            base_dir = Path(temp_dir)
+            enunciados_dir, respostas_dir = _create_correction_fixture(base_dir, ["ana", "bruno", "carla"])
+            reports_dir = base_dir / "reports"
+            reports_dir.mkdir()
+            processed = []
+            
+            def fake_process(submission, assignment):
+                processed.append(submission.github_login)
+                submission.code_analysis = CodeAnalysis(score=7.0)
+                submission.final_score = 7.0
+            
+            def run(force=False):
+                processed.clear()
+                service = CorrectionService(enunciados_dir, respostas_dir, logs_path=base_dir / "logs",
+                                            reports_path=reports_dir, force_regrade=force)
+                with patch.object(service, '_process_submission', side_effect=fake_process):
+                    report = service.correct_assignment("prog1-tarefa-scrap-simples", "turma-teste")
+                report.save_to_file(reports_dir / "prog1-tarefa-scrap-simples_turma-teste.json")
+                return report
+            
+            first = run()
+            assert sorted(processed) == ["ana", "bruno", "carla"]
+            assert all(s.fingerprint for s in first.submissions)
+            
+            # Apenas a submissão alterada é corrigida novamente
+            submission_dir = (respostas_dir / "turma-teste" / "prog1-tarefa-scrap-simples-submissions"
+                              / "prog1-tarefa-scrap-simples-bruno")
+            (submission_dir / "main.py").write_text("print('bruno v2')")
+            second = run()
+            assert processed == ["bruno"]
+            assert [s.final_score for s in second.submissions] == [7.0, 7.0, 7.0]
+            assert second.submissions[0].code_analysis.score == 7.0
+            
+            # Artefatos gerados pela correção não alteram o fingerprint
+            (submission_dir / ".report.json").write_text("{}")
+            run()
+            assert processed == []
+            
+            # Mudança no enunciado invalida todas as submissões
+            (enunciados_dir / "prog1-tarefa-scrap-simples" / "test_main.py").write_text("def test_ok(): pass")
+            run()
+            assert sorted(processed) == ["ana", "bruno", "carla"]
+            
+            # --force ignora o relatório anterior
+            run(force=True)
+            assert sorted(processed) == ["ana", "bruno", "carla"]
+
+
+    
+    def test_failed_ai_analysis_is_not_reused(self):
+        """Testa se a nota 0 de uma falha na chamada à IA não é reaproveitada (relatório e --resume)."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            base_dir = Path(temp_dir)
+            enunciados_dir, respostas_dir = _create_correction_fixture(base_dir, ["ana", "bruno"])
+            reports_dir = base_dir / "reports"
+            reports_dir.mkdir()
+            
+            response = Mock()
+            response.choices = [Mock()]
+            response.choices[0].message.content = "NOTA: 8.5\nCOMENTARIOS:\n- Bom código"
+            
+            def run(ai_error=None, resume=False):
+                service = CorrectionService(enunciados_dir, respostas_dir, logs_path=base_dir / "logs",
+                                            reports_path=reports_dir, resume=resume)
+                service.ai_analyzer.ai_available = True
+                service.ai_analyzer.client = Mock()
+                create = service.ai_analyzer.client.chat.completions.create
+                if ai_error:
+                    create.side_effect = ai_error
+                else:
+                    create.return_value = response
+                with patch.object(service, '_run_tests_stage'), \
+                     patch.object(service, '_run_execution_stage'), \
+                     patch.object(service, '_run_thumbnail_stage'):
+                    report = service.correct_assignment("prog1-tarefa-scrap-simples", "turma-teste")
+                report.save_to_file(reports_dir / "prog1-tarefa-scrap-simples_turma-teste.json")
+                return report, create.call_count
+            
+            # Primeira correção durante uma falha da OpenAI
+            report, calls = run(ai_error=RuntimeError("OpenAI indisponível"))
+            assert calls == 2
+            assert all(s.code_analysis.ai_failed and s.final_score == 0.0 for s in report.submissions)
+            
+            # Nem o relatório anterior nem o journal (--resume) reaproveitam a falha
+            _, calls = run(ai_error=RuntimeError("OpenAI indisponível"), resume=True)
+            assert calls == 2
+            
+            report, calls = run()
+            assert calls == 2
+            assert [s.code_analysis.score for s in report.submissions] == [8.5, 8.5]
+            assert not any(s.code_analysis.ai_failed for s in report.submissions)
+            
+            # Depois de uma análise bem-sucedida, a submissão volta a ser reaproveitada
+            _, calls = run()
+            assert calls == 0
+    
+    def test_resume_processes_only_submissions_missing_from_journal(self):
+        """Testa se --resume reconstrói o relatório a partir do journal de uma execução interrompida."""
+        from src.domain.models import CodeAnalysis
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            base_dir = Path(temp_dir)
+            enunciados_dir, respostas_dir = _create_correction_fixture(base_dir, ["ana", "bruno", "carla", "daniel"])
+            reports_dir = base_dir / "reports"
+            processed = []
+            
+            def interrupted_process(submission, assignment):
+                if submission.github_login == "carla":
+                    raise KeyboardInterrupt
+                processed.append(submission.github_login)
+                submission.code_analysis = CodeAnalysis(score=6.0)
+                submission.final_score = 6.0
+            
+            service = CorrectionService(enunciados_dir, respostas_dir, logs_path=base_dir / "logs",
+                                        max_workers=1, reports_path=reports_dir)
+            with patch.object(service, '_process_submission', side_effect=interrupted_process):
+                with pytest.raises(KeyboardInterrupt):
+                    service.correct_assignment("prog1-tarefa-scrap-simples", "turma-teste")
+            
+            journal_path = reports_dir / "prog1-tarefa-scrap-simples_turma-teste.jsonl"
+            assert len(journal_path.read_text().splitlines()) == 2
+            # Linha parcial de uma escrita interrompida é ignorada
+            with open(journal_path, "a") as f:
+                f.write('{"submission_type": "individual", "ident')
+            
+            processed.clear()
+            
+            def fake_process(submission, assignment):
+                processed.append(submission.github_login)
+                submission.code_analysis = CodeAnalysis(score=9.0)
+                submission.final_score = 9.0
+            
+            service = CorrectionService(enunciados_dir, respostas_dir, logs_path=base_dir / "logs",
+                                        max_workers=1, reports_path=reports_dir, resume=True)
+            with patch.object(service, '_process_submission', side_effect=fake_process):
+                report = service.correct_assignment("prog1-tarefa-scrap-simples", "turma-teste")
+            
+            assert processed == ["carla", "daniel"]
+            assert [s.final_score for s in report.submissions] == [6.0, 6.0, 9.0, 9.0]
+            # O journal continua legível após a retomada
+            entries = [json.loads(line) for line in journal_path.read_text().splitlines()]
+            assert sorted({entry["identifier"] for entry in entries}) == ["ana", "bruno", "carla", "daniel"]
+    
+    def test_single_submission_run_keeps_journal_of_the_class(self):
+        """Testa se corrigir uma só submissão (--submissao) não apaga o journal das demais."""
+        from src.domain.models import CodeAnalysis, CorrectionReport
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            base_dir = Path(temp_dir)
+            enunciados_dir, respostas_dir = _create_correction_fixture(base_dir, ["ana", "bruno", "carla"])
+            reports_dir = base_dir / "reports"
+            
+            def run(score, submission_identifier=None):
+                def fake_process(submission, assignment):
+                    submission.code_analysis = CodeAnalysis(score=score)
+                    submission.final_score = score
+                
+                service = CorrectionService(enunciados_dir, respostas_dir, logs_path=base_dir / "logs",
+                                            max_workers=1, reports_path=reports_dir, force_regrade=True)
+                with patch.object(service, '_process_submission', side_effect=fake_process):
+                    service.correct_assignment("prog1-tarefa-scrap-simples", "turma-teste", submission_identifier)
+            
+            run(6.0)
+            run(9.0, "bruno")
+            
+            journal_path = reports_dir / "prog1-tarefa-scrap-simples_turma-teste.jsonl"
+            report = CorrectionReport.load_from_jsonl(journal_path)
+            scores = {s.github_login: s.final_score for s in report.submissions}
+            assert scores == {"ana": 6.0, "bruno": 9.0, "carla": 6.0}
+            
+            # Uma nova correção do assignment inteiro começa um journal novo
+            run(7.0)
+            assert len(journal_path.read_text().splitlines()) == 3
+
+
+    
+    def test_stage_metrics_recorded_and_summarized(self):
+        """Testa se cada estágio registra tempo/CPU/RSS e se o summary agrega p50/p95/max."""
+        import time
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            enunciados_dir, respostas_dir = _create_correction_fixture(Path(temp_dir), ["ana", "bruno"])
+            service = CorrectionService(enunciados_dir, respostas_dir, logs_path=Path(temp_dir) / "logs")
+            
+            def slow_analysis(*args, **kwargs):
+                with measure_stage(kwargs["metrics"], "ai_call"):
+                    time.sleep(0.01)
+                return Mock(score=8.0)
+            
+            with patch.object(service.ai_analyzer, 'analyze_python_code', side_effect=slow_analysis):
+                report = service.correct_assignment("prog1-tarefa-scrap-simples", "turma-teste")
+            
+            for submission in report.submissions:
+                assert {"repository_load", "ai_call", "scoring"} <= set(submission.stage_metrics)
+                ai_call = submission.stage_metrics["ai_call"]
+                assert ai_call["wall_time"] >= 0.01
+                assert ai_call["peak_rss_mb"] > 0
+            
+            stage_summary = report.summary["stage_metrics"]
+            assert list(stage_summary)[:1] == ["repository_load"]
+            assert stage_summary["ai_call"]["count"] == 2
+            assert stage_summary["ai_call"]["wall_time"]["max"] >= stage_summary["ai_call"]["wall_time"]["p50"]
+            assert set(stage_summary["ai_call"]["cpu_time"]) == {"p50", "p95", "max", "total"}
+    
+    def test_summarize_stage_metrics_percentiles(self):
+        """Testa os percentis nearest-rank do agregado por estágio."""
+        metrics = [{"tests": {"wall_time": float(i), "cpu_time": 0.5, "peak_rss_mb": 10.0 * i}} for i in range(1, 21)]
+        summary = summarize_stage_metrics(metrics)
+        
+        assert summary["tests"]["count"] == 20
+        assert summary["tests"]["wall_time"] == {"p50": 10.0, "p95": 19.0, "max": 20.0, "total": 210.0}
+        assert summary["tests"]["peak_rss_mb"] == {"p50": 100.0, "p95": 190.0, "max": 200.0}
+    
+    def test_measure_stage_samples_peak_rss_and_skips_event_loop_cpu(self):
+        """Testa se o pico de RSS é amostrado durante o estágio e se o CPU do event loop não é atribuído a ele."""
+        import asyncio
+        import time
+        
+        def busy(seconds):
+            end = time.perf_counter() + seconds
+            while time.perf_counter() < end:
+                pass
+        
+        metrics = {}
+        with measure_stage(metrics, "tests"):
+            buffer = bytearray(200 * 1024 * 1024)
+            buffer[::4096] = b"x" * len(buffer[::4096])  # toca as páginas
+            time.sleep(0.3)
+            del buffer
+            busy(0.2)
+        with measure_stage(metrics, "ai_call"):
+            pass
+        assert metrics["tests"]["peak_rss_mb"] >= metrics["ai_call"]["peak_rss_mb"] + 150
+        assert metrics["tests"]["cpu_time"] >= 0.1
+        
+        async def stage_in_event_loop():
+            async_metrics = {}
+            with measure_stage(async_metrics, "ai_call"):
+                busy(0.2)  # outra corrotina usando o loop
+                await asyncio.sleep(0)
+            return async_metrics
+        
+        assert asyncio.run(stage_in_event_loop())["ai_call"]["cpu_time"] < 0.1
+
+
+    
+    def test_longest_expected_submissions_start_first(self):
+        """Testa se as submissões mais demoradas no relatório anterior são iniciadas primeiro."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            base_dir = Path(temp_dir)
+            enunciados_dir, respostas_dir = _create_correction_fixture(base_dir, ["ana", "bruno", "carla", "daniel"])
+            reports_dir = base_dir / "reports"
+            reports_dir.mkdir()
+            
+            durations = {"ana": 1.0, "bruno": 30.0, "carla": 5.0}  # daniel sem histórico
+            previous = CorrectionReport(
+                assignment_name="prog1-tarefa-scrap-simples",
+                turma="turma-teste",
+                submissions=[
+                    IndividualSubmission(
+                        github_login=login, assignment_name="prog1-tarefa-scrap-simples", turma="turma-teste",
+                        submission_path=Path("."), stage_metrics={"thumbnail": {"wall_time": duration}}
+                    )
+                    for login, duration in durations.items()
+                ]
+            )
+            previous.save_to_file(reports_dir / "prog1-tarefa-scrap-simples_turma-teste.json")
+            
+            started = []
+            service = CorrectionService(enunciados_dir, respostas_dir, logs_path=base_dir / "logs",
+                                        max_workers=1, reports_path=reports_dir, force_regrade=True)
+            with patch.object(service, '_process_submission',
+                              side_effect=lambda submission, assignment: started.append(submission.github_login)):
+                report = service.correct_assignment("prog1-tarefa-scrap-simples", "turma-teste")
+            
+            # daniel recebe a mediana (5.0) e mantém a ordem original no empate com carla
+            assert started == ["bruno", "carla", "daniel", "ana"]
+            assert [s.github_login for s in report.submissions] == ["ana", "bruno", "carla", "daniel"]
+    
+    @pytest.mark.parametrize("mode", ["workers", "pipeline", "async"])
+    def test_time_budget_marks_remaining_submissions_pending(self, mode):
+        """Testa se, esgotado o --time-budget, as submissões não iniciadas ficam pendentes (fora do journal)."""
+        from src.domain.models import CodeAnalysis
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            enunciados_dir, respostas_dir = _create_correction_fixture(Path(temp_dir), ["ana", "bruno", "carla"])
+            reports_dir = Path(temp_dir) / "reports"
+            service = CorrectionService(enunciados_dir, respostas_dir, logs_path=Path(temp_dir) / "logs",
+                                        max_workers=1, use_pipeline=(mode == "pipeline"),
+                                        use_async=(mode == "async"), reports_path=reports_dir, time_budget=3600)
+            
+            def exhaust_budget(submission, assignment, *args):
+                submission.code_analysis = CodeAnalysis(score=8.0)
+                submission.final_score = 8.0
+                service._deadline = 0  # o prazo acaba durante a primeira correção
+            
+            async def exhaust_budget_async(submission, assignment, *args):
+                exhaust_budget(submission, assignment)
+            
+            progress = []
+            # Um worker no primeiro estágio para que a ordem de início seja determinística
+            with patch.object(service, '_process_submission', side_effect=exhaust_budget), \
+                 patch.object(service, '_run_tests_stage', side_effect=exhaust_budget), \
+                 patch.object(service, '_process_submission_async', side_effect=exhaust_budget_async), \
+                 patch.dict("config.PIPELINE_STAGE_WORKERS", {"tests": 1}):
+                report = service.correct_assignment("prog1-tarefa-scrap-simples", "turma-teste",
+                                                    progress_callback=lambda *args: progress.append(args))
+            
+            # Só a submissão corrigida entra no journal (--resume) e no progresso
+            journal_path = reports_dir / "prog1-tarefa-scrap-simples_turma-teste.jsonl"
+            assert len(journal_path.read_text(encoding="utf-8").splitlines()) == 1
+            assert progress == [("prog1-tarefa-scrap-simples", 1, 3)]
+            
+            statuses = [s.grading_status for s in report.submissions]
+            assert statuses == ["graded", "pending", "pending"]
+            pending = [s for s in report.submissions if s.grading_status == "pending"]
+            assert all("pendente" in s.feedback for s in pending)
+            assert report.summary["pending_submissions"] == len(pending)
+            # Pendentes não derrubam a média
+            assert report.summary["average_score"] == round(report.submissions[0].final_score, 1)
+    
+    def test_time_budget_starts_with_the_correction(self):
+        """Testa se o --time-budget conta a partir da primeira correção, uma vez para a execução inteira."""
+        from src.domain.models import CodeAnalysis
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            enunciados_dir, respostas_dir = _create_correction_fixture(Path(temp_dir), ["ana", "bruno"])
+            with patch("src.services.correction_service.time.monotonic", return_value=1000.0):
+                service = CorrectionService(enunciados_dir, respostas_dir, logs_path=Path(temp_dir) / "logs",
+                                            max_workers=1, time_budget=60)
+            assert service._deadline is None
+            
+            def grade(submission, assignment):
+                submission.code_analysis = CodeAnalysis(score=8.0)
+                submission.final_score = 8.0
+            
+            with patch.object(service, '_process_submission', side_effect=grade):
+                with patch("src.services.correction_service.time.monotonic", return_value=5000.0):
+                    report = service.correct_assignment("prog1-tarefa-scrap-simples", "turma-teste")
+                assert service._deadline == 5060.0
+                assert all(s.grading_status == "graded" for s in report.submissions)
+                
+                # Um segundo assignment na mesma execução usa o mesmo prazo
+                with patch("src.services.correction_service.time.monotonic", return_value=5030.0):
+                    service.correct_assignment("prog1-tarefa-scrap-simples", "turma-teste")
+                assert service._deadline == 5060.0
+    
+    def test_batched_tests_skip_per_submission_test_stage(self):
+        """Testa se, com PYTEST_BATCH_ASSIGNMENTS, os testes rodam em lotes e o estágio de testes não repete."""
+        from src.domain.models import AssignmentTestExecution, AssignmentTestResult
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            enunciados_dir, respostas_dir = _create_correction_fixture(
+                Path(temp_dir), ["ana", "bruno", "carla"]
+            )
+            (enunciados_dir / "prog1-tarefa-scrap-simples" / "test_main.py").write_text("def test_ok():\n    pass\n")
+            service = CorrectionService(enunciados_dir, respostas_dir, logs_path=Path(temp_dir) / "logs",
+                                        max_workers=1)
+            
+            batches = []
+            
+            def fake_batch(jobs, provenances, **options):
+                batches.append([path.name.rsplit("-", 1)[-1] for path, _ in jobs])
+                return [[AssignmentTestExecution(test_name=path.name, result=AssignmentTestResult.PASSED)]
+                        for path, _ in jobs]
+            
+            with patch.dict("config.PYTEST_BATCH_ASSIGNMENTS", {"prog1-tarefa-scrap-simples": 2}), \
+                 patch.object(service.test_executor, 'run_tests_batch', side_effect=fake_batch), \
+                 patch.object(service.test_executor, 'run_tests') as run_single, \
+                 patch.object(service, '_run_execution_stage'), \
+                 patch.object(service, '_run_thumbnail_stage'), \
+                 patch.object(service, '_run_ai_stage'):
+                report = service.correct_assignment("prog1-tarefa-scrap-simples", "turma-teste")
+                run_single.assert_not_called()
+            
+            assert sorted(batches) == [["ana", "bruno"], ["carla"]]
+            for submission in report.submissions:
+                assert submission.test_results[0].test_name.endswith(submission.github_login)
+                assert "wall_time" in submission.stage_metrics["tests"]
+                assert submission.tests_batched
+            
+            # Métricas de testes copiadas de uma correção anterior não pulam o estágio de testes
+            submission = report.submissions[0]
+            submission.tests_batched = False
+            assignment = service.assignment_repo.get_assignment("prog1-tarefa-scrap-simples")
+            with patch.object(service.test_executor, 'run_tests', return_value=[]) as run_single:
+                service._run_tests_stage(submission, assignment)
+            run_single.assert_called_once()
+    
+    def test_async_path_overlaps_io_waits(self):
+        """Testa se, com use_async, as esperas de IA das submissões acontecem ao mesmo tempo."""
+        import asyncio
+        import time
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            enunciados_dir, respostas_dir = _create_correction_fixture(
+                Path(temp_dir), ["ana", "bruno", "carla", "daniel"]
+            )
+            reports_dir = Path(temp_dir) / "reports"
+            service = CorrectionService(enunciados_dir, respostas_dir, logs_path=Path(temp_dir) / "logs",
+                                        max_workers=4, reports_path=reports_dir, use_async=True)
+            
+            tested = {}
+            
+            async def fake_tests(submission, assignment):
+                tested[id(submission)] = submission.github_login
+            
+            async def fake_ai(submission, assignment):
+                await asyncio.sleep(0.3)
+                submission.final_score = float(len(tested[id(submission)]))
+            
+            async def noop(submission, assignment):
+                pass
+            
+            start = time.perf_counter()
+            with patch.object(service, '_run_tests_stage_async', side_effect=fake_tests), \
+                 patch.object(service, '_run_execution_stage_async', side_effect=noop), \
+                 patch.object(service, '_run_thumbnail_stage_async', side_effect=noop), \
+                 patch.object(service, '_run_ai_stage_async', side_effect=fake_ai), \
+                 patch.object(service, '_run_scoring_stage'):
+                report = service.correct_assignment("prog1-tarefa-scrap-simples", "turma-teste")
+            elapsed = time.perf_counter() - start
+            
+            assert [s.github_login for s in report.submissions] == ["ana", "bruno", "carla", "daniel"]
+            assert [s.final_score for s in report.submissions] == [3.0, 5.0, 5.0, 6.0]
+            # Quatro esperas de 0.3s sobrepostas, não em sequência
+            assert elapsed < 1.0
+            # O journal recebe todas as submissões finalizadas
+            journal_path = reports_dir / "prog1-tarefa-scrap-simples_turma-teste.jsonl"
+            assert len(journal_path.read_text(encoding="utf-8").splitlines()) == 4
+    
+    def test_async_assignments_share_global_limits(self):
+        """Testa se event loops de assignments corrigidos ao mesmo tempo respeitam os limites globais."""
+        import asyncio
+        import threading
+        import config
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            base_dir = Path(temp_dir)
+            enunciados_dir, respostas_dir = _create_correction_fixture(
+                base_dir, ["ana", "bruno", "carla"], assignment_name="prog1-tarefa-scrap-simples"
+            )
+            _create_correction_fixture(
+                base_dir, ["daniel", "erika", "fabio"], assignment_name="prog1-tarefa-html-curriculo"
+            )
+            with patch.dict(config.PIPELINE_STAGE_WORKERS, {"thumbnail": 1, "ai": 1}):
+                service = CorrectionService(enunciados_dir, respostas_dir, logs_path=base_dir / "logs",
+                                            max_workers=4, use_async=True)
+            
+            lock = threading.Lock()
+            running = {"thumbnail": 0, "ai": 0}
+            peak = {"thumbnail": 0, "ai": 0}
+            
+            def fake_stage(name):
+                async def stage(submission, assignment):
+                    with lock:
+                        running[name] += 1
+                        peak[name] = max(peak[name], running[name])
+                    await asyncio.sleep(0.05)
+                    with lock:
+                        running[name] -= 1
+                return stage
+            
+            async def noop(submission, assignment):
+                pass
+            
+            with patch.object(service, '_run_tests_stage_async', side_effect=noop), \
+                 patch.object(service, '_run_execution_stage_async', side_effect=noop), \
+                 patch.object(service, '_run_thumbnail_stage_async', side_effect=fake_stage("thumbnail")), \
+                 patch.object(service, '_run_ai_stage_async', side_effect=fake_stage("ai")), \
+                 patch.object(service, '_run_scoring_stage'):
+                reports = service.correct_all_assignments("turma-teste", parallel_assignments=2)
+            
+            assert len(reports) == 2
+            # Por event loop, seriam dois de cada ao mesmo tempo
+            assert peak == {"thumbnail": 1, "ai": 1}
+    
+    @pytest.mark.parametrize("use_async", [False, True])
+    @pytest.mark.parametrize("assignment_name, program", [("prog1-prova-as", "yahoo.py"),
+                                                          ("prog1-prova-av", "main.py")])
+    def test_dashboard_sees_files_written_by_execution(self, assignment_name, program, use_async):
+        """Testa se o thumbnail do Streamlit roda na mesma cópia em que o programa gerou os seus arquivos."""
+        import asyncio
+        import sys
+        from src.domain.models import IndividualSubmission
+        
+        environment = Mock()
+        environment.command.side_effect = lambda executable, *args: [sys.executable, *args]
+        environment.env.return_value = None
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            base_dir = Path(temp_dir)
+            enunciados_dir, respostas_dir = _create_correction_fixture(base_dir, ["ana"],
+                                                                       assignment_name=assignment_name)
+            submission_dir = respostas_dir / "turma-teste" / f"{assignment_name}-submissions" / f"{assignment_name}-ana"
+            (submission_dir / program).write_text("open('dados.csv', 'w').write('data,preco')\n")
+            service = CorrectionService(enunciados_dir, respostas_dir, logs_path=base_dir / "logs", use_async=use_async)
+            assignment = service.assignment_repo.get_assignment(assignment_name)
+            submission = IndividualSubmission("ana", assignment_name, "turma-teste", submission_dir)
+            seen = {}
+            
+            def capture(submission, assignment_name, turma_name, workdir=None):
+                seen["workdir"] = workdir
+                seen["csv"] = (workdir / "dados.csv").read_text()
+                return Mock(streamlit_exceptions=[])
+            
+            async def capture_async(*args, **kwargs):
+                return capture(*args, **kwargs)
+            
+            async def run_async():
+                await service._run_execution_stage_async(submission, assignment)
+                await service._run_thumbnail_stage_async(submission, assignment)
+            
+            with patch.dict("config.ASSIGNMENTS_WITH_PYTHON_EXECUTION", {"prog1-prova-av": True}), \
+                 patch("src.services.python_execution_service.environment_for_submission", return_value=environment), \
+                 patch("src.services.interactive_execution_service.environment_for_submission", return_value=environment), \
+                 patch.object(service.streamlit_thumbnail_service, '_capture_submission_thumbnail', side_effect=capture), \
+                 patch.object(service.streamlit_thumbnail_service, '_capture_submission_thumbnail_async',
+                              side_effect=capture_async):
+                if use_async:
+                    asyncio.run(run_async())
+                else:
+                    service._run_execution_stage(submission, assignment)
+                    service._run_thumbnail_stage(submission, assignment)
+            
+            assert seen["csv"] == "data,preco"
+            # A cópia é removida depois do thumbnail e a pasta do aluno não muda
+            assert submission.workspace is None
+            assert not seen["workdir"].exists()
+            assert not (submission_dir / "dados.csv").exists()
+
+
+
+class TestGradingPipeline:
+    """Testes para GradingPipeline."""
+    
+    def test_items_flow_through_stages_in_order(self):
+        """Testa se cada item passa por todos os estágios na ordem definida."""
+        items = [{"id": i, "trace": []} for i in range(10)]
+        stages = [
+            PipelineStage(name=name, func=lambda item, name=name: item["trace"].append(name), workers=workers)
+            for name, workers in [("a", 3), ("b", 1), ("c", 2)]
+        ]
+        GradingPipeline(stages, queue_size=2).run(items)
+        
+        assert all(item["trace"] == ["a", "b", "c"] for item in items)
+    
+    def test_stage_pool_limits_concurrency(self):
+        """Testa se um estágio nunca executa mais itens do que seu número de workers."""
+        import threading
+        import time
+        
+        lock = threading.Lock()
+        state = {"running": 0, "peak": 0}
+        
+        def slow_stage(item):
+            with lock:
+                state["running"] += 1
+                state["peak"] = max(state["peak"], state["running"])
+            time.sleep(0.02)
+            with lock:
+                state["running"] -= 1
+        
+        stages = [
+            PipelineStage(name="fast", func=lambda item: None, workers=8),
+            PipelineStage(name="browser", func=slow_stage, workers=2),
+        ]
+        GradingPipeline(stages, queue_size=4).run(range(12))
+        
+        assert state["peak"] <= 2
+    
+    def test_stage_error_does_not_stop_item(self):
+        """Testa se uma exceção em um estágio não impede os estágios seguintes."""
+        items = [{"id": i, "done": False} for i in range(3)]
+        
+        def failing(item):
+            if item["id"] == 1:
+                raise RuntimeError("falha")
+        
+        def finish(item):
+            item["done"] = True
+        
+        GradingPipeline([PipelineStage("falha", failing), PipelineStage("fim", finish)]).run(items)
+        
+        assert all(item["done"] for item in items)
+
+
+def _create_correction_fixture(base_dir: Path, logins, assignment_name: str = "prog1-tarefa-scrap-simples",
+                               turma_name: str = "turma-teste"):
+    """Cria enunciado e submissões mínimas para testes do CorrectionService."""
+    enunciados_dir = base_dir / "enunciados"
+    respostas_dir = base_dir / "respostas"
+    assignment_dir = enunciados_dir / assignment_name
+    assignment_dir.mkdir(parents=True)
+    (assignment_dir / "README.md").write_text("# Assignment")
+    
+    submissions_dir = respostas_dir / turma_name / f"{assignment_name}-submissions"
+    submissions_dir.mkdir(parents=True)
+    for login in logins:
+        submission_dir = submissions_dir / f"{assignment_name}-{login}"
+        submission_dir.mkdir()
+        (submission_dir / "main.py").write_text(f"print('{login}')")
+    
+    return enunciados_dir, respostas_dir
+
 
 class TestRepositories:
     """Testes para os repositórios."""
@@ -1388,6 +2905,96 @@ class TestStreamlitThumbnails:
         
         assert error_result.streamlit_status == "error"
         assert error_result.error_message == "Test error message"
+    
+    def test_generate_thumbnails_reuses_captures_from_correction(self):
+        """Testa se o relatório visual reaproveita os thumbnails capturados na correção."""
+        from src.services.streamlit_thumbnail_service import StreamlitThumbnailService
+        from src.domain.models import IndividualSubmission, ThumbnailResult
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            captured_dir = Path(temp_dir) / "captura"
+            captured_dir.mkdir()
+            image = captured_dir / "ana_prog1-tarefa.png"
+            image.write_bytes(b"png")
+            
+            def submission(login, thumbnail=None):
+                sub = IndividualSubmission(github_login=login, assignment_name="prog1-tarefa",
+                                           turma="turma-teste", submission_path=Path(temp_dir) / login)
+                sub.streamlit_thumbnail = thumbnail
+                return sub
+            
+            ana = submission("ana", ThumbnailResult(
+                submission_identifier="ana", display_name="ana", thumbnail_path=image,
+                capture_timestamp="2024-01-01T10:00:00", streamlit_status="success"
+            ))
+            bruno = submission("bruno")
+            
+            service = StreamlitThumbnailService(Path(temp_dir) / "visual" / "thumbnails")
+            new_capture = lambda sub, assignment, turma: ThumbnailResult(
+                submission_identifier=sub.github_login, display_name=sub.display_name,
+                thumbnail_path=Path(), capture_timestamp="2024-01-01T11:00:00", streamlit_status="success"
+            )
+            with patch.object(service, '_capture_submission_thumbnail', side_effect=new_capture) as capture, \
+                 patch.object(service, '_install_fundamental_dependencies'):
+                results = service.generate_thumbnails_for_assignment("prog1-tarefa", "turma-teste", [ana, bruno])
+                assert [call.args[0].github_login for call in capture.call_args_list] == ["bruno"]
+                
+                service.generate_thumbnails_for_assignment("prog1-tarefa", "turma-teste", [ana, bruno],
+                                                           force_recapture=True)
+                assert capture.call_count == 3
+            
+            assert [r.submission_identifier for r in results] == ["ana", "bruno"]
+            # A imagem reaproveitada é copiada para a pasta usada pelo relatório visual
+            assert results[0].thumbnail_path == service.output_dir / image.name
+            assert results[0].thumbnail_path.read_bytes() == b"png"
+    
+    def test_probe_http_async(self):
+        """Testa o probe HTTP assíncrono usado para esperar o Streamlit."""
+        import asyncio
+        from src.services.streamlit_thumbnail_service import StreamlitThumbnailService
+        
+        async def respond(status):
+            async def handler(reader, writer):
+                await reader.readline()
+                writer.write(f"HTTP/1.0 {status}\r\n\r\n".encode("ascii"))
+                await writer.drain()
+                writer.close()
+            server = await asyncio.start_server(handler, "localhost", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return await service._probe_http_async(port, timeout=2)
+        
+        async def closed_port():
+            server = await asyncio.start_server(lambda r, w: None, "localhost", 0)
+            port = server.sockets[0].getsockname()[1]
+            server.close()
+            await server.wait_closed()
+            return await service._probe_http_async(port, timeout=2)
+        
+        service = StreamlitThumbnailService(Path(tempfile.mkdtemp()))
+        assert asyncio.run(respond("200 OK")) is True
+        assert asyncio.run(respond("503 Service Unavailable")) is False
+        assert asyncio.run(closed_port()) is False
+    
+    def test_import_error_retry_stops_each_streamlit_once(self):
+        """Testa se a nova tentativa após erro de importação para o primeiro Streamlit antes de iniciar outro."""
+        from src.services.streamlit_thumbnail_service import StreamlitThumbnailService
+        
+        service = StreamlitThumbnailService(Path(tempfile.mkdtemp()))
+        first, second = Mock(name="primeiro"), Mock(name="segundo")
+        submission = Mock(display_name="Ana")
+        with patch.object(service, '_start_streamlit', side_effect=[first, second]), \
+             patch.object(service, '_wait_for_streamlit_ready', return_value=True), \
+             patch.object(service, '_capture_screenshot',
+                          side_effect=[RuntimeError("No module named 'plotly'"), []]), \
+             patch.object(service, '_install_common_dependencies'), \
+             patch.object(service, '_log_process_output'), \
+             patch.object(service, '_stop_streamlit') as stop, \
+             patch("src.services.streamlit_thumbnail_service.time.sleep"):
+            result = service._capture_on_port(submission, "prog1-tarefa", Path("main.py"), "ana", 8501)
+        
+        assert result.streamlit_status == "success"
+        assert [call.args[0] for call in stop.call_args_list] == [first, second]
 
 
 class TestHTMLThumbnails: